@@ -10,14 +10,17 @@ import torch
 import torchvision.transforms as transforms
 from transformers import BlipProcessor, BlipForConditionalGeneration
 import json
+import os
 from datetime import datetime, timedelta
+from mastery_engine import MasteryEngine, LEVELS
+from path_optimizer import LearningPathOptimizer, default_graph
 
 class AdvancedAICore:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, profile_path=None):
         self.client = openai.OpenAI(api_key=api_key) if api_key else None
         self.setup_vision_models()
         self.knowledge_graph = {}
-        self.learning_analytics = LearningAnalytics()
+        self.learning_analytics = LearningAnalytics(profile_path=profile_path)
         
     def setup_vision_models(self):
         """Initialize advanced vision models for diagram analysis"""
@@ -218,28 +221,152 @@ class ARVisualization:
             'parameters': {'length': 1, 'gravity': 9.81}
         }
 
+class LearningProfile:
+    # Streaming per-student accumulators; each interaction is folded in once and never rescanned
+    STYLE_TYPES = {'visual': 'visual', 'audio': 'auditory', 'interactive': 'kinesthetic'}
+    
+    def __init__(self, data=None):
+        data = data or {}
+        self.interactions = data.get('interactions', 0)
+        self.type_counts = dict(data.get('type_counts', {}))
+        self.style_counts = {style: 0 for style in ('visual', 'auditory', 'kinesthetic')}
+        self.style_counts.update(data.get('style_counts', {}))
+        self.topic_time = dict(data.get('topic_time', {}))
+        self.topic_scores = dict(data.get('topic_scores', {}))
+        self.score_sum = data.get('score_sum', 0.0)
+        self.score_count = data.get('score_count', 0)
+        self.recent_score = data.get('recent_score')
+        self.updated_at = data.get('updated_at')
+    
+    def record(self, interaction, alpha=0.3):
+        self.interactions += 1
+        kind = interaction.get('type')
+        if kind is not None:
+            self.type_counts[kind] = self.type_counts.get(kind, 0) + 1
+            if kind in self.STYLE_TYPES:
+                self.style_counts[self.STYLE_TYPES[kind]] += 1
+        topic = interaction.get('topic', 'unknown')
+        self.topic_time[topic] = self.topic_time.get(topic, 0) + interaction.get('time_spent', 0)
+        score = interaction.get('score', interaction.get('accuracy'))
+        if score is not None:
+            score = score / 100 if score > 1 else score
+            self.score_sum += score
+            self.score_count += 1
+            # Exponentially weighted, so recent results count most
+            self.recent_score = score if self.recent_score is None else alpha * score + (1 - alpha) * self.recent_score
+            previous = self.topic_scores.get(topic)
+            self.topic_scores[topic] = score if previous is None else alpha * score + (1 - alpha) * previous
+        self.updated_at = datetime.now().isoformat()
+    
+    def to_dict(self):
+        return {
+            'interactions': self.interactions,
+            'type_counts': self.type_counts,
+            'style_counts': self.style_counts,
+            'topic_time': self.topic_time,
+            'topic_scores': self.topic_scores,
+            'score_sum': self.score_sum,
+            'score_count': self.score_count,
+            'recent_score': self.recent_score,
+            'updated_at': self.updated_at
+        }
+
 class LearningAnalytics:
-    def __init__(self):
+    def __init__(self, path_optimizer=None, profile_path=None, compact_entries=1000):
         self.learning_data = []
         self.knowledge_map = {}
-        
-    def analyze_learning_pattern(self, user_interactions):
+        self.path_optimizer = path_optimizer or LearningPathOptimizer(default_graph())
+        self.profile_path = profile_path
+        self.profiles = {}
+        # Updates append the one changed profile to a journal; the full file is only rewritten on compaction
+        self.compact_entries = compact_entries
+        self.journal_entries = 0
+        if profile_path and (os.path.exists(profile_path) or os.path.exists(profile_path + '.journal')):
+            self.load_profiles(profile_path)
+    
+    def get_profile(self, student_id='default'):
+        profile = self.profiles.get(student_id)
+        if profile is None:
+            profile = self.profiles[student_id] = LearningProfile()
+        return profile
+    
+    def record_interaction(self, interaction, student_id='default'):
+        profile = self.get_profile(student_id)
+        profile.record(interaction)
+        self.save_profile(student_id)
+        return profile
+    
+    def save_profile(self, student_id='default'):
+        if not self.profile_path:
+            # In-memory profiles only
+            return
+        with open(self.profile_path + '.journal', 'a') as handle:
+            handle.write(json.dumps([student_id, self.profiles[student_id].to_dict()]) + '\n')
+        self.journal_entries += 1
+        # Compacting once the journal outgrows the profile count keeps each update amortized O(1)
+        if self.journal_entries >= max(self.compact_entries, len(self.profiles)):
+            self.save_profiles()
+    
+    def save_profiles(self, path=None):
+        path = path or self.profile_path
+        if not path:
+            # In-memory profiles only
+            return
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as handle:
+            json.dump({student_id: profile.to_dict() for student_id, profile in self.profiles.items()}, handle)
+        os.replace(tmp_path, path)
+        if path == self.profile_path:
+            # Every journalled update is now in the snapshot
+            if os.path.exists(path + '.journal'):
+                os.remove(path + '.journal')
+            self.journal_entries = 0
+    
+    def load_profiles(self, path):
+        profiles = {}
+        if os.path.exists(path):
+            with open(path) as handle:
+                profiles = json.load(handle)
+        entries = 0
+        damaged = False
+        if os.path.exists(path + '.journal'):
+            with open(path + '.journal') as handle:
+                for line in handle:
+                    try:
+                        student_id, data = json.loads(line)
+                    except ValueError:
+                        # A write cut short by a crash; earlier entries are intact
+                        damaged = True
+                        continue
+                    profiles[student_id] = data
+                    entries += 1
+        self.profiles = {student_id: LearningProfile(data) for student_id, data in profiles.items()}
+        if path == self.profile_path:
+            self.journal_entries = entries
+            if damaged:
+                # Start a clean journal so new entries are not appended to the partial line
+                self.save_profiles()
+        
+    def analyze_learning_pattern(self, new_interactions=(), student_id='default'):
         """Advanced learning pattern analysis"""
-        # Analyze time spent on topics
-        topic_time = {}
-        for interaction in user_interactions:
-            topic = interaction.get('topic', 'unknown')
-            time_spent = interaction.get('time_spent', 0)
-            topic_time[topic] = topic_time.get(topic, 0) + time_spent
+        # new_interactions are folded into the stored profile first, so passing a full history counts it again
+        profile = self.get_profile(student_id)
+        recorded = 0
+        for interaction in new_interactions:
+            profile.record(interaction)
+            recorded += 1
+        if recorded:
+            self.save_profile(student_id)
+        topic_time = dict(profile.topic_time)
         
         # Identify learning style
-        learning_style = self.identify_learning_style(user_interactions)
+        learning_style = self.identify_learning_style(profile)
         
         # Predict performance
-        performance_prediction = self.predict_performance(user_interactions)
+        performance_prediction = self.predict_performance(profile)
         
-        # Generate adaptive path
-        adaptive_path = self.generate_adaptive_path(topic_time, learning_style)
+        # Generate adaptive path from per-topic scores where they exist, as time spent says little about mastery
+        adaptive_path = self.generate_adaptive_path(profile.topic_scores, learning_style)
         
         return {
             'learning_style': learning_style,
@@ -249,29 +376,52 @@ class LearningAnalytics:
             'recommendations': self.generate_recommendations(learning_style, topic_time)
         }
     
-    def identify_learning_style(self, interactions):
+    def identify_learning_style(self, profile):
         """Identify user's learning style"""
-        visual_score = sum(1 for i in interactions if i.get('type') == 'visual')
-        auditory_score = sum(1 for i in interactions if i.get('type') == 'audio')
-        kinesthetic_score = sum(1 for i in interactions if i.get('type') == 'interactive')
-        
-        scores = {'visual': visual_score, 'auditory': auditory_score, 'kinesthetic': kinesthetic_score}
+        if not isinstance(profile, LearningProfile):
+            interactions, profile = profile, LearningProfile()
+            for interaction in interactions:
+                profile.record(interaction)
+        scores = profile.style_counts
         return max(scores, key=scores.get)
     
-    def generate_adaptive_path(self, topic_mastery, learning_style):
+    def predict_performance(self, profile):
+        """Predict upcoming performance from running score aggregates"""
+        if not profile.score_count:
+            return {'expected_score': None, 'average_score': None, 'trend': 'unknown', 'confidence': 0.0}
+        average = profile.score_sum / profile.score_count
+        if profile.recent_score > average + 0.05:
+            trend = 'improving'
+        elif profile.recent_score < average - 0.05:
+            trend = 'declining'
+        else:
+            trend = 'stable'
+        return {
+            'expected_score': round(profile.recent_score, 3),
+            'average_score': round(average, 3),
+            'trend': trend,
+            'confidence': round(min(1.0, profile.score_count / 20), 2)
+        }
+    
+    def generate_recommendations(self, learning_style, topic_time):
+        """Study recommendations from style and where time has gone"""
+        recommendations = [f"Use {method.replace('_', ' ')}" for method in self.get_method_for_style(learning_style)[:2]]
+        if topic_time:
+            most = max(topic_time, key=topic_time.get)
+            least = min(topic_time, key=topic_time.get)
+            if most != least:
+                recommendations.append(f"Balance study time: {most} has the most, {least} the least")
+        return recommendations
+    
+    def generate_adaptive_path(self, topic_mastery, learning_style, budget_minutes=120, targets=None):
         """Generate personalized learning path"""
-        # Sort topics by mastery level
-        sorted_topics = sorted(topic_mastery.items(), key=lambda x: x[1])
-        
-        path = []
-        for topic, mastery in sorted_topics:
-            if mastery < 60:  # Needs improvement
-                path.append({
-                    'topic': topic,
-                    'priority': 'high',
-                    'recommended_method': self.get_method_for_style(learning_style),
-                    'estimated_time': 30
-                })
+        # Weak topics in prerequisite order, best expected gain per minute first; cached per state and budget
+        # Profile topic scores are stored as 0-1 fractions
+        path = self.path_optimizer.optimize(topic_mastery, budget_minutes, targets=targets, scale=1.0)
+        
+        for step in path:
+            step['priority'] = 'high' if step['mastery'] < 0.4 else 'medium'
+            step['recommended_method'] = self.get_method_for_style(learning_style)
         
         return path
     
@@ -347,23 +497,24 @@ class ScenarioEngine:
         return labs.get(experiment_type, {})
 
 class AdaptiveLearning:
-    def __init__(self):
+    def __init__(self, student_id='default', mastery_engine=None):
+        self.student_id = student_id
         self.user_model = {}
-        self.difficulty_adjuster = DifficultyAdjuster()
+        self.mastery_engine = mastery_engine or MasteryEngine()
+        self.difficulty_adjuster = DifficultyAdjuster(self.mastery_engine, student_id)
         
     def adapt_content_difficulty(self, user_performance, topic):
         """Dynamically adjust content difficulty"""
         current_level = self.user_model.get(topic, {'level': 'beginner'})['level']
         
-        # Analyze recent performance
-        if user_performance['accuracy'] > 0.8 and user_performance['speed'] > 0.7:
-            new_level = self.increase_difficulty(current_level)
-        elif user_performance['accuracy'] < 0.6:
-            new_level = self.decrease_difficulty(current_level)
-        else:
+        # The level follows estimated mastery; moving up still requires a reasonable pace
+        state = self.mastery_engine.record_attempt(self.student_id, topic, user_performance['accuracy'])
+        new_level = state['level']
+        current_index = LEVELS.index(current_level) if current_level in LEVELS else 0
+        if LEVELS.index(new_level) > current_index and user_performance.get('speed', 0) <= 0.7:
             new_level = current_level
         
-        self.user_model[topic] = {'level': new_level, 'last_updated': datetime.now()}
+        self.user_model[topic] = {'level': new_level, 'mastery': state['mastery'], 'last_updated': datetime.now()}
         
         return {
             'previous_level': current_level,
@@ -409,25 +560,34 @@ class AdaptiveLearning:
         return content_map.get(level, content_map['beginner'])
 
 class DifficultyAdjuster:
-    def __init__(self):
+    def __init__(self, mastery_engine=None, student_id='default'):
+        self.mastery_engine = mastery_engine or MasteryEngine()
+        self.student_id = student_id
         self.adjustment_history = []
+        self.ingested = 0
     
-    def calculate_optimal_difficulty(self, performance_history):
+    def calculate_optimal_difficulty(self, performance_history, topic='general', target_accuracy=0.75):
         """Calculate optimal difficulty based on performance"""
         if not performance_history:
             return 0.5  # Medium difficulty
         
-        recent_performance = performance_history[-10:]  # Last 10 attempts
-        avg_accuracy = np.mean([p['accuracy'] for p in recent_performance])
-        avg_time = np.mean([p['time_taken'] for p in recent_performance])
-        
-        # Target 70-80% accuracy for optimal learning
-        if avg_accuracy > 0.85:
-            return min(1.0, self.get_current_difficulty() + 0.1)
-        elif avg_accuracy < 0.65:
-            return max(0.1, self.get_current_difficulty() - 0.1)
-        else:
-            return self.get_current_difficulty()
+        # Only attempts not seen on earlier calls are fed to the engine
+        if len(performance_history) < self.ingested:
+            self.ingested = 0
+        new_attempts = performance_history[self.ingested:]
+        self.ingested = len(performance_history)
+        self.mastery_engine.update_batch(
+            [self.student_id] * len(new_attempts),
+            [p.get('topic', topic) for p in new_attempts],
+            [p['accuracy'] for p in new_attempts],
+            [(p['difficulty'] - 0.5) * 4 if 'difficulty' in p else None for p in new_attempts]
+        )
+        
+        # Target 70-80% accuracy for optimal learning: pick the difficulty with that predicted success rate
+        offset = self.mastery_engine.recommended_offset(self.student_id, topic, target_accuracy)
+        difficulty = float(np.clip(0.5 + offset / 4, 0.1, 1.0))
+        self.adjustment_history.append(difficulty)
+        return difficulty
     
     def get_current_difficulty(self):
         return self.adjustment_history[-1] if self.adjustment_history else 0.5
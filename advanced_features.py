@@ -7,6 +7,7 @@ import json
 import asyncio
 import websockets
 from typing import Dict, List, Any
+from path_optimizer import LearningPathOptimizer, default_graph
 
 class AdvancedFeaturesSystem:
     def __init__(self):
@@ -321,6 +322,7 @@ class QuantumLearningEngine:
         self.quantum_states = {}
         self.superposition_learning = SuperpositionLearning()
         self.entanglement_network = EntanglementNetwork()
+        self.path_optimizer = LearningPathOptimizer(default_graph())
         
     def create_quantum_concept_map(self, concepts):
         quantum_map = {}
@@ -341,17 +343,13 @@ class QuantumLearningEngine:
             'coherence': np.random.uniform(0, 1)
         }
     
-    def quantum_learning_optimization(self, learning_path):
-        # Use quantum algorithms to optimize learning sequences
+    def quantum_learning_optimization(self, learning_path, mastery=None, budget_minutes=240, scale=1.0):
+        # Reorder the requested steps by prerequisites and expected gain within the time budget
         optimized_path = []
         
-        for step in learning_path:
-            quantum_enhanced_step = {
-                'concept': step,
-                'quantum_acceleration': self._apply_quantum_speedup(step),
-                'parallel_learning': self._enable_superposition_learning(step)
-            }
-            optimized_path.append(quantum_enhanced_step)
+        for step in self.path_optimizer.optimize(mastery or {}, budget_minutes, targets=list(learning_path),
+                                                 scale=scale):
+            optimized_path.append({'concept': step['topic'], **step})
         
         return optimized_path
 
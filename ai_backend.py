@@ -8,9 +8,11 @@ import cv2
 import numpy as np
 from datetime import datetime, timedelta
 import json
+from spaced_repetition import SpacedRepetitionScheduler, GRADE_LABELS
+from performance_store import PerformanceStore
 
 class AIStudyMentor:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, performance_dir=None):
         self.client = openai.OpenAI(api_key=api_key) if api_key else None
         self.chroma_client = chromadb.Client()
         self.collection = self.chroma_client.create_collection("study_notes")
@@ -26,6 +28,9 @@ class AIStudyMentor:
             'performance_history': [],
             'spaced_repetition_schedule': {}
         }
+        self.flashcard_scheduler = SpacedRepetitionScheduler()
+        self.performance_store = PerformanceStore(performance_dir)
+        self._sync_performance()
         
     def ingest_content(self, content, content_type="text", metadata=None):
         """Ingest PDFs, notes, images into vector database"""
@@ -159,15 +164,38 @@ class AIStudyMentor:
         # Schedule spaced repetition
         for card in cards:
             card_id = f"{topic}_{len(self.student_profile['spaced_repetition_schedule'])}"
-            self.student_profile['spaced_repetition_schedule'][card_id] = {
-                'card': card,
-                'interval': 1,
-                'ease_factor': 2.5,
-                'next_review': datetime.now() + timedelta(days=1)
-            }
+            self.flashcard_scheduler.add_card(card_id, card, self.student_profile['name'],
+                                              datetime.now() + timedelta(days=1))
+            self.student_profile['spaced_repetition_schedule'][card_id] = self.flashcard_scheduler.card_state(card_id)
         
         return cards
     
+    def get_due_flashcards(self, now=None, limit=None):
+        """Cards due for review, earliest first"""
+        card_ids = self.flashcard_scheduler.due_cards(now, self.student_profile['name'], limit)
+        return [(card_id, self.student_profile['spaced_repetition_schedule'][card_id]) for card_id in card_ids]
+    
+    def review_flashcard(self, card_id, difficulty, now=None):
+        """Record a review (Again/Hard/Medium/Easy or an SM-2 grade 0-5) and reschedule the card"""
+        state = self.flashcard_scheduler.review(card_id, difficulty, now)
+        self.student_profile['spaced_repetition_schedule'][card_id] = state
+        return state
+    
+    def review_flashcards(self, reviews, now=None):
+        """Apply a whole review session in one batch: reviews is a list of (card_id, difficulty)"""
+        scheduler = self.flashcard_scheduler
+        rows = [scheduler.rows[card_id] for card_id, _ in reviews]
+        grades = [GRADE_LABELS.get(difficulty, difficulty) for _, difficulty in reviews]
+        scheduler.review_batch(rows, grades, now)
+        for card_id, _ in reviews:
+            self.student_profile['spaced_repetition_schedule'][card_id] = scheduler.card_state(card_id)
+    
+    def _sync_performance(self):
+        """Point the profile at the store's precomputed history window and weak areas"""
+        student_id = self.student_profile['name']
+        self.student_profile['performance_history'] = self.performance_store.student(student_id).recent
+        self.student_profile['weak_areas'] = self.performance_store.weak_areas(student_id)
+    
     def analyze_performance(self, quiz_results):
         """Analyze performance and identify weak areas"""
         correct = sum(1 for r in quiz_results if r['correct'])
@@ -177,17 +205,10 @@ class AIStudyMentor:
         # Identify weak concepts
         weak_concepts = [r['concept'] for r in quiz_results if not r['correct']]
         
-        # Update student profile
-        self.student_profile['performance_history'].append({
-            'date': datetime.now(),
-            'score': score,
-            'weak_concepts': weak_concepts
-        })
-        
-        # Update weak areas
-        for concept in weak_concepts:
-            if concept not in self.student_profile['weak_areas']:
-                self.student_profile['weak_areas'].append(concept)
+        # Update student profile; weak-area scores decay, so old misses fade unless repeated
+        self.performance_store.record_session(self.student_profile['name'], score,
+                                              [(r['concept'], r['correct']) for r in quiz_results])
+        self._sync_performance()
         
         return {
             'score': score,
@@ -258,8 +279,9 @@ class AIStudyMentor:
     
     def get_gamification_status(self):
         """Points, badges, streaks system"""
-        total_sessions = len(self.student_profile['performance_history'])
-        avg_score = np.mean([p['score'] for p in self.student_profile['performance_history']]) if self.student_profile['performance_history'] else 0
+        summary = self.performance_store.summary(self.student_profile['name'])
+        total_sessions = summary['sessions']
+        avg_score = summary['average_score']
         
         points = total_sessions * 10 + int(avg_score)
         
@@ -268,7 +290,7 @@ class AIStudyMentor:
             badges.append("Week Warrior")
         if avg_score >= 90:
             badges.append("Excellence Master")
-        if len(self.student_profile['weak_areas']) == 0:
+        if summary['weak_area_count'] == 0:
             badges.append("No Weak Spots")
         
         return {
@@ -0,0 +1,165 @@
+import json
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+class ChatStore:
+    def __init__(self, db_path=':memory:', tail_size=200, flush_every=50):
+        self.tail_size = tail_size
+        self.flush_every = flush_every
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.tails = {}
+        self.tail_index = {}
+        self.next_seq = {}
+        self.pending_inserts = []
+        self.pending_reactions = {}
+        self._create_schema()
+
+    def _create_schema(self):
+        # One row per message; (room, seq) orders a room's history, id backs reaction lookups
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                room TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                id TEXT NOT NULL UNIQUE,
+                user_id TEXT,
+                user_name TEXT,
+                message TEXT,
+                type TEXT,
+                timestamp TEXT,
+                reactions TEXT,
+                PRIMARY KEY (room, seq)
+            ) WITHOUT ROWID;
+        """)
+        self.conn.commit()
+
+    def create_room(self, room):
+        with self.lock:
+            if room not in self.tails:
+                self.tails[room] = deque()
+                row = self.conn.execute("SELECT MAX(seq) FROM chat_messages WHERE room = ?", (room,)).fetchone()
+                self.next_seq[room] = (row[0] or 0) + 1
+        return room
+
+    def append(self, room, user_id, user_name, message, message_type="text"):
+        with self.lock:
+            self.create_room(room)
+            seq = self.next_seq[room]
+            self.next_seq[room] = seq + 1
+            msg = {
+                "id": str(uuid.uuid4()),
+                "seq": seq,
+                "user_id": user_id,
+                "user_name": user_name,
+                "message": message,
+                "type": message_type,
+                "timestamp": datetime.now(),
+                "reactions": {}
+            }
+            tail = self.tails[room]
+            tail.append(msg)
+            self.tail_index[msg["id"]] = (room, msg)
+            if len(tail) > self.tail_size:
+                # Evicted messages are already queued for (or in) SQLite
+                evicted = tail.popleft()
+                del self.tail_index[evicted["id"]]
+            self.pending_inserts.append((room, msg))
+            if len(self.pending_inserts) >= self.flush_every:
+                self.flush()
+            return msg
+
+    def add_reaction(self, room, message_id, user_id, reaction):
+        # Only messages of the given room can be reacted to
+        with self.lock:
+            room_msg = self.tail_index.get(message_id)
+            if room_msg is not None:
+                msg = room_msg[1] if room_msg[0] == room else None
+            else:
+                msg = self._load_by_id(message_id, room)
+            if msg is None:
+                return False
+            users = msg["reactions"].setdefault(reaction, [])
+            if user_id not in users:
+                users.append(user_id)
+                self.pending_reactions[message_id] = msg["reactions"]
+                if len(self.pending_reactions) >= self.flush_every:
+                    self.flush()
+            return True
+
+    def get_recent(self, room, limit=50):
+        with self.lock:
+            tail = self.tails.get(room)
+            if tail is None:
+                return []
+            if limit <= len(tail):
+                return list(tail)[-limit:] if limit else []
+        return self.get_page(room, limit=limit)["messages"]
+
+    def get_page(self, room, before=None, limit=50):
+        # Cursor pagination, newest first internally, returned oldest-to-newest for rendering
+        with self.lock:
+            tail = self.tails.get(room)
+            if tail is None:
+                return {"messages": [], "next_cursor": None}
+            if tail:
+                oldest_in_memory = tail[0]["seq"]
+                upper = before if before is not None else tail[-1]["seq"] + 1
+                if upper - limit >= oldest_in_memory:
+                    messages = [msg for msg in tail if upper - limit <= msg["seq"] < upper]
+                    return {"messages": messages, "next_cursor": messages[0]["seq"] if messages else None}
+            self.flush()
+            upper = before if before is not None else self.next_seq[room]
+            rows = self.conn.execute(
+                "SELECT room, seq, id, user_id, user_name, message, type, timestamp, reactions "
+                "FROM chat_messages WHERE room = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+                (room, upper, limit)).fetchall()
+            messages = [self.tail_index[row[2]][1] if row[2] in self.tail_index else self._from_row(row)
+                        for row in reversed(rows)]
+            has_more = bool(messages) and messages[0]["seq"] > 1
+            return {"messages": messages, "next_cursor": messages[0]["seq"] if has_more else None}
+
+    def flush(self):
+        with self.lock:
+            if self.pending_inserts:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO chat_messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [self._to_row(room, msg) for room, msg in self.pending_inserts])
+                for _, msg in self.pending_inserts:
+                    self.pending_reactions.pop(msg["id"], None)
+                self.pending_inserts = []
+            if self.pending_reactions:
+                self.conn.executemany(
+                    "UPDATE chat_messages SET reactions = ? WHERE id = ?",
+                    [(json.dumps(reactions), message_id) for message_id, reactions in self.pending_reactions.items()])
+                self.pending_reactions = {}
+            self.conn.commit()
+
+    def message_count(self, room):
+        with self.lock:
+            return self.next_seq.get(room, 1) - 1
+
+    def _load_by_id(self, message_id, room):
+        self.flush()
+        row = self.conn.execute(
+            "SELECT room, seq, id, user_id, user_name, message, type, timestamp, reactions "
+            "FROM chat_messages WHERE id = ? AND room = ?", (message_id, room)).fetchone()
+        return self._from_row(row) if row else None
+
+    def _to_row(self, room, msg):
+        return (room, msg["seq"], msg["id"], msg["user_id"], msg["user_name"], msg["message"],
+                msg["type"], msg["timestamp"].isoformat(), json.dumps(msg["reactions"]))
+
+    def _from_row(self, row):
+        return {
+            "id": row[2],
+            "seq": row[1],
+            "user_id": row[3],
+            "user_name": row[4],
+            "message": row[5],
+            "type": row[6],
+            "timestamp": datetime.fromisoformat(row[7]),
+            "reactions": json.loads(row[8])
+        }
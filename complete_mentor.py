@@ -15,9 +15,9 @@ from voice_interface import VoiceInterface, ConversationMode, MultiModalProcesso
 from engagement_monitor import AdvancedEngagementMonitor
 
 class CompleteStudyMentor:
-    def __init__(self):
+    def __init__(self, performance_dir='performance_history'):
         # Initialize all components
-        self.ai_mentor = AIStudyMentor()
+        self.ai_mentor = AIStudyMentor(performance_dir=performance_dir)
         self.voice_interface = VoiceInterface()
         self.engagement_monitor = AdvancedEngagementMonitor()
         self.multimodal_processor = MultiModalProcessor()
@@ -395,32 +395,26 @@ def main():
             if mentor.ai_mentor.student_profile['spaced_repetition_schedule']:
                 st.write("**Due for Review:**")
                 
-                for card_id, card_data in mentor.ai_mentor.student_profile['spaced_repetition_schedule'].items():
-                    if card_data['next_review'] <= datetime.now():
-                        card = card_data['card']
+                for card_id, card_data in mentor.ai_mentor.get_due_flashcards():
+                    card = card_data['card']
+                    
+                    with st.expander(f"Review: {card['front'][:50]}..."):
+                        st.write(f"**Question:** {card['front']}")
                         
-                        with st.expander(f"Review: {card['front'][:50]}..."):
-                            st.write(f"**Question:** {card['front']}")
+                        if st.button(f"Show Answer", key=f"show_{card_id}"):
+                            st.write(f"**Answer:** {card['back']}")
                             
-                            if st.button(f"Show Answer", key=f"show_{card_id}"):
-                                st.write(f"**Answer:** {card['back']}")
-                                
-                                difficulty = st.selectbox(
-                                    "How difficult was this?",
-                                    ["Easy", "Medium", "Hard"],
-                                    key=f"diff_{card_id}"
-                                )
-                                
-                                if st.button(f"Mark Reviewed", key=f"mark_{card_id}"):
-                                    # Update spaced repetition schedule
-                                    if difficulty == "Easy":
-                                        card_data['interval'] *= 2
-                                    elif difficulty == "Hard":
-                                        card_data['interval'] = max(1, card_data['interval'] // 2)
-                                    
-                                    card_data['next_review'] = datetime.now() + timedelta(days=card_data['interval'])
-                                    st.success("Card scheduled for next review!")
-    
+                            difficulty = st.selectbox(
+                                "How difficult was this?",
+                                ["Easy", "Medium", "Hard"],
+                                key=f"diff_{card_id}"
+                            )
+                            
+                            if st.button(f"Mark Reviewed", key=f"mark_{card_id}"):
+                                # Update spaced repetition schedule
+                                mentor.ai_mentor.review_flashcard(card_id, difficulty)
+                                st.success("Card scheduled for next review!")
+
     # Analytics Tab
     with tab4:
         st.header("📊 Progress Analytics & Learning Path")
@@ -12,6 +12,7 @@ import json
 from datetime import datetime, timedelta
 import threading
 import time
+from mastery_engine import MasteryEngine, DIFFICULTY_OFFSETS
 
 class CoreAIProcessor:
     def __init__(self, api_key=None):
@@ -274,7 +275,9 @@ class EngagementMonitor:
             return "stable"
 
 class AdaptiveLearningEngine:
-    def __init__(self):
+    def __init__(self, student_id="default", mastery_engine=None):
+        self.student_id = student_id
+        self.mastery_engine = mastery_engine or MasteryEngine()
         self.user_profile = {
             "learning_style": "visual",
             "difficulty_preference": "medium",
@@ -300,15 +303,23 @@ class AdaptiveLearningEngine:
         
         self.user_profile["subject_strengths"][subject].append(score)
         
-        # Identify weak areas
-        if score < 60:
+        # Weak areas follow estimated mastery rather than the latest score alone
+        mastery = self.mastery_engine.record_attempt(self.student_id, subject, score / 100, difficulty)["mastery"]
+        if mastery < 0.5:
             if subject not in self.user_profile["weak_areas"]:
                 self.user_profile["weak_areas"].append(subject)
-        elif score > 80 and subject in self.user_profile["weak_areas"]:
+        elif mastery > 0.7 and subject in self.user_profile["weak_areas"]:
             self.user_profile["weak_areas"].remove(subject)
         
         return self.get_adaptive_recommendations(subject, score)
     
+    def get_mastery(self, subject):
+        return self.mastery_engine.mastery(self.student_id, subject)
+    
+    def recommend_difficulty(self, subject, target_success=0.75):
+        offset = self.mastery_engine.recommended_offset(self.student_id, subject, target_success)
+        return min(DIFFICULTY_OFFSETS, key=lambda level: abs(DIFFICULTY_OFFSETS[level] - offset))
+    
     def get_adaptive_recommendations(self, subject, recent_score):
         recommendations = []
         
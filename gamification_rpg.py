@@ -1,8 +1,16 @@
+import bisect
+import copy
+import heapq
+import itertools
 import json
 import random
+import threading
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 import numpy as np
+from leaderboard import LeaderboardEngine
+from xp_ledger import XPLedger, LEVEL_UP_COINS
 
 class RPGSchoolSystem:
     def __init__(self):
@@ -11,11 +19,20 @@ class RPGSchoolSystem:
         self.quest_engine = QuestEngine()
         self.achievement_system = AchievementSystem()
         self.social_system = SocialSystem()
+        self.achievement_system.attach(self.player)
+        self.xp_ledger = XPLedger()
         
     def initialize_player(self, name="Nishan"):
         self.player.name = name
         self.player.enroll_in_school(self.school)
         return self.player.get_status()
+    
+    def grant_xp(self, subject, amount, activity_type="study", event_id=None):
+        # Quiz, quest and session grants are queued; retried deliveries with the same event id are ignored
+        return self.xp_ledger.record(self.player.name, subject, amount, activity_type, event_id)
+    
+    def apply_xp_events(self):
+        return self.xp_ledger.apply_pending({self.player.name: self.player}).get(self.player.name, [])
 
 class RPGPlayer:
     def __init__(self):
@@ -51,27 +68,50 @@ class RPGPlayer:
         self.completed_quests = []
         self.streak_days = 0
         self.last_activity = None
+        self.listeners = []
+        
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+    
+    def _emit(self, field, value, old=None, subject=None):
+        # Field-change events let rule engines re-evaluate only what depends on the field
+        for listener in self.listeners:
+            listener(self, field, value, old, subject)
         
     def gain_xp(self, subject, amount, activity_type="study"):
-        # Subject XP
-        self.subjects[subject]['xp'] += amount
+        # Half XP goes to overall level
+        return self.apply_xp(subject, amount, amount // 2)
+    
+    def apply_xp(self, subject, subject_amount, overall_amount):
+        # Additive, so a batch of grants can be summed and applied once with the same result
+        result = {'xp_gained': subject_amount}
         
-        # Check subject level up
-        if self.subjects[subject]['xp'] >= self.get_xp_for_next_level(self.subjects[subject]['level']):
-            self.subjects[subject]['level'] += 1
-            self.subjects[subject]['xp'] = 0
-            return {'subject_level_up': True, 'subject': subject, 'new_level': self.subjects[subject]['level']}
+        # Subject XP, carrying any excess into the next level
+        data = self.subjects[subject]
+        start_level = data['level']
+        data['xp'] += subject_amount
+        while data['xp'] >= self.get_xp_for_next_level(data['level']):
+            data['xp'] -= self.get_xp_for_next_level(data['level'])
+            data['level'] += 1
+        if data['level'] > start_level:
+            self._emit('subjects.level', data['level'], start_level, subject)
+            result.update({'subject_level_up': True, 'subject': subject,
+                           'subject_new_level': data['level'], 'new_level': data['level']})
         
         # Overall XP and level
-        self.xp += amount // 2  # Half XP goes to overall level
-        
-        if self.xp >= self.get_xp_for_next_level(self.level):
+        start_level = self.level
+        self.xp += overall_amount
+        while self.xp >= self.get_xp_for_next_level(self.level):
+            self.xp -= self.get_xp_for_next_level(self.level)
             self.level += 1
-            self.xp = 0
-            self.coins += 50  # Bonus coins for leveling up
-            return {'level_up': True, 'new_level': self.level}
+            self.coins += LEVEL_UP_COINS  # Bonus coins for leveling up
+        if self.level > start_level:
+            self._emit('level', self.level, start_level)
+            result.update({'level_up': True, 'overall_new_level': self.level})
+            # 'new_level' stays the subject level when both went up, as when only the subject did
+            result.setdefault('new_level', self.level)
         
-        return {'xp_gained': amount}
+        return result
     
     def get_xp_for_next_level(self, current_level):
         return current_level * 100 + 50
@@ -86,10 +126,23 @@ class RPGPlayer:
             # Move to completed
             self.current_quests.remove(quest)
             self.completed_quests.append(quest)
+            self._emit('completed_quests', len(self.completed_quests), len(self.completed_quests) - 1)
             
             return quest['rewards']
         return None
     
+    def update_streak(self, activity_time=None):
+        activity_time = activity_time or datetime.now()
+        old = self.streak_days
+        if self.last_activity is None or (activity_time.date() - self.last_activity.date()).days > 1:
+            self.streak_days = 1
+        elif (activity_time.date() - self.last_activity.date()).days == 1:
+            self.streak_days += 1
+        self.last_activity = activity_time
+        if self.streak_days != old:
+            self._emit('streak_days', self.streak_days, old)
+        return self.streak_days
+    
     def get_status(self):
         return {
             'name': self.name,
@@ -170,6 +223,13 @@ class ComputerLab:
             }
         return None
 
+QUEST_SUBJECTS = {
+    'daily_study': 'mathematics',
+    'quiz_master': 'mathematics',
+    'code_warrior': 'programming',
+    'cross_subject': 'mathematics'
+}
+
 class QuestEngine:
     def __init__(self):
         self.quest_templates = self.load_quest_templates()
@@ -207,30 +267,33 @@ class QuestEngine:
             }
         }
     
-    def generate_daily_quests(self, player_level):
+    def generate_daily_quests(self, player_level, now=None):
+        now = now or datetime.now()
+        # Quests run to the end of their last calendar day, so tomorrow's batch never overlaps today's daily quest
+        midnight = datetime.combine(now.date(), datetime.min.time())
         quests = []
         
         # Always include daily study quest
-        daily_quest = self.quest_templates['daily_study'].copy()
-        daily_quest['id'] = f"daily_{datetime.now().strftime('%Y%m%d')}"
-        daily_quest['expires'] = datetime.now() + timedelta(days=1)
-        quests.append(daily_quest)
+        quests.append(self.instantiate_quest('daily_study', midnight + timedelta(days=1)))
         
         # Add level-appropriate quests
         if player_level >= 3:
-            quiz_quest = self.quest_templates['quiz_master'].copy()
-            quiz_quest['id'] = f"quiz_{random.randint(1000, 9999)}"
-            quiz_quest['expires'] = datetime.now() + timedelta(days=3)
-            quests.append(quiz_quest)
+            quests.append(self.instantiate_quest('quiz_master', midnight + timedelta(days=3)))
         
         if player_level >= 5:
-            code_quest = self.quest_templates['code_warrior'].copy()
-            code_quest['id'] = f"code_{random.randint(1000, 9999)}"
-            code_quest['expires'] = datetime.now() + timedelta(days=7)
-            quests.append(code_quest)
+            quests.append(self.instantiate_quest('code_warrior', midnight + timedelta(days=7)))
         
         return quests
     
+    def instantiate_quest(self, template_key, expires):
+        # Deep copy so quests never share requirement/reward dicts with the template
+        quest = copy.deepcopy(self.quest_templates[template_key])
+        quest['id'] = f"{template_key}_{uuid.uuid4().hex}"
+        quest['template'] = template_key
+        quest['expires'] = expires
+        quest.setdefault('subject', QUEST_SUBJECTS.get(template_key, 'mathematics'))
+        return quest
+    
     def create_story_quest(self, subject, difficulty='medium'):
         story_quests = {
             'physics': {
@@ -264,6 +327,163 @@ class QuestEngine:
         
         return story_quests.get(subject, story_quests['physics'])
 
+class QuestScheduler:
+    def __init__(self, quest_engine=None, players=None):
+        self.quest_engine = quest_engine or QuestEngine()
+        # Any mapping of player id -> RPGPlayer-like object (a dict, or a ColumnarPlayerStore)
+        self.players = players if players is not None else {}
+        self.expiry_heap = []
+        self.sequence = itertools.count()
+        self.quests = {}
+        # (player_id, metric) -> {quest_id: requirement counters}; events touch only their own bucket
+        self.requirement_index = {}
+        # player_id -> (date, templates generated that day)
+        self.generated_on = {}
+        self.lock = threading.RLock()
+        self.thread = None
+        self.stopped = threading.Event()
+    
+    def _player_ids(self):
+        return list(getattr(self.players, 'player_ids', None) or self.players.keys())
+    
+    def generate_daily_batch(self, now=None):
+        # Pre-generate today's quests for every player in one pass
+        now = now or datetime.now()
+        today = now.date()
+        generated = 0
+        with self.lock:
+            self.expire(now)
+            for player_id in self._player_ids():
+                day, done = self.generated_on.get(player_id, (None, set()))
+                if day != today:
+                    done = set()
+                player = self.players.get(player_id)
+                # Multi-day quests outlive a daily batch; keep one open quest per template. A template skipped
+                # for that reason is retried by later batches the same day, once its quest closes
+                open_templates = {quest.get('template') for quest in player.current_quests}
+                for quest in self.quest_engine.generate_daily_quests(player.level, now):
+                    if quest['template'] in done or quest['template'] in open_templates:
+                        continue
+                    self.assign(player_id, quest)
+                    done.add(quest['template'])
+                    generated += 1
+                self.generated_on[player_id] = (today, done)
+        return generated
+    
+    def assign(self, player_id, quest):
+        with self.lock:
+            player = self.players.get(player_id)
+            player.current_quests.append(quest)
+            self.quests[quest['id']] = player_id
+            heapq.heappush(self.expiry_heap, (quest['expires'], next(self.sequence), quest['id']))
+            counters = []
+            for metric, target, min_value, distinct in self._requirements(quest['requirements']):
+                counter = {'metric': metric, 'target': target, 'min_value': min_value,
+                           'progress': set() if distinct else 0}
+                counters.append(counter)
+                self.requirement_index.setdefault((player_id, metric), {})[quest['id']] = counters
+            quest['progress'] = counters
+        return quest
+    
+    def _requirements(self, requirements):
+        # Template requirements -> (event metric, target, minimum event value, count distinct keys)
+        if 'quiz_count' in requirements:
+            yield 'quiz', requirements['quiz_count'], requirements.get('quiz_score', 0), False
+        for metric, target in requirements.items():
+            if metric in ('quiz_count', 'quiz_score'):
+                continue
+            if metric == 'subjects_studied':
+                yield 'study_time', target, None, True
+            else:
+                yield metric, target, None, False
+    
+    def record_event(self, player_id, metric, amount=1, value=None, key=None):
+        completed = []
+        with self.lock:
+            watchers = self.requirement_index.get((player_id, metric))
+            if not watchers:
+                return completed
+            for quest_id, counters in list(watchers.items()):
+                for counter in counters:
+                    if counter['metric'] != metric:
+                        continue
+                    if counter['min_value'] is not None and (value is None or value < counter['min_value']):
+                        continue
+                    if isinstance(counter['progress'], set):
+                        if key is not None:
+                            counter['progress'].add(key)
+                    else:
+                        counter['progress'] += amount
+                if all(self._satisfied(counter) for counter in counters):
+                    rewards = self.players.get(player_id).complete_quest(quest_id)
+                    self._unindex(player_id, quest_id, counters)
+                    completed.append({'quest_id': quest_id, 'rewards': rewards})
+        return completed
+    
+    def _satisfied(self, counter):
+        progress = counter['progress']
+        return (len(progress) if isinstance(progress, set) else progress) >= counter['target']
+    
+    def record_study(self, player_id, subject, minutes):
+        return self.record_event(player_id, 'study_time', minutes, key=subject)
+    
+    def record_quiz(self, player_id, score):
+        return self.record_event(player_id, 'quiz', 1, value=score)
+    
+    def record_coding_challenge(self, player_id):
+        return self.record_event(player_id, 'coding_challenges', 1)
+    
+    def _unindex(self, player_id, quest_id, counters):
+        self.quests.pop(quest_id, None)
+        for metric in {counter['metric'] for counter in counters}:
+            watchers = self.requirement_index.get((player_id, metric))
+            if watchers is not None:
+                watchers.pop(quest_id, None)
+                if not watchers:
+                    del self.requirement_index[(player_id, metric)]
+    
+    def expire(self, now=None):
+        # Min-heap on expiry time: only quests that are actually due are touched
+        now = now or datetime.now()
+        expired = []
+        with self.lock:
+            while self.expiry_heap and self.expiry_heap[0][0] <= now:
+                _, _, quest_id = heapq.heappop(self.expiry_heap)
+                player_id = self.quests.get(quest_id)
+                if player_id is None:
+                    continue
+                player = self.players.get(player_id)
+                quest = next((q for q in player.current_quests if q['id'] == quest_id), None)
+                if quest is not None:
+                    player.current_quests.remove(quest)
+                    self._unindex(player_id, quest_id, quest.get('progress', []))
+                else:
+                    self.quests.pop(quest_id, None)
+                expired.append(quest_id)
+        return expired
+    
+    def start(self, interval=60):
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, args=(interval,))
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def stop(self):
+        if self.thread is None:
+            return
+        self.stopped.set()
+        self.thread.join()
+        self.thread = None
+    
+    def _run(self, interval):
+        # Each pass expires due quests; the first pass after midnight also generates the new day's quests
+        while True:
+            self.generate_daily_batch()
+            if self.stopped.wait(interval):
+                return
+
 class AchievementSystem:
     def __init__(self):
         self.achievements = {
@@ -272,74 +492,153 @@ class AchievementSystem:
                 'description': 'Complete your first lesson',
                 'icon': '🎯',
                 'rarity': 'common',
-                'rewards': {'coins': 25}
+                'rewards': {'coins': 25},
+                'rule': {'field': 'completed_quests', 'min': 1}
             },
             'week_warrior': {
                 'name': 'Week Warrior',
                 'description': 'Study for 7 consecutive days',
                 'icon': '🔥',
                 'rarity': 'uncommon',
-                'rewards': {'coins': 100, 'item': 'Streak Multiplier'}
+                'rewards': {'coins': 100, 'item': 'Streak Multiplier'},
+                'rule': {'field': 'streak_days', 'min': 7}
             },
             'quiz_perfectionist': {
                 'name': 'Quiz Perfectionist',
                 'description': 'Score 100% on 5 quizzes',
                 'icon': '💯',
                 'rarity': 'rare',
-                'rewards': {'coins': 200, 'badge': 'Perfectionist'}
+                'rewards': {'coins': 200, 'badge': 'Perfectionist'},
+                'rule': {'field': 'perfect_quizzes', 'min': 5}
             },
             'polymath': {
                 'name': 'Polymath',
                 'description': 'Reach level 10 in all subjects',
                 'icon': '🧠',
                 'rarity': 'legendary',
-                'rewards': {'coins': 500, 'avatar': 'Genius Avatar', 'title': 'Master Scholar'}
+                'rewards': {'coins': 500, 'avatar': 'Genius Avatar', 'title': 'Master Scholar'},
+                'rule': {'field': 'subjects.level', 'min': 10, 'all_subjects': True}
             },
             'code_ninja': {
                 'name': 'Code Ninja',
                 'description': 'Master 5 programming languages',
                 'icon': '🥷',
                 'rarity': 'epic',
-                'rewards': {'coins': 300, 'item': 'Code Katana', 'skill_boost': 'programming'}
+                'rewards': {'coins': 300, 'item': 'Code Katana', 'skill_boost': 'programming'},
+                'rule': {'field': 'languages_mastered', 'min': 5}
             }
         }
+        self.build_rule_index()
     
-    def check_achievements(self, player):
-        new_achievements = []
-        
-        # Check each achievement
+    def add_achievement(self, achievement_id, achievement):
+        self.achievements[achievement_id] = achievement
+        self.build_rule_index()
+    
+    def build_rule_index(self):
+        # field -> rules sorted by threshold, so a field change finds newly met rules with one bisect
+        index = {}
         for achievement_id, achievement in self.achievements.items():
-            if achievement_id not in player.achievements:
-                if self.is_achievement_unlocked(achievement_id, player):
-                    player.achievements.append(achievement_id)
-                    new_achievements.append(achievement)
-        
+            rule = achievement.get('rule')
+            if rule:
+                kind = 'all' if rule.get('all_subjects') else 'min'
+                index.setdefault((rule['field'], kind), []).append((rule['min'], achievement_id))
+        self.rule_index = {}
+        for key, rules in index.items():
+            rules.sort()
+            self.rule_index[key] = ([threshold for threshold, _ in rules], [achievement_id for _, achievement_id in rules])
+        self.index_version = getattr(self, 'index_version', 0) + 1
+    
+    def attach(self, player):
+        if getattr(player, 'achievement_state', None) is not None and \
+                player.achievement_state['index_version'] == self.index_version:
+            return
+        # pointers[key] = how many rules of that index entry are already unlocked (they unlock in threshold order)
+        player.achievement_state = {'index_version': self.index_version, 'subject_counts': {}, 'pointers': {}, 'new': []}
+        if self.on_field_change not in player.listeners:
+            player.add_listener(self.on_field_change)
+        # Seed every indexed field from the player's current state once
+        for field, kind in self.rule_index:
+            if kind == 'all':
+                thresholds, ids = self.rule_index[(field, kind)]
+                counts = player.achievement_state['subject_counts'][field] = [0] * len(ids)
+                for subject in player.subjects.values():
+                    for position in range(bisect.bisect_right(thresholds, self._field_value(player, field, subject))):
+                        counts[position] += 1
+                self._unlock_all_subject_rules(player, field)
+            else:
+                self._unlock_min_rules(player, field, self._field_value(player, field))
+    
+    def _field_value(self, player, field, subject_data=None):
+        if field.startswith('subjects.'):
+            return subject_data[field.split('.', 1)[1]] if subject_data else 0
+        value = getattr(player, field, 0)
+        return len(value) if isinstance(value, (list, dict, set)) else value
+    
+    def on_field_change(self, player, field, value, old=None, subject=None):
+        if player.achievement_state['index_version'] != self.index_version:
+            self.attach(player)
+            return
+        if (field, 'min') in self.rule_index:
+            self._unlock_min_rules(player, field, value)
+        if (field, 'all') in self.rule_index and subject is not None:
+            thresholds, _ = self.rule_index[(field, 'all')]
+            counts = player.achievement_state['subject_counts'][field]
+            # Only rules whose threshold the subject crossed change their count
+            low = bisect.bisect_right(thresholds, old if old is not None else float('-inf'))
+            high = bisect.bisect_right(thresholds, value)
+            for position in range(min(low, high), max(low, high)):
+                counts[position] += 1 if high > low else -1
+            if high > low:
+                self._unlock_all_subject_rules(player, field)
+    
+    def _unlock_min_rules(self, player, field, value):
+        thresholds, ids = self.rule_index[(field, 'min')]
+        pointers = player.achievement_state['pointers']
+        start = pointers.get((field, 'min'), 0)
+        end = bisect.bisect_right(thresholds, value)
+        for position in range(start, end):
+            self._unlock(player, ids[position])
+        pointers[(field, 'min')] = max(start, end)
+    
+    def _unlock_all_subject_rules(self, player, field):
+        _, ids = self.rule_index[(field, 'all')]
+        counts = player.achievement_state['subject_counts'][field]
+        pointers = player.achievement_state['pointers']
+        position = pointers.get((field, 'all'), 0)
+        while position < len(counts) and counts[position] >= len(player.subjects):
+            self._unlock(player, ids[position])
+            position += 1
+        pointers[(field, 'all')] = position
+    
+    def _unlock(self, player, achievement_id):
+        if achievement_id not in player.achievements:
+            player.achievements.append(achievement_id)
+            player.achievement_state['new'].append(self.achievements[achievement_id])
+    
+    def check_achievements(self, player):
+        # Unlocks happen as field changes arrive; this drains the ones not yet reported
+        if getattr(player, 'achievement_state', None) is None or \
+                player.achievement_state['index_version'] != self.index_version:
+            self.attach(player)
+        new_achievements = player.achievement_state['new']
+        player.achievement_state['new'] = []
         return new_achievements
     
     def is_achievement_unlocked(self, achievement_id, player):
-        if achievement_id == 'first_steps':
-            return len(player.completed_quests) > 0
-        elif achievement_id == 'week_warrior':
-            return player.streak_days >= 7
-        elif achievement_id == 'quiz_perfectionist':
-            # Would need to track perfect quiz scores
-            return False  # Placeholder
-        elif achievement_id == 'polymath':
-            return all(subject['level'] >= 10 for subject in player.subjects.values())
-        elif achievement_id == 'code_ninja':
-            # Would need to track programming language mastery
-            return False  # Placeholder
-        
-        return False
+        rule = self.achievements.get(achievement_id, {}).get('rule')
+        if not rule:
+            return False
+        if rule.get('all_subjects'):
+            return all(self._field_value(player, rule['field'], subject) >= rule['min']
+                       for subject in player.subjects.values())
+        return self._field_value(player, rule['field']) >= rule['min']
 
 class SocialSystem:
     def __init__(self):
-        self.leaderboards = {
-            'global_xp': [],
-            'weekly_study_time': [],
-            'quiz_scores': [],
-            'coding_challenges': []
-        }
+        self.leaderboards = LeaderboardEngine(
+            boards=('global_xp', 'quiz_scores', 'coding_challenges'),
+            weekly_boards=('weekly_study_time',)
+        )
         self.study_groups = []
         self.competitions = []
         
@@ -393,6 +692,7 @@ class CodingGameEngine:
     def __init__(self):
         self.coding_quests = self.initialize_coding_quests()
         self.mini_games = self.initialize_mini_games()
+        self.active_races = {}
         
     def initialize_coding_quests(self):
         return {
@@ -484,6 +784,55 @@ def find_treasure_path(maze, start, treasure):
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
+    def start_algorithm_race(self, algorithm, expected_output, language='python', time_limit=10):
+        if algorithm not in self.mini_games['algorithm_race']['algorithms']:
+            return None
+        race_id = f"race_{algorithm}_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.active_races[race_id] = {
+            'id': race_id,
+            'algorithm': algorithm,
+            'language': language,
+            'expected_output': expected_output,
+            'time_limit': time_limit,
+            'start_time': datetime.now(),
+            'submissions': {}
+        }
+        return self.active_races[race_id]
+
+    def submit_race_solution(self, race_id, player_id, run_result):
+        # run_result is the dict returned by a multi_subject_core execute_code call, including 'metrics'
+        race = self.active_races.get(race_id)
+        if not race:
+            return None
+        metrics = run_result.get('metrics', {})
+        correct = (run_result.get('success', False) and
+                   run_result.get('output', '').strip() == race['expected_output'].strip())
+        submission = {
+            'player_id': player_id,
+            'correct': correct,
+            'cpu_time': metrics.get('cpu_time', float('inf')),
+            # Informational only; tiny programs all read about the same, so it is no tiebreaker
+            'peak_rss_kb': metrics.get('peak_rss_kb'),
+            'wall_time': metrics.get('run_time', metrics.get('wall_time', float('inf'))),
+            'submitted_at': datetime.now()
+        }
+        # Keep each player's best correct run
+        previous = race['submissions'].get(player_id)
+        if previous is None or self._race_sort_key(submission) < self._race_sort_key(previous):
+            race['submissions'][player_id] = submission
+        return submission
+
+    def get_race_rankings(self, race_id):
+        race = self.active_races.get(race_id)
+        if not race:
+            return []
+        ranked = sorted(race['submissions'].values(), key=self._race_sort_key)
+        return [{'rank': position, **submission} for position, submission in enumerate(ranked, 1)]
+
+    def _race_sort_key(self, submission):
+        # Correct solutions first, then measured CPU time and wall time
+        return (not submission['correct'], submission['cpu_time'], submission['wall_time'], submission['submitted_at'])
+
 class MotivationalSystem:
     def __init__(self):
         self.motivational_messages = {
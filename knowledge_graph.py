@@ -0,0 +1,176 @@
+import numpy as np
+
+# Prerequisites that cross subject boundaries: topic -> topics it builds on
+CROSS_SUBJECT_PREREQUISITES = {
+    'physics.mechanics.kinematics': ['mathematics.calculus.derivatives', 'mathematics.trigonometry.sin'],
+    'physics.mechanics.energy': ['mathematics.calculus.integrals'],
+    'physics.electromagnetism.electric_field': ['mathematics.calculus.integrals'],
+    'physics.modern_physics.quantum': ['mathematics.algebra.matrices', 'mathematics.probability.distributions'],
+    'physics.optics.interference': ['mathematics.trigonometry.identities'],
+    'chemistry.physical.thermochemistry': ['physics.thermodynamics.heat'],
+    'chemistry.physical.kinetics': ['mathematics.calculus.derivatives'],
+    'chemistry.inorganic.periodic_table': ['physics.modern_physics.atomic_structure'],
+    'chemistry.analytical.spectroscopy': ['physics.optics.refraction'],
+    'biology.cell_biology.membrane': ['chemistry.inorganic.bonding'],
+    'biology.genetics.dna': ['chemistry.organic.functional_groups'],
+    'biology.ecology.biodiversity': ['mathematics.probability.statistics'],
+    'biology.evolution.natural_selection': ['biology.genetics.inheritance'],
+    'programming.algorithms.recursion': ['mathematics.discrete.logic'],
+    'programming.algorithms.dp': ['mathematics.discrete.combinatorics'],
+    'programming.data_structures.graphs': ['mathematics.discrete.graph_theory'],
+    'social_studies.economics.markets': ['mathematics.algebra.functions'],
+    'social_studies.economics.finance': ['mathematics.probability.statistics'],
+    'history.modern.industrial_revolution': ['history.medieval.renaissance'],
+    'history.contemporary.technology': ['history.modern.industrial_revolution'],
+    'english.writing.technical': ['english.grammar.sentence_structure'],
+}
+
+class KnowledgeGraph:
+    def __init__(self, nodes, edges):
+        # edges are (prerequisite, topic) pairs; the structure is immutable once built
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        # Bare names like 'derivatives' resolve when they are unique across subjects
+        aliases = {}
+        for node in self.nodes:
+            for name in (node.split('.', 1)[-1], node.rsplit('.', 1)[-1]):
+                aliases.setdefault(name, set()).add(node)
+        self.aliases = {name: found.pop() for name, found in aliases.items() if len(found) == 1}
+
+        n = len(self.nodes)
+        pairs = np.array(sorted({(self.index[topic], self.index[prerequisite]) for prerequisite, topic in edges}),
+                         dtype=np.int32).reshape(-1, 2)
+        # CSR adjacency: prerequisites of node i are indices[indptr[i]:indptr[i + 1]]
+        self.indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(pairs[:, 0], minlength=n), out=self.indptr[1:])
+        self.indices = pairs[:, 1].copy()
+        reverse = pairs[np.lexsort((pairs[:, 0], pairs[:, 1]))]
+        self.rev_indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(reverse[:, 1], minlength=n), out=self.rev_indptr[1:])
+        self.rev_indices = reverse[:, 0].copy()
+
+        self.order = self._topological_order()
+        self.rank = np.empty(n, dtype=np.int32)
+        self.rank[self.order] = np.arange(n, dtype=np.int32)
+        # Bit i of closure[v] is set when node i is a direct or transitive prerequisite of v
+        self.direct = [0] * n
+        self.closure = [0] * n
+        for v in self.order.tolist():
+            mask = closure = 0
+            for u in self.indices[self.indptr[v]:self.indptr[v + 1]].tolist():
+                mask |= 1 << u
+                closure |= self.closure[u]
+            self.direct[v] = mask
+            self.closure[v] = closure | mask
+        self.dependents_closure = [0] * n
+        for v in self.order[::-1].tolist():
+            closure = 0
+            for u in self.rev_indices[self.rev_indptr[v]:self.rev_indptr[v + 1]].tolist():
+                closure |= (1 << u) | self.dependents_closure[u]
+            self.dependents_closure[v] = closure
+
+    @classmethod
+    def from_subjects(cls, subject_modules, cross_links=None):
+        # Subtopics are learned in listed order; a topic node stands for completing all of its subtopics
+        nodes, edges = [], []
+        for subject, module in subject_modules.items():
+            topics = getattr(module, 'topics', None) or getattr(module, 'concepts', {})
+            for topic, subtopics in topics.items():
+                topic_id = f"{subject}.{topic}"
+                previous = None
+                for subtopic in subtopics:
+                    node = f"{topic_id}.{subtopic}"
+                    nodes.append(node)
+                    if previous is not None:
+                        edges.append((previous, node))
+                    edges.append((node, topic_id))
+                    previous = node
+                nodes.append(topic_id)
+        known = set(nodes)
+        for topic, prerequisites in (CROSS_SUBJECT_PREREQUISITES if cross_links is None else cross_links).items():
+            edges.extend((prerequisite, topic) for prerequisite in prerequisites
+                         if prerequisite in known and topic in known)
+        return cls(nodes, edges)
+
+    def _topological_order(self):
+        n = len(self.nodes)
+        remaining = np.diff(self.indptr).astype(np.int32)
+        ready = sorted(np.flatnonzero(remaining == 0).tolist())
+        order = []
+        while ready:
+            v = ready.pop()
+            order.append(v)
+            for u in self.rev_indices[self.rev_indptr[v]:self.rev_indptr[v + 1]].tolist():
+                remaining[u] -= 1
+                if remaining[u] == 0:
+                    ready.append(u)
+        if len(order) != n:
+            cyclic = [self.nodes[i] for i in np.flatnonzero(remaining > 0).tolist()]
+            raise ValueError(f"Prerequisite cycle among: {', '.join(cyclic[:10])}")
+        return np.array(order, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, topic):
+        return topic in self.index or topic in self.aliases
+
+    def resolve(self, topic):
+        index = self.index.get(topic)
+        if index is None:
+            node = self.aliases.get(topic)
+            if node is None:
+                raise KeyError(topic)
+            index = self.index[node]
+        return index
+
+    def mask(self, topics):
+        mask = 0
+        for topic in topics:
+            mask |= 1 << self.resolve(topic)
+        return mask
+
+    def _nodes(self, mask):
+        # Decode a bitset into node ids in topological order
+        indices = []
+        while mask:
+            low = mask & -mask
+            indices.append(low.bit_length() - 1)
+            mask ^= low
+        indices.sort(key=self.rank.__getitem__)
+        return [self.nodes[i] for i in indices]
+
+    def is_prerequisite(self, prerequisite, topic):
+        return bool(self.closure[self.resolve(topic)] >> self.resolve(prerequisite) & 1)
+
+    def direct_prerequisites(self, topic):
+        return self._nodes(self.direct[self.resolve(topic)])
+
+    def prerequisites(self, topic):
+        return self._nodes(self.closure[self.resolve(topic)])
+
+    def dependents(self, topic):
+        return self._nodes(self.dependents_closure[self.resolve(topic)])
+
+    def missing_prerequisites(self, topic, known=()):
+        return self._nodes(self.closure[self.resolve(topic)] & ~self.mask(known))
+
+    def learning_path(self, targets, known=()):
+        # Everything the targets need that is not yet known, in an order that respects prerequisites
+        needed = 0
+        for target in targets:
+            index = self.resolve(target)
+            needed |= self.closure[index] | (1 << index)
+        return self._nodes(needed & ~self.mask(known))
+
+    def ready_topics(self, known=()):
+        # Topics whose direct prerequisites are all known
+        known_mask = self.mask(known)
+        return [self.nodes[v] for v in self.order.tolist()
+                if not known_mask >> v & 1 and self.direct[v] & ~known_mask == 0]
+
+    def topological_order(self, subject=None):
+        nodes = [self.nodes[v] for v in self.order.tolist()]
+        if subject is None:
+            return nodes
+        return [node for node in nodes if node.split('.', 1)[0] == subject]
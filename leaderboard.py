@@ -0,0 +1,236 @@
+import random
+import time
+from datetime import datetime
+
+class _SkipNode:
+    __slots__ = ('key', 'member', 'score', 'forward', 'span')
+
+    def __init__(self, key, member, score, level):
+        self.key = key
+        self.member = member
+        self.score = score
+        self.forward = [None] * level
+        # span[i] = number of bottom-level steps that forward[i] jumps over, which makes ranks O(log n)
+        self.span = [0] * level
+
+class SkipListLeaderboard:
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self):
+        self.head = _SkipNode(None, None, None, self.MAX_LEVEL)
+        self.level = 1
+        self.length = 0
+        self.scores = {}
+
+    def __len__(self):
+        return self.length
+
+    def _random_level(self):
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def _key(self, member, score):
+        # Highest score first, ties broken by member id so the order is total
+        return (-score, member)
+
+    def set(self, member, score):
+        old = self.scores.get(member)
+        if old is not None:
+            if old == score:
+                return
+            self._delete(self._key(member, old))
+        self._insert(self._key(member, score), member, score)
+        self.scores[member] = score
+
+    def increment(self, member, amount):
+        score = self.scores.get(member, 0) + amount
+        self.set(member, score)
+        return score
+
+    def remove(self, member):
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        self._delete(self._key(member, score))
+        return True
+
+    def _insert(self, key, member, score):
+        update = [None] * self.MAX_LEVEL
+        rank = [0] * self.MAX_LEVEL
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            rank[i] = 0 if i == self.level - 1 else rank[i + 1]
+            while node.forward[i] is not None and node.forward[i].key < key:
+                rank[i] += node.span[i]
+                node = node.forward[i]
+            update[i] = node
+        level = self._random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                rank[i] = 0
+                update[i] = self.head
+                self.head.span[i] = self.length
+            self.level = level
+        new = _SkipNode(key, member, score, level)
+        for i in range(level):
+            new.forward[i] = update[i].forward[i]
+            update[i].forward[i] = new
+            new.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i].span[i] += 1
+        self.length += 1
+
+    def _delete(self, key):
+        update = [None] * self.MAX_LEVEL
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+        target = node.forward[0]
+        if target is None or target.key != key:
+            return False
+        for i in range(self.level):
+            if update[i].forward[i] is target:
+                update[i].span[i] += target.span[i] - 1
+                update[i].forward[i] = target.forward[i]
+            else:
+                update[i].span[i] -= 1
+        while self.level > 1 and self.head.forward[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
+        return True
+
+    def rank(self, member):
+        score = self.scores.get(member)
+        if score is None:
+            return None
+        key = self._key(member, score)
+        traversed = 0
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if node.key == key:
+                return traversed
+        return None
+
+    def _node_at(self, rank):
+        traversed = 0
+        node = self.head
+        for i in range(self.level - 1, -1, -1):
+            while node.forward[i] is not None and traversed + node.span[i] <= rank:
+                traversed += node.span[i]
+                node = node.forward[i]
+            if traversed == rank:
+                return node
+        return None
+
+    def range(self, start_rank, count):
+        # 1-based ranks; one O(log n) seek, then a walk along the bottom level
+        entries = []
+        if start_rank < 1 or count <= 0:
+            return entries
+        node = self._node_at(start_rank)
+        rank = start_rank
+        while node is not None and len(entries) < count:
+            entries.append({'rank': rank, 'player_id': node.member, 'score': node.score})
+            node = node.forward[0]
+            rank += 1
+        return entries
+
+class LeaderboardEngine:
+    def __init__(self, boards=('global_xp', 'quiz_scores', 'coding_challenges'),
+                 weekly_boards=('weekly_study_time',), keep_weeks=4):
+        self.boards = {name: SkipListLeaderboard() for name in boards}
+        self.weekly_boards = set(weekly_boards)
+        self.keep_weeks = keep_weeks
+        # weekly board name -> {week key: board}, oldest week first
+        self.weekly = {name: {} for name in weekly_boards}
+
+    def week_key(self, now=None):
+        year, week, _ = (now or datetime.now()).isocalendar()
+        return f"{year}-W{week:02d}"
+
+    def board(self, name, now=None, week=None):
+        if name not in self.weekly_boards:
+            if name not in self.boards:
+                self.boards[name] = SkipListLeaderboard()
+            return self.boards[name]
+        weeks = self.weekly[name]
+        key = week or self.week_key(now)
+        if key not in weeks:
+            if week is not None:
+                return None
+            # A new week starts a fresh board; weeks past the retention are dropped
+            weeks[key] = SkipListLeaderboard()
+            while len(weeks) > self.keep_weeks:
+                del weeks[next(iter(weeks))]
+        return weeks[key]
+
+    def submit_score(self, name, player_id, score, now=None):
+        self.board(name, now).set(player_id, score)
+
+    def submit_best_score(self, name, player_id, score, now=None):
+        board = self.board(name, now)
+        if score > board.scores.get(player_id, float('-inf')):
+            board.set(player_id, score)
+
+    def increment(self, name, player_id, amount, now=None):
+        return self.board(name, now).increment(player_id, amount)
+
+    def get_rank(self, name, player_id, now=None, week=None):
+        board = self.board(name, now, week)
+        return board.rank(player_id) if board else None
+
+    def get_page(self, name, page=1, page_size=10, now=None, week=None):
+        board = self.board(name, now, week)
+        if board is None:
+            return []
+        return board.range((page - 1) * page_size + 1, page_size)
+
+    def get_around(self, name, player_id, radius=5, now=None, week=None):
+        board = self.board(name, now, week)
+        rank = board.rank(player_id) if board else None
+        if rank is None:
+            return []
+        start = max(1, rank - radius)
+        return board.range(start, rank - start + radius + 1)
+
+def benchmark(players=1_000_000, operations=100_000, seed=7):
+    random.seed(seed)
+    board = SkipListLeaderboard()
+    ids = [f"player_{i}" for i in range(players)]
+    report = {'players': players}
+
+    start = time.perf_counter()
+    for player_id in ids:
+        board.set(player_id, random.randint(0, 1_000_000))
+    report['insert_us_per_op'] = (time.perf_counter() - start) / players * 1e6
+
+    sample = random.sample(ids, operations)
+    start = time.perf_counter()
+    for player_id in sample:
+        board.increment(player_id, random.randint(1, 500))
+    report['update_us_per_op'] = (time.perf_counter() - start) / operations * 1e6
+
+    start = time.perf_counter()
+    for player_id in sample:
+        board.rank(player_id)
+    report['rank_us_per_op'] = (time.perf_counter() - start) / operations * 1e6
+
+    pages = operations // 10
+    start = time.perf_counter()
+    for _ in range(pages):
+        board.range(random.randint(1, players - 50), 50)
+    report['page_of_50_us'] = (time.perf_counter() - start) / pages * 1e6
+    return report
+
+if __name__ == "__main__":
+    for key, value in benchmark().items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
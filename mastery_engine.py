@@ -0,0 +1,224 @@
+import time
+import numpy as np
+
+LEVELS = ['beginner', 'intermediate', 'advanced', 'expert']
+# Named difficulties as offsets on the Elo (logit) scale of the concept
+DIFFICULTY_OFFSETS = {'easy': -1.0, 'medium': 0.0, 'hard': 1.0, 'expert': 2.0}
+# Level names used elsewhere in the app for the same scale
+DIFFICULTY_ALIASES = {'beginner': 'easy', 'intermediate': 'medium', 'advanced': 'hard'}
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+class MasteryEngine:
+    def __init__(self, p_init=0.2, p_learn=0.15, p_slip=0.1, p_guess=0.2, elo_k=0.8, elo_item_k=0.4,
+                 capacity=1024):
+        # Bayesian knowledge tracing for P(known), Elo ratings for ability vs. concept difficulty
+        self.p_init = p_init
+        self.p_learn = p_learn
+        self.p_slip = p_slip
+        self.p_guess = p_guess
+        self.elo_k = elo_k
+        self.elo_item_k = elo_item_k
+        self.students = {}
+        self.concepts = {}
+        # (student index, concept index) -> row in the per-cell arrays
+        self.cells = {}
+        self.size = 0
+        self.capacity = 0
+        self.cell_student = np.empty(0, dtype=np.int32)
+        self.cell_concept = np.empty(0, dtype=np.int32)
+        self.p_known = np.empty(0, dtype=np.float64)
+        self.ability = np.empty(0, dtype=np.float64)
+        self.attempts = np.empty(0, dtype=np.int32)
+        self.concept_difficulty = np.zeros(0, dtype=np.float64)
+        self.concept_attempts = np.zeros(0, dtype=np.int32)
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        defaults = {'cell_student': -1, 'cell_concept': -1, 'p_known': self.p_init, 'ability': 0.0, 'attempts': 0}
+        for column, default in defaults.items():
+            old = getattr(self, column)
+            grown = np.full(capacity, default, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, column, grown)
+        self.capacity = capacity
+
+    def _index(self, mapping, key):
+        index = mapping.get(key)
+        if index is None:
+            index = mapping[key] = len(mapping)
+            if mapping is self.concepts and index >= len(self.concept_difficulty):
+                grown = max(64, 2 * len(self.concept_difficulty))
+                self.concept_difficulty = np.concatenate([self.concept_difficulty,
+                                                          np.zeros(grown - len(self.concept_difficulty))])
+                self.concept_attempts = np.concatenate([self.concept_attempts,
+                                                        np.zeros(grown - len(self.concept_attempts), dtype=np.int32)])
+        return index
+
+    def _cell(self, student_id, concept_id):
+        student = self._index(self.students, student_id)
+        concept = self._index(self.concepts, concept_id)
+        row = self.cells.get((student, concept))
+        if row is None:
+            if self.size == self.capacity:
+                self._grow(max(1024, self.capacity * 2))
+            row = self.cells[(student, concept)] = self.size
+            self.cell_student[row] = student
+            self.cell_concept[row] = concept
+            self.size += 1
+        return row
+
+    def _difficulty(self, difficulty):
+        if difficulty is None:
+            return 0.0
+        if not isinstance(difficulty, str):
+            return float(difficulty)
+        label = difficulty.strip().lower()
+        label = DIFFICULTY_ALIASES.get(label, label)
+        if label in DIFFICULTY_OFFSETS:
+            return DIFFICULTY_OFFSETS[label]
+        try:
+            return float(label)
+        except ValueError:
+            # Unknown labels rate as medium, as any difficulty was accepted before
+            return 0.0
+
+    def record_attempt(self, student_id, concept_id, correct, difficulty=None):
+        # correct may be 0/1 or a score fraction, which is treated as soft evidence
+        row = self._cell(student_id, concept_id)
+        self._update(np.array([row]), np.array([float(correct)]), np.array([self._difficulty(difficulty)]))
+        return self.state(student_id, concept_id)
+
+    def _update(self, rows, observed, offsets):
+        # One vectorized step; rows must be distinct within the call and so must their concepts
+        self._trace(rows, observed)
+        self._rate(rows, observed, offsets)
+
+    def _trace(self, rows, observed):
+        # Knowledge tracing is per cell, so a cell's attempts only need to stay in order among themselves
+        p = self.p_known[rows]
+        known_if_correct = p * (1 - self.p_slip) / (p * (1 - self.p_slip) + (1 - p) * self.p_guess)
+        known_if_wrong = p * self.p_slip / (p * self.p_slip + (1 - p) * (1 - self.p_guess))
+        posterior = observed * known_if_correct + (1 - observed) * known_if_wrong
+        self.p_known[rows] = posterior + (1 - posterior) * self.p_learn
+
+    def _rate(self, rows, observed, offsets):
+        # Elo couples every cell of a concept through its difficulty, so a concept's attempts must stay in order
+        concepts = self.cell_concept[rows]
+        surprise = observed - _sigmoid(self.ability[rows] - self.concept_difficulty[concepts] - offsets)
+        # Step sizes shrink as evidence accumulates, so early attempts move ratings the most
+        self.ability[rows] += self.elo_k / (1 + 0.05 * self.attempts[rows]) * surprise
+        self.concept_difficulty[concepts] -= self.elo_item_k / (1 + 0.05 * self.concept_attempts[concepts]) * surprise
+        self.concept_attempts[concepts] += 1
+        self.attempts[rows] += 1
+
+    def _rounds(self, keys):
+        # Round k holds the k-th attempt of every key, so attempts sharing a key are applied in time order
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(sorted_keys)) + 1]
+        counts = np.diff(np.r_[starts, len(sorted_keys)])
+        position = np.arange(len(sorted_keys)) - np.repeat(starts, counts)
+        by_round = order[np.argsort(position, kind='stable')]
+        bounds = np.r_[0, np.cumsum(np.bincount(position))]
+        return [by_round[bounds[step]:bounds[step + 1]] for step in range(len(bounds) - 1)]
+
+    def update_batch(self, student_ids, concept_ids, observed, difficulties=None):
+        # Attempts must be in time order. Tracing runs one round per attempt of the busiest cell and Elo one
+        # round per attempt of the busiest concept, which replays exactly what sequential updates would do
+        rows = np.fromiter((self._cell(student, concept) for student, concept in zip(student_ids, concept_ids)),
+                           dtype=np.int64, count=len(student_ids))
+        observed = np.asarray(observed, dtype=np.float64)
+        if difficulties is None:
+            offsets = np.zeros(len(rows))
+        else:
+            offsets = np.array([self._difficulty(difficulty) for difficulty in difficulties], dtype=np.float64)
+        if not len(rows):
+            return 0
+        cell_rounds = self._rounds(rows)
+        for picked in cell_rounds:
+            self._trace(rows[picked], observed[picked])
+        concept_rounds = self._rounds(self.cell_concept[rows])
+        for picked in concept_rounds:
+            self._rate(rows[picked], observed[picked], offsets[picked])
+        return max(len(cell_rounds), len(concept_rounds))
+
+    def recompute(self, student_ids, concept_ids, observed, difficulties=None):
+        self.cells = {}
+        self.students = {}
+        self.concepts = {}
+        self.size = 0
+        self.concept_difficulty = np.zeros(0, dtype=np.float64)
+        self.concept_attempts = np.zeros(0, dtype=np.int32)
+        self._grow(max(1024, self.capacity))
+        return self.update_batch(student_ids, concept_ids, observed, difficulties)
+
+    def mastery(self, student_id, concept_id):
+        row = self._row(student_id, concept_id)
+        return float(self.p_known[row]) if row is not None else self.p_init
+
+    def _row(self, student_id, concept_id):
+        student = self.students.get(student_id)
+        concept = self.concepts.get(concept_id)
+        if student is None or concept is None:
+            return None
+        return self.cells.get((student, concept))
+
+    def success_probability(self, student_id, concept_id, difficulty=None):
+        row = self._row(student_id, concept_id)
+        ability = self.ability[row] if row is not None else 0.0
+        concept = self.concepts.get(concept_id)
+        item = self.concept_difficulty[concept] if concept is not None else 0.0
+        return float(_sigmoid(ability - item - self._difficulty(difficulty)))
+
+    def recommended_offset(self, student_id, concept_id, target=0.75):
+        # Difficulty offset at which the learner is expected to succeed with probability `target`
+        row = self._row(student_id, concept_id)
+        ability = self.ability[row] if row is not None else 0.0
+        concept = self.concepts.get(concept_id)
+        item = self.concept_difficulty[concept] if concept is not None else 0.0
+        return float(ability - item - np.log(target / (1 - target)))
+
+    def level(self, student_id, concept_id):
+        mastery = self.mastery(student_id, concept_id)
+        return LEVELS[min(len(LEVELS) - 1, int(mastery * len(LEVELS)))]
+
+    def weak_concepts(self, student_id, threshold=0.5):
+        student = self.students.get(student_id)
+        if student is None:
+            return []
+        names = {index: concept for concept, index in self.concepts.items()}
+        rows = np.flatnonzero((self.cell_student[:self.size] == student) & (self.p_known[:self.size] < threshold))
+        return [names[self.cell_concept[row]] for row in rows]
+
+    def state(self, student_id, concept_id):
+        row = self._row(student_id, concept_id)
+        return {
+            'mastery': float(self.p_known[row]),
+            'ability': float(self.ability[row]),
+            'attempts': int(self.attempts[row]),
+            'concept_difficulty': float(self.concept_difficulty[self.cell_concept[row]]),
+            'level': self.level(student_id, concept_id)
+        }
+
+def benchmark(students=2000, concepts=200, attempts=2_000_000, seed=11):
+    # A semester for a school: every attempt of every student, replayed from scratch
+    rng = np.random.default_rng(seed)
+    student_ids = rng.integers(0, students, attempts)
+    concept_ids = rng.integers(0, concepts, attempts)
+    observed = (rng.random(attempts) < 0.7).astype(np.float64)
+    engine = MasteryEngine()
+    start = time.perf_counter()
+    rounds = engine.recompute(student_ids.tolist(), concept_ids.tolist(), observed)
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    for i in range(100_000):
+        engine.mastery(int(student_ids[i]), int(concept_ids[i]))
+    lookup = (time.perf_counter() - start) / 100_000 * 1e6
+    return {'attempts': attempts, 'cells': engine.size, 'rounds': rounds,
+            'recompute_s': elapsed, 'lookup_us': lookup}
+
+if __name__ == "__main__":
+    for key, value in benchmark().items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
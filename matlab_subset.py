@@ -0,0 +1,1257 @@
+import re
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class MatlabSyntaxError(ValueError):
+    def __init__(self, message, line=None):
+        self.line = line
+        super().__init__(f"Line {line}: {message}" if line else message)
+
+class MatlabRuntimeError(Exception):
+    pass
+
+KEYWORDS = {'if', 'elseif', 'else', 'end', 'for', 'while', 'break', 'continue', 'function', 'return'}
+
+# Tokens after which whitespace + a value starts a new matrix element, and after which ' is a transpose
+VALUE_END = {'num', 'id', 'str', ')', ']', "'", ".'", 'end'}
+
+OPERATORS = ['...', '.*', './', '.\\', '.^', ".'", '==', '~=', '!=', '<=', '>=', '&&', '||',
+             '+', '-', '*', '/', '\\', '^', '<', '>', '&', '|', '~', '!', '=', '(', ')',
+             '[', ']', ',', ';', ':', "'"]
+
+TOKEN_RE = re.compile(r"""
+    (?P<num>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<id>[A-Za-z_]\w*)
+  | (?P<ws>[ \t]+)
+  | (?P<newline>\r?\n)
+  | (?P<comment>%[^\n]*)
+""", re.VERBOSE)
+
+class MatlabSubsetCompiler:
+    def __init__(self, max_cached=256):
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def compile(self, source):
+        # Parsing and translation run once per distinct source; reruns reuse the code object
+        key = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry
+            self.stats['misses'] += 1
+
+        python_source = self.translate(source)
+        entry = {
+            'python_source': python_source,
+            'code': compile(python_source, '<matlab>', 'exec')
+        }
+        with self.lock:
+            self.cache[key] = entry
+            while len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+        return entry
+
+    def translate(self, source):
+        statements = MatlabParser(self.tokenize(source)).parse_program()
+        return MatlabCodeGenerator().generate(statements)
+
+    def run(self, source, workspace=None):
+        entry = self.compile(source)
+        output = []
+        namespace = dict(RUNTIME_NAMESPACE)
+        if workspace:
+            namespace.update({'m_' + name: _copy(value) for name, value in workspace.items()})
+        namespace['_get'] = namespace.get
+        _OUTPUT.local.sink = output.append
+        try:
+            with np.errstate(all='ignore'):
+                exec(entry['code'], namespace)
+        except _Return:
+            pass
+        finally:
+            _OUTPUT.local.sink = None
+        variables = {name[2:]: value for name, value in namespace.items() if name.startswith('m_')}
+        return {'output': ''.join(output), 'variables': variables}
+
+    def tokenize(self, source):
+        tokens = []
+        brackets = []
+        pos = 0
+        line = 1
+        length = len(source)
+        space_before = False
+        while pos < length:
+            char = source[pos]
+
+            # Block comments %{ ... %} on their own lines
+            if source.startswith('%{', pos) and source[pos + 2:pos + 3] in ('', '\n', '\r'):
+                close = source.find('%}', pos)
+                if close == -1:
+                    raise MatlabSyntaxError("Unterminated block comment", line)
+                line += source.count('\n', pos, close)
+                pos = close + 2
+                continue
+
+            if char in "'\"":
+                prev = tokens[-1]['type'] if tokens else None
+                in_matrix = brackets and brackets[-1] == '['
+                if char == "'" and prev in VALUE_END and not (space_before and in_matrix):
+                    # After a value ' is the transpose operator, except for [a 'str'] inside matrices
+                    tokens.append({'type': "'", 'value': "'", 'line': line})
+                    pos += 1
+                    space_before = False
+                    continue
+                value, pos = self._read_string(source, pos, line)
+                self._add_value(tokens, brackets, space_before, {'type': 'str', 'value': value, 'line': line})
+                space_before = False
+                continue
+
+            if source.startswith('...', pos):
+                # Line continuation: skip to the next line
+                newline = source.find('\n', pos)
+                pos = length if newline == -1 else newline + 1
+                line += 1
+                space_before = True
+                continue
+
+            match = TOKEN_RE.match(source, pos)
+            if match:
+                kind = match.lastgroup
+                text = match.group()
+                pos = match.end()
+                if kind == 'ws' or kind == 'comment':
+                    space_before = True
+                    continue
+                if kind == 'newline':
+                    if brackets and brackets[-1] == '[':
+                        tokens.append({'type': ';', 'value': ';', 'line': line})
+                    elif not brackets:
+                        tokens.append({'type': 'newline', 'value': '\n', 'line': line})
+                    line += 1
+                    space_before = True
+                    continue
+                if kind == 'id' and text in KEYWORDS:
+                    token = {'type': text, 'value': text, 'line': line}
+                    if text == 'end' and brackets:
+                        self._add_value(tokens, brackets, space_before, token)
+                    else:
+                        tokens.append(token)
+                else:
+                    value = float(text) if kind == 'num' else text
+                    self._add_value(tokens, brackets, space_before, {'type': kind, 'value': value, 'line': line})
+                space_before = False
+                continue
+
+            for op in OPERATORS:
+                if source.startswith(op, pos):
+                    break
+            else:
+                raise MatlabSyntaxError(f"Unexpected character '{char}'", line)
+
+            token = {'type': op, 'value': op, 'line': line}
+            if op in ('(', '['):
+                self._add_value(tokens, brackets, space_before, token)
+                brackets.append(op)
+            elif op in ('+', '-', '~', '!') and brackets and brackets[-1] == '[' and space_before \
+                    and source[pos + 1:pos + 2] not in (' ', '\t', '=') and tokens \
+                    and tokens[-1]['type'] in VALUE_END:
+                # [1 -2] is two elements, [1 - 2] and [1 -= ...] are not
+                tokens.append({'type': ',', 'value': ',', 'line': line})
+                tokens.append(token)
+            else:
+                if op in (')', ']'):
+                    if not brackets:
+                        raise MatlabSyntaxError(f"Unbalanced '{op}'", line)
+                    brackets.pop()
+                tokens.append(token)
+            pos += len(op)
+            space_before = False
+
+        if brackets:
+            raise MatlabSyntaxError("Unbalanced brackets", line)
+        tokens.append({'type': 'newline', 'value': '\n', 'line': line})
+        tokens.append({'type': 'eof', 'value': None, 'line': line})
+        return tokens
+
+    def _add_value(self, tokens, brackets, space_before, token):
+        # Inside [ ], whitespace between two values separates matrix elements
+        if brackets and brackets[-1] == '[' and space_before and tokens and tokens[-1]['type'] in VALUE_END:
+            tokens.append({'type': ',', 'value': ',', 'line': token['line']})
+        tokens.append(token)
+
+    def _read_string(self, source, pos, line):
+        quote = source[pos]
+        pos += 1
+        chars = []
+        while True:
+            if pos >= len(source) or source[pos] == '\n':
+                raise MatlabSyntaxError("Unterminated string", line)
+            if source[pos] == quote:
+                if source[pos + 1:pos + 2] == quote:
+                    chars.append(quote)
+                    pos += 2
+                    continue
+                return ''.join(chars), pos + 1
+            chars.append(source[pos])
+            pos += 1
+
+class MatlabParser:
+    BINARY_LEVELS = [
+        ('||',),
+        ('&&',),
+        ('|',),
+        ('&',),
+        ('==', '~=', '!=', '<', '<=', '>', '>='),
+    ]
+    ADDITIVE = ('+', '-')
+    MULTIPLICATIVE = ('*', '/', '\\', '.*', './', '.\\')
+    UNARY = ('-', '+', '~', '!')
+    POWER = ('^', '.^')
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.index_depth = 0
+
+    def peek(self, offset=0):
+        return self.tokens[self.pos + offset]
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, kind):
+        token = self.advance()
+        if token['type'] != kind:
+            raise MatlabSyntaxError(f"Expected '{kind}' but found '{token['value']}'", token['line'])
+        return token
+
+    def parse_program(self):
+        statements = self.parse_block(('eof',))
+        self.expect('eof')
+        return statements
+
+    def parse_block(self, terminators):
+        statements = []
+        while True:
+            token = self.peek()
+            if token['type'] in ('newline', ';', ','):
+                self.advance()
+                continue
+            if token['type'] in terminators:
+                return statements
+            if token['type'] == 'eof':
+                raise MatlabSyntaxError("Missing 'end'", token['line'])
+            statements.append(self.parse_statement())
+
+    def parse_statement(self):
+        token = self.peek()
+        kind = token['type']
+        if kind == 'if':
+            return self.parse_if()
+        if kind == 'for':
+            return self.parse_for()
+        if kind == 'while':
+            self.advance()
+            condition = self.parse_expression()
+            body = self.parse_block(('end',))
+            self.expect('end')
+            return ('while', condition, body, token['line'])
+        if kind in ('break', 'continue', 'return'):
+            self.advance()
+            self.end_statement()
+            return (kind, token['line'])
+        if kind == 'function':
+            raise MatlabSyntaxError("Function definitions are not supported in this environment", token['line'])
+        if kind == '[' and self.is_multi_assignment():
+            return self.parse_multi_assignment()
+
+        expression = self.parse_expression()
+        if self.peek()['type'] == '=':
+            self.advance()
+            if expression[0] == 'id':
+                target = (expression[1], None)
+            elif expression[0] == 'apply':
+                target = (expression[1], expression[2])
+            else:
+                raise MatlabSyntaxError("Invalid assignment target", token['line'])
+            value = self.parse_expression()
+            return ('assign', [target], value, self.end_statement(), token['line'])
+        return ('expr', expression, self.end_statement(), token['line'])
+
+    def end_statement(self):
+        # Returns True when the result should be displayed (no trailing semicolon)
+        token = self.peek()
+        if token['type'] == ';':
+            self.advance()
+            return False
+        if token['type'] in (',', 'newline'):
+            self.advance()
+            return True
+        if token['type'] in ('eof', 'end', 'else', 'elseif'):
+            return True
+        raise MatlabSyntaxError(f"Unexpected '{token['value']}'", token['line'])
+
+    def is_multi_assignment(self):
+        depth = 0
+        offset = 0
+        while True:
+            token = self.peek(offset)
+            if token['type'] in ('[', '('):
+                depth += 1
+            elif token['type'] in (']', ')'):
+                depth -= 1
+                if depth == 0:
+                    return self.peek(offset + 1)['type'] == '='
+            elif token['type'] in ('newline', 'eof'):
+                return False
+            offset += 1
+
+    def parse_multi_assignment(self):
+        line = self.expect('[')['line']
+        targets = []
+        while self.peek()['type'] != ']':
+            token = self.advance()
+            if token['type'] == 'id':
+                targets.append((token['value'], None))
+            elif token['type'] in ('~', '!'):
+                targets.append((None, None))
+            elif token['type'] != ',':
+                raise MatlabSyntaxError("Only plain variables are supported in multiple assignment", line)
+        self.expect(']')
+        self.expect('=')
+        value = self.parse_expression()
+        if value[0] != 'apply':
+            raise MatlabSyntaxError("Multiple assignment needs a function call on the right", line)
+        return ('assign', targets, value, self.end_statement(), line)
+
+    def parse_if(self):
+        line = self.expect('if')['line']
+        branches = [(self.parse_expression(), self.parse_block(('elseif', 'else', 'end')))]
+        else_body = []
+        while True:
+            token = self.advance()
+            if token['type'] == 'elseif':
+                branches.append((self.parse_expression(), self.parse_block(('elseif', 'else', 'end'))))
+            elif token['type'] == 'else':
+                else_body = self.parse_block(('end',))
+            else:
+                return ('if', branches, else_body, line)
+
+    def parse_for(self):
+        line = self.expect('for')['line']
+        parenthesized = self.peek()['type'] == '('
+        if parenthesized:
+            self.advance()
+        variable = self.expect('id')['value']
+        self.expect('=')
+        iterable = self.parse_expression()
+        if parenthesized:
+            self.expect(')')
+        body = self.parse_block(('end',))
+        self.expect('end')
+        return ('for', variable, iterable, body, line)
+
+    def parse_expression(self):
+        return self.parse_binary(0)
+
+    def parse_binary(self, level):
+        if level == len(self.BINARY_LEVELS):
+            return self.parse_range()
+        left = self.parse_binary(level + 1)
+        while self.peek()['type'] in self.BINARY_LEVELS[level]:
+            op = self.advance()['type']
+            left = ('binop', op, left, self.parse_binary(level + 1))
+        return left
+
+    def parse_range(self):
+        start = self.parse_additive()
+        if self.peek()['type'] != ':':
+            return start
+        self.advance()
+        second = self.parse_additive()
+        if self.peek()['type'] == ':':
+            self.advance()
+            return ('range', start, second, self.parse_additive())
+        return ('range', start, None, second)
+
+    def parse_additive(self):
+        left = self.parse_multiplicative()
+        while self.peek()['type'] in self.ADDITIVE:
+            op = self.advance()['type']
+            left = ('binop', op, left, self.parse_multiplicative())
+        return left
+
+    def parse_multiplicative(self):
+        left = self.parse_unary()
+        while self.peek()['type'] in self.MULTIPLICATIVE:
+            op = self.advance()['type']
+            left = ('binop', op, left, self.parse_unary())
+        return left
+
+    def parse_unary(self):
+        if self.peek()['type'] in self.UNARY:
+            op = self.advance()['type']
+            return ('unop', op, self.parse_unary())
+        return self.parse_power()
+
+    def parse_power(self):
+        # Power binds tighter than unary minus (-2^2 == -4) and is left-associative
+        base = self.parse_postfix()
+        while self.peek()['type'] in self.POWER:
+            op = self.advance()['type']
+            base = ('binop', op, base, self.parse_power_operand())
+        return base
+
+    def parse_power_operand(self):
+        if self.peek()['type'] in self.UNARY:
+            op = self.advance()['type']
+            return ('unop', op, self.parse_power_operand())
+        return self.parse_postfix()
+
+    def parse_postfix(self):
+        node = self.parse_primary()
+        while True:
+            kind = self.peek()['type']
+            if kind == '(' and node[0] == 'id':
+                self.advance()
+                node = ('apply', node[1], self.parse_arguments())
+            elif kind in ("'", ".'"):
+                self.advance()
+                node = ('postfix', kind, node)
+            else:
+                return node
+
+    def parse_arguments(self):
+        args = []
+        self.index_depth += 1
+        while self.peek()['type'] != ')':
+            if self.peek()['type'] == ':' and self.peek(1)['type'] in (',', ')'):
+                self.advance()
+                args.append(('colon',))
+            else:
+                args.append(self.parse_expression())
+            if self.peek()['type'] == ',':
+                self.advance()
+            elif self.peek()['type'] != ')':
+                token = self.peek()
+                raise MatlabSyntaxError(f"Unexpected '{token['value']}' in argument list", token['line'])
+        self.expect(')')
+        self.index_depth -= 1
+        return args
+
+    def parse_primary(self):
+        token = self.advance()
+        kind = token['type']
+        if kind == 'num':
+            return ('num', token['value'])
+        if kind == 'str':
+            return ('str', token['value'])
+        if kind == 'id':
+            return ('id', token['value'])
+        if kind == 'end' and self.index_depth:
+            return ('end',)
+        if kind == '(':
+            saved_depth, self.index_depth = self.index_depth, 0
+            node = self.parse_expression()
+            self.index_depth = saved_depth
+            self.expect(')')
+            return node
+        if kind == '[':
+            return self.parse_matrix()
+        raise MatlabSyntaxError(f"Unexpected '{token['value']}'", token['line'])
+
+    def parse_matrix(self):
+        rows = [[]]
+        saved_depth, self.index_depth = self.index_depth, 0
+        while self.peek()['type'] != ']':
+            kind = self.peek()['type']
+            if kind == ',':
+                self.advance()
+            elif kind == ';':
+                self.advance()
+                if rows[-1]:
+                    rows.append([])
+            else:
+                rows[-1].append(self.parse_expression())
+        self.expect(']')
+        self.index_depth = saved_depth
+        return ('matrix', [row for row in rows if row])
+
+class MatlabCodeGenerator:
+    BINARY_TEMPLATES = {
+        '+': '({0} + {1})',
+        '-': '({0} - {1})',
+        '.*': '({0} * {1})',
+        './': '({0} / {1})',
+        '.\\': '({1} / {0})',
+        '.^': '({0} ** {1})',
+        '*': '_mtimes({0}, {1})',
+        '/': '_mrdivide({0}, {1})',
+        '\\': '_mldivide({0}, {1})',
+        '^': '_mpower({0}, {1})',
+        '==': '({0} == {1})',
+        '~=': '({0} != {1})',
+        '!=': '({0} != {1})',
+        '<': '({0} < {1})',
+        '<=': '({0} <= {1})',
+        '>': '({0} > {1})',
+        '>=': '({0} >= {1})',
+        '&': '_np.logical_and({0}, {1})',
+        '|': '_np.logical_or({0}, {1})',
+        '&&': '(_truth({0}) and _truth({1}))',
+        '||': '(_truth({0}) or _truth({1}))',
+    }
+
+    def __init__(self):
+        self.lines = []
+        self.constants = {}
+        self.variables = set()
+        self.temp_count = 0
+
+    def generate(self, statements):
+        self.collect_variables(statements)
+        body = []
+        self.lines = body
+        self.emit_block(statements, 0)
+        header = [f"{name} = _np.float64({value!r})" for value, name in self.constants.items()]
+        return '\n'.join(header + body) + '\n'
+
+    def collect_variables(self, statements):
+        # Names assigned anywhere are variables; every other identifier must be a builtin
+        self.variables.add('ans')
+        for statement in statements:
+            kind = statement[0]
+            if kind == 'assign':
+                self.variables.update(name for name, _ in statement[1] if name)
+            elif kind == 'for':
+                self.variables.add(statement[1])
+                self.collect_variables(statement[3])
+            elif kind == 'while':
+                self.collect_variables(statement[2])
+            elif kind == 'if':
+                for _, body in statement[1]:
+                    self.collect_variables(body)
+                self.collect_variables(statement[2])
+
+    def emit(self, depth, text):
+        self.lines.append('    ' * depth + text)
+
+    def emit_block(self, statements, depth):
+        if not statements:
+            self.emit(depth, 'pass')
+        for statement in statements:
+            self.emit_statement(statement, depth)
+
+    def emit_statement(self, statement, depth):
+        try:
+            self.emit_statement_body(statement, depth)
+        except MatlabSyntaxError as e:
+            if e.line is None:
+                raise MatlabSyntaxError(str(e), statement[-1])
+            raise
+
+    def emit_statement_body(self, statement, depth):
+        kind = statement[0]
+        if kind == 'assign':
+            _, targets, value, display, line = statement
+            if len(targets) == 1:
+                name, args = targets[0]
+                if args is None:
+                    self.emit(depth, f"m_{name} = {self.value_expression(value)}")
+                else:
+                    subscripts = self.subscripts(args, f"_get('m_{name}')")
+                    self.emit(depth, f"m_{name} = _assign(_get('m_{name}'), {subscripts}, {self.expression(value)})")
+                if display:
+                    self.emit(depth, f"_display({name!r}, m_{name})")
+            else:
+                temp = self.temp()
+                self.emit(depth, f"{temp} = {self.call(value[1], value[2], None, nargout=len(targets))}")
+                for position, (name, _) in enumerate(targets):
+                    if name:
+                        self.emit(depth, f"m_{name} = {temp}[{position}]")
+                        if display:
+                            self.emit(depth, f"_display({name!r}, m_{name})")
+        elif kind == 'expr':
+            _, expression, display, line = statement
+            temp = self.temp()
+            self.emit(depth, f"{temp} = {self.value_expression(expression)}")
+            self.emit(depth, f"if {temp} is not None:")
+            self.emit(depth + 1, f"m_ans = {temp}")
+            if display:
+                # A bare variable displays under its own name, anything else as ans
+                name = expression[1] if expression[0] == 'id' and expression[1] in self.variables else 'ans'
+                self.emit(depth + 1, f"_display({name!r}, {temp})")
+        elif kind == 'if':
+            _, branches, else_body, line = statement
+            for position, (condition, body) in enumerate(branches):
+                keyword = 'if' if position == 0 else 'elif'
+                self.emit(depth, f"{keyword} _truth({self.expression(condition)}):")
+                self.emit_block(body, depth + 1)
+            if else_body:
+                self.emit(depth, 'else:')
+                self.emit_block(else_body, depth + 1)
+        elif kind == 'for':
+            _, variable, iterable, body, line = statement
+            if iterable[0] == 'range':
+                # Scalar ranges iterate a NumPy arange directly instead of building column slices
+                _, start, step, stop = iterable
+                step_code = self.expression(step) if step is not None else 'None'
+                source = f"_range_values({self.expression(start)}, {step_code}, {self.expression(stop)})"
+            else:
+                source = f"_columns({self.expression(iterable)})"
+            self.emit(depth, f"for m_{variable} in {source}:")
+            self.emit_block(body, depth + 1)
+        elif kind == 'while':
+            _, condition, body, line = statement
+            self.emit(depth, f"while _truth({self.expression(condition)}):")
+            self.emit_block(body, depth + 1)
+        elif kind in ('break', 'continue'):
+            self.emit(depth, kind)
+        elif kind == 'return':
+            self.emit(depth, 'raise _Return()')
+
+    def temp(self):
+        self.temp_count += 1
+        return f"_t{self.temp_count}"
+
+    def value_expression(self, node, end_target=None):
+        # Plain variable copies keep MATLAB value semantics, since indexed assignment mutates in place
+        if node[0] == 'id' and node[1] in self.variables:
+            return f"_copy(m_{node[1]})"
+        return self.expression(node, end_target)
+
+    def expression(self, node, end_target=None):
+        kind = node[0]
+        if kind == 'num':
+            value = node[1]
+            if value not in self.constants:
+                self.constants[value] = f"_c{len(self.constants)}"
+            return self.constants[value]
+        if kind == 'str':
+            return repr(node[1])
+        if kind == 'id':
+            name = node[1]
+            if name in self.variables:
+                return f"m_{name}"
+            return self.call(name, [], end_target)
+        if kind == 'end':
+            return end_target or '_no_end()'
+        if kind == 'apply':
+            name, args = node[1], node[2]
+            if name in self.variables:
+                return f"_index(m_{name}, {self.subscripts(args, f'm_{name}')})"
+            return self.call(name, args, end_target)
+        if kind == 'matrix':
+            rows = ', '.join('[' + ', '.join(self.expression(item, end_target) for item in row) + ']'
+                             for row in node[1])
+            return f"_matrix([{rows}])"
+        if kind == 'range':
+            _, start, step, stop = node
+            step_code = self.expression(step, end_target) if step is not None else 'None'
+            return (f"_range({self.expression(start, end_target)}, {step_code}, "
+                    f"{self.expression(stop, end_target)})")
+        if kind == 'binop':
+            _, op, left, right = node
+            return self.BINARY_TEMPLATES[op].format(self.expression(left, end_target),
+                                                    self.expression(right, end_target))
+        if kind == 'unop':
+            _, op, operand = node
+            operand_code = self.expression(operand, end_target)
+            if op == '-':
+                return f"(-{operand_code})"
+            if op == '+':
+                return f"_copy({operand_code})"
+            return f"_np.logical_not({operand_code})"
+        if kind == 'postfix':
+            helper = '_ctranspose' if node[1] == "'" else '_transpose'
+            return f"{helper}({self.expression(node[2], end_target)})"
+        if kind == 'colon':
+            return '_COLON'
+        raise MatlabSyntaxError(f"Unsupported expression {kind}")
+
+    def subscripts(self, args, target):
+        count = len(args)
+        parts = []
+        for position, arg in enumerate(args):
+            parts.append(self.expression(arg, f"_end({target}, {position}, {count})"))
+        return '(' + ', '.join(parts) + (',)' if count == 1 else ')')
+
+    def call(self, name, args, end_target, nargout=1):
+        if name not in BUILTINS:
+            raise MatlabSyntaxError(f"Undefined function or variable '{name}'")
+        arguments = [self.expression(arg, end_target) for arg in args]
+        if nargout != 1:
+            arguments.append(f"nargout={nargout}")
+        return f"_builtins[{name!r}]({', '.join(arguments)})"
+
+# ---------------------------------------------------------------------------
+# Runtime helpers used by the generated code
+# ---------------------------------------------------------------------------
+
+class _Colon:
+    def __repr__(self):
+        return ':'
+
+_COLON = _Colon()
+
+class _Return(Exception):
+    pass
+
+def _as2d(value):
+    array = np.asarray(value)
+    if array.ndim == 2:
+        return array
+    if array.ndim == 0:
+        return array.reshape(1, 1)
+    if array.ndim == 1:
+        return array.reshape(1, -1)
+    raise MatlabRuntimeError("Only 2-D arrays are supported")
+
+def _simplify(result):
+    if isinstance(result, np.ndarray) and result.size == 1:
+        return result.reshape(-1)[0]
+    return result
+
+def _copy(value):
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    return value
+
+def _truth(value):
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    array = np.asarray(value)
+    return array.size > 0 and bool(np.all(array))
+
+def _no_end():
+    raise MatlabRuntimeError("'end' is only valid inside an index expression")
+
+def _end(value, position, count):
+    if isinstance(value, str):
+        return np.float64(len(value))
+    array = _as2d(value)
+    if count == 1:
+        return np.float64(array.size)
+    return np.float64(array.shape[position] if position < 2 else 1)
+
+def _range_count(start, step, stop):
+    if step == 0 or (step > 0 and start > stop) or (step < 0 and start < stop):
+        return 0
+    return int(math.floor((stop - start) / step + 1e-10)) + 1
+
+def _range_values(start, step, stop):
+    start = float(_simplify(np.asarray(start)))
+    stop = float(_simplify(np.asarray(stop)))
+    step = 1.0 if step is None else float(_simplify(np.asarray(step)))
+    return start + step * np.arange(_range_count(start, step, stop), dtype=np.float64)
+
+def _range(start, step, stop):
+    return _range_values(start, step, stop).reshape(1, -1)
+
+def _columns(value):
+    if isinstance(value, str):
+        return list(value)
+    array = _as2d(value)
+    if array.shape[0] == 1:
+        return list(array[0])
+    return [array[:, [col]].copy() for col in range(array.shape[1])]
+
+def _matrix(rows):
+    if all(isinstance(item, (float, int, np.floating, np.integer)) for row in rows for item in row):
+        if not rows:
+            return np.zeros((0, 0))
+        width = len(rows[0])
+        if any(len(row) != width for row in rows):
+            raise MatlabRuntimeError("Dimensions of arrays being concatenated are not consistent.")
+        if len(rows) == 1 and width == 1:
+            return np.float64(rows[0][0])
+        return np.array(rows, dtype=np.float64)
+
+    if all(isinstance(item, str) for row in rows for item in row):
+        if len(rows) > 1:
+            raise MatlabRuntimeError("Multi-row character arrays are not supported")
+        return ''.join(rows[0])
+
+    blocks = []
+    for row in rows:
+        items = [_as2d(item) for item in row if np.size(item) > 0]
+        if items:
+            try:
+                blocks.append(np.hstack(items))
+            except ValueError:
+                raise MatlabRuntimeError("Dimensions of arrays being concatenated are not consistent.")
+    if not blocks:
+        return np.zeros((0, 0))
+    try:
+        result = np.vstack(blocks)
+    except ValueError:
+        raise MatlabRuntimeError("Dimensions of arrays being concatenated are not consistent.")
+    if result.dtype != np.bool_:
+        result = result.astype(np.float64, copy=False)
+    return _simplify(result)
+
+def _is_scalar(value):
+    return np.ndim(value) == 0 or np.size(value) == 1
+
+def _mtimes(a, b):
+    if _is_scalar(a) or _is_scalar(b):
+        return a * b
+    try:
+        return _simplify(np.matmul(_as2d(a), _as2d(b)))
+    except ValueError:
+        raise MatlabRuntimeError("Inner matrix dimensions must agree.")
+
+def _mldivide(a, b):
+    if _is_scalar(a):
+        return b / a
+    a, b = _as2d(a), _as2d(b)
+    if a.shape[0] != b.shape[0]:
+        raise MatlabRuntimeError("Matrix dimensions must agree.")
+    if a.shape[0] == a.shape[1]:
+        try:
+            return _simplify(np.linalg.solve(a, b))
+        except np.linalg.LinAlgError:
+            pass
+    return _simplify(np.linalg.lstsq(a, b, rcond=None)[0])
+
+def _mrdivide(a, b):
+    if _is_scalar(b):
+        return a / b
+    return _transpose(_mldivide(_transpose(b), _transpose(a)))
+
+def _mpower(a, b):
+    if _is_scalar(a) and _is_scalar(b):
+        return a ** b
+    if _is_scalar(b) and float(b) == int(b):
+        square = _as2d(a)
+        if square.shape[0] != square.shape[1]:
+            raise MatlabRuntimeError("Matrix must be square for ^. Use .^ for element-wise power.")
+        return np.linalg.matrix_power(square, int(b))
+    raise MatlabRuntimeError("Only integer powers of square matrices are supported. Use .^ for element-wise power.")
+
+def _transpose(value):
+    if isinstance(value, str):
+        raise MatlabRuntimeError("Transposing character arrays is not supported")
+    if np.ndim(value) == 0:
+        return value
+    return _as2d(value).T.copy()
+
+def _ctranspose(value):
+    result = _transpose(value)
+    if np.iscomplexobj(result):
+        return np.conj(result)
+    return result
+
+def _subscript(sub, extent):
+    if sub is _COLON:
+        return np.arange(extent)
+    if isinstance(sub, (float, int, np.floating, np.integer)):
+        index = int(sub)
+        if index != sub or index < 1:
+            raise MatlabRuntimeError("Array indices must be positive integers or logical values.")
+        return np.array([index - 1])
+    array = np.asarray(sub)
+    if array.dtype == np.bool_:
+        return np.flatnonzero(array.ravel(order='F'))
+    flat = array.ravel(order='F')
+    indices = flat.astype(np.intp)
+    if indices.size and (np.any(indices != flat) or indices.min() < 1):
+        raise MatlabRuntimeError("Array indices must be positive integers or logical values.")
+    return indices - 1
+
+def _index(value, subs):
+    if isinstance(value, str):
+        chars = np.array(list(value))
+        return ''.join(_index(chars.reshape(1, -1), subs).reshape(-1)) if len(value) else ''
+
+    array = _as2d(value)
+    rows, cols = array.shape
+    if len(subs) == 1:
+        sub = subs[0]
+        if isinstance(sub, (float, int, np.floating, np.integer)) and sub == int(sub) and 1 <= sub <= array.size:
+            # Scalar fast path, the common case inside loops
+            position = int(sub) - 1
+            return array[position % rows, position // rows]
+        if sub is _COLON:
+            return array.reshape(-1, 1, order='F').copy()
+        indices = _subscript(sub, array.size)
+        if indices.size and indices.max() >= array.size:
+            raise MatlabRuntimeError("Index exceeds the number of array elements.")
+        result = array.ravel(order='F')[indices]
+        if rows == 1:
+            result = result.reshape(1, -1)
+        elif cols == 1 or np.ndim(sub) < 2 or np.asarray(sub).dtype == np.bool_:
+            result = result.reshape(-1, 1)
+        else:
+            result = result.reshape(_as2d(sub).shape, order='F')
+        return _simplify(result)
+
+    if len(subs) > 2:
+        if any(sub is not _COLON and np.any(np.asarray(sub) != 1) for sub in subs[2:]):
+            raise MatlabRuntimeError("Index exceeds array dimensions.")
+        subs = subs[:2]
+    row_sub, col_sub = subs
+    if (isinstance(row_sub, (float, np.floating)) and isinstance(col_sub, (float, np.floating))
+            and 1 <= row_sub <= rows and 1 <= col_sub <= cols
+            and row_sub == int(row_sub) and col_sub == int(col_sub)):
+        return array[int(row_sub) - 1, int(col_sub) - 1]
+    row_indices = _subscript(row_sub, rows)
+    col_indices = _subscript(col_sub, cols)
+    if (row_indices.size and row_indices.max() >= rows) or (col_indices.size and col_indices.max() >= cols):
+        raise MatlabRuntimeError("Index exceeds array dimensions.")
+    return _simplify(array[np.ix_(row_indices, col_indices)])
+
+def _assign(target, subs, value):
+    if isinstance(target, str) or isinstance(value, str):
+        raise MatlabRuntimeError("Indexed assignment with character arrays is not supported")
+    if target is None:
+        array = np.zeros((0, 0))
+    elif isinstance(target, np.ndarray) and target.ndim == 2 and target.dtype == np.float64:
+        # Arrays are never aliased between variables (see _copy), so update in place
+        array = target
+    else:
+        array = np.array(target, dtype=np.float64, ndmin=2)
+
+    if len(subs) == 1:
+        rows, cols = array.shape
+        sub = subs[0]
+        if isinstance(sub, (float, int, np.floating, np.integer)) and _is_scalar(value) \
+                and sub == int(sub) and 1 <= sub <= array.size:
+            position = int(sub) - 1
+            array[position % rows, position // rows] = value
+            return array
+        indices = _subscript(sub, array.size)
+        needed = int(indices.max()) + 1 if indices.size else 0
+        if needed > array.size:
+            if array.size == 0 or rows == 1:
+                array = _grow(array, 1, needed)
+            elif cols == 1:
+                array = _grow(array, needed, 1)
+            else:
+                raise MatlabRuntimeError("Attempt to grow array along ambiguous dimension.")
+        row_indices, col_indices = np.unravel_index(indices, array.shape, order='F')
+        values = np.asarray(value, dtype=np.float64)
+        if values.size != 1 and values.size != indices.size:
+            raise MatlabRuntimeError("Unable to perform assignment because the left and right sides have a different number of elements.")
+        array[row_indices, col_indices] = values.ravel(order='F') if values.size != 1 else values.reshape(-1)[0]
+        return array
+
+    row_sub, col_sub = subs[0], subs[1]
+    row_indices = _subscript(row_sub, array.shape[0])
+    col_indices = _subscript(col_sub, array.shape[1])
+    if row_sub is _COLON and array.shape[0] == 0:
+        row_indices = np.arange(_as2d(value).shape[0])
+    if col_sub is _COLON and array.shape[1] == 0:
+        col_indices = np.arange(_as2d(value).shape[1])
+    needed_rows = max(array.shape[0], int(row_indices.max()) + 1 if row_indices.size else 0)
+    needed_cols = max(array.shape[1], int(col_indices.max()) + 1 if col_indices.size else 0)
+    if (needed_rows, needed_cols) != array.shape:
+        array = _grow(array, needed_rows, needed_cols)
+    values = np.asarray(value, dtype=np.float64)
+    if values.size == 1:
+        array[np.ix_(row_indices, col_indices)] = values.reshape(-1)[0]
+    elif values.size == row_indices.size * col_indices.size:
+        array[np.ix_(row_indices, col_indices)] = values.reshape(row_indices.size, col_indices.size, order='F')
+    else:
+        raise MatlabRuntimeError("Unable to perform assignment because the size of the left side does not match the right side.")
+    return array
+
+def _grow(array, rows, cols):
+    grown = np.zeros((rows, cols))
+    grown[:array.shape[0], :array.shape[1]] = array
+    return grown
+
+def _format_number(value):
+    if isinstance(value, (bool, np.bool_)):
+        return '1' if value else '0'
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return 'Inf' if value > 0 else '-Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    if 1e-4 <= abs(value) < 1e5:
+        return f"{value:.4f}"
+    return f"{value:.4e}"
+
+def _format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return f"    '{value}'"
+    if isinstance(value, np.ndarray) and value.size == 0:
+        return '     []'
+    if _is_scalar(value):
+        return '    ' + _format_number(_simplify(np.asarray(value)))
+    array = _as2d(value)
+    cells = [[_format_number(item) for item in row] for row in array]
+    width = max(len(cell) for row in cells for cell in row)
+    return '\n'.join('    ' + '  '.join(cell.rjust(width) for cell in row) for row in cells)
+
+def _display(name, value):
+    _OUTPUT.write(f"{name} =\n\n{_format_value(value)}\n\n")
+
+class _OutputProxy:
+    # The generated code's _out is bound per run; helpers write through the active namespace
+    def __init__(self):
+        self.local = threading.local()
+
+    def write(self, text):
+        sink = getattr(self.local, 'sink', None)
+        if sink is not None:
+            sink(text)
+
+_OUTPUT = _OutputProxy()
+
+def _num_args(args):
+    if len(args) == 1 and np.size(args[0]) > 1:
+        return tuple(int(item) for item in np.asarray(args[0]).ravel())
+    if not args:
+        return (1, 1)
+    if len(args) == 1:
+        return (int(args[0]), int(args[0]))
+    return tuple(int(arg) for arg in args[:2])
+
+def _reduce(function, value, dim=None):
+    array = _as2d(value)
+    if dim is None:
+        axis = 1 if array.shape[0] == 1 else 0
+    else:
+        axis = int(dim) - 1
+    return _simplify(function(array, axis=axis, keepdims=True))
+
+def _extreme(function, arg_function, value, other=None, dim=None, nargout=1):
+    if other is not None and np.size(other) > 0:
+        combined = np.maximum(value, other) if function is np.max else np.minimum(value, other)
+        return _simplify(combined)
+    array = _as2d(value)
+    axis = (1 if array.shape[0] == 1 else 0) if dim is None else int(dim) - 1
+    result = _simplify(function(array, axis=axis, keepdims=True))
+    if nargout == 1:
+        return result
+    indices = _simplify(np.expand_dims(arg_function(array, axis=axis), axis).astype(np.float64) + 1)
+    return (result, indices)
+
+def _size(value, dim=None, nargout=1):
+    shape = (1, len(value)) if isinstance(value, str) else _as2d(value).shape
+    if dim is not None:
+        return np.float64(shape[int(dim) - 1] if int(dim) <= 2 else 1)
+    if nargout == 1:
+        return np.array([shape], dtype=np.float64)
+    return tuple(np.float64(extent) for extent in shape) + (np.float64(1),) * (nargout - 2)
+
+def _sort(value, *options, nargout=1):
+    array = _as2d(value)
+    descending = any(isinstance(option, str) and option.lower() == 'descend' for option in options)
+    axis = 1 if array.shape[0] == 1 else 0
+    order = np.argsort(-array if descending else array, axis=axis, kind='stable')
+    result = _simplify(np.take_along_axis(array, order, axis=axis))
+    if nargout == 1:
+        return result
+    return (result, _simplify(order.astype(np.float64) + 1))
+
+def _find(value):
+    array = _as2d(value)
+    indices = np.flatnonzero(array.ravel(order='F')).astype(np.float64) + 1
+    return _simplify(indices.reshape(1, -1) if array.shape[0] == 1 else indices.reshape(-1, 1))
+
+def _disp(value):
+    if isinstance(value, str):
+        _OUTPUT.write(value + '\n')
+    else:
+        _OUTPUT.write(_format_value(value).strip('\n') + '\n')
+
+PRINTF_SPEC = re.compile(r'%(?:%|[-+ 0#]*\d*(?:\.\d+)?[diuoxXfeEgGcs])')
+
+def _sprintf(fmt, *args):
+    fmt = fmt.replace('\\n', '\n').replace('\\t', '\t').replace('\\\\', '\\')
+    values = []
+    for arg in args:
+        if isinstance(arg, str):
+            values.append(arg)
+        else:
+            values.extend(np.asarray(arg).ravel(order='F').tolist())
+    specs = [spec for spec in PRINTF_SPEC.findall(fmt) if spec != '%%']
+    if not specs:
+        return fmt.replace('%%', '%')
+    pieces = []
+    position = 0
+    while True:
+        chunk = values[position:position + len(specs)]
+        position += len(specs)
+
+        def substitute(match, chunk=chunk, counter=[0]):
+            spec = match.group()
+            if spec == '%%':
+                return '%'
+            if counter[0] >= len(chunk):
+                return ''
+            item = chunk[counter[0]]
+            counter[0] += 1
+            conversion = spec[-1]
+            if conversion in 'diu':
+                if isinstance(item, str) or float(item) != int(item):
+                    return _format_number(item) if not isinstance(item, str) else item
+                return (spec[:-1] + 'd') % int(item)
+            if conversion == 's':
+                return spec % (item if isinstance(item, str) else _format_number(item))
+            if conversion == 'c':
+                return item if isinstance(item, str) else chr(int(item))
+            return spec % item
+
+        pieces.append(PRINTF_SPEC.sub(substitute, fmt))
+        if position >= len(values):
+            break
+    return ''.join(pieces)
+
+def _fprintf(fmt, *args):
+    _OUTPUT.write(_sprintf(fmt, *args))
+
+def _num2str(value, precision=None):
+    if isinstance(value, str):
+        return value
+    if not _is_scalar(value):
+        return '  '.join(_num2str(item) for item in _as2d(value).ravel())
+    value = float(_simplify(np.asarray(value)))
+    if precision is not None:
+        return f"{value:.{int(precision)}g}"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    digits = max(int(math.floor(math.log10(abs(value)))) + 5, 5) if value else 5
+    return f"{value:.{digits}g}"
+
+def _matrix_builder(function):
+    def build(*args):
+        return function(_num_args(args))
+    return build
+
+def _elementwise(function):
+    def apply(value, *args):
+        return function(value, *args)
+    return apply
+
+_RNG = np.random.default_rng()
+
+BUILTINS = {
+    'pi': lambda: np.float64(np.pi),
+    'Inf': lambda: np.float64(np.inf),
+    'inf': lambda: np.float64(np.inf),
+    'NaN': lambda: np.float64(np.nan),
+    'nan': lambda: np.float64(np.nan),
+    'eps': lambda: np.float64(np.finfo(float).eps),
+    'true': lambda: np.bool_(True),
+    'false': lambda: np.bool_(False),
+    'zeros': _matrix_builder(lambda shape: np.zeros(shape)),
+    'ones': _matrix_builder(lambda shape: np.ones(shape)),
+    'eye': _matrix_builder(lambda shape: np.eye(*shape)),
+    'rand': _matrix_builder(lambda shape: _simplify(_RNG.random(shape))),
+    'randn': _matrix_builder(lambda shape: _simplify(_RNG.standard_normal(shape))),
+    'linspace': lambda a, b, n=100: np.linspace(float(a), float(b), int(n)).reshape(1, -1),
+    'size': _size,
+    'numel': lambda value: np.float64(len(value) if isinstance(value, str) else np.size(value)),
+    'length': lambda value: np.float64(len(value) if isinstance(value, str) else (max(_as2d(value).shape) if np.size(value) else 0)),
+    'isempty': lambda value: np.bool_(np.size(value) == 0 if not isinstance(value, str) else not value),
+    'ndims': lambda value: np.float64(2),
+    'sum': lambda value, dim=None: _reduce(np.sum, value, dim),
+    'prod': lambda value, dim=None: _reduce(np.prod, value, dim),
+    'mean': lambda value, dim=None: _reduce(np.mean, value, dim),
+    'std': lambda value, w=0, dim=None: _reduce(lambda a, axis, keepdims: np.std(a, axis=axis, keepdims=keepdims, ddof=0 if w else 1), value, dim),
+    'var': lambda value, w=0, dim=None: _reduce(lambda a, axis, keepdims: np.var(a, axis=axis, keepdims=keepdims, ddof=0 if w else 1), value, dim),
+    'cumsum': lambda value, dim=None: _reduce(lambda a, axis, keepdims: np.cumsum(a, axis=axis), value, dim),
+    'cumprod': lambda value, dim=None: _reduce(lambda a, axis, keepdims: np.cumprod(a, axis=axis), value, dim),
+    'any': lambda value, dim=None: _reduce(np.any, value, dim),
+    'all': lambda value, dim=None: _reduce(np.all, value, dim),
+    'max': lambda value, other=None, dim=None, nargout=1: _extreme(np.max, np.argmax, value, other, dim, nargout),
+    'min': lambda value, other=None, dim=None, nargout=1: _extreme(np.min, np.argmin, value, other, dim, nargout),
+    'sort': _sort,
+    'find': _find,
+    'abs': _elementwise(np.abs),
+    'sqrt': _elementwise(np.sqrt),
+    'exp': _elementwise(np.exp),
+    'log': _elementwise(np.log),
+    'log2': _elementwise(np.log2),
+    'log10': _elementwise(np.log10),
+    'sin': _elementwise(np.sin),
+    'cos': _elementwise(np.cos),
+    'tan': _elementwise(np.tan),
+    'asin': _elementwise(np.arcsin),
+    'acos': _elementwise(np.arccos),
+    'atan': _elementwise(np.arctan),
+    'atan2': _elementwise(np.arctan2),
+    'round': _elementwise(lambda value: np.sign(value) * np.floor(np.abs(value) + 0.5)),
+    'floor': _elementwise(np.floor),
+    'ceil': _elementwise(np.ceil),
+    'fix': _elementwise(np.trunc),
+    'sign': _elementwise(np.sign),
+    'mod': lambda a, b: np.where(b == 0, a, np.mod(a, np.where(b == 0, 1, b)))[()],
+    'rem': lambda a, b: np.fmod(a, b),
+    'isnan': _elementwise(np.isnan),
+    'isinf': _elementwise(np.isinf),
+    'double': lambda value: np.asarray(value, dtype=np.float64)[()] if not isinstance(value, str) else _simplify(np.array([[float(ord(c)) for c in value]])),
+    'logical': lambda value: np.asarray(value) != 0,
+    'reshape': lambda value, *dims: np.reshape(_as2d(value), _num_args(dims), order='F').copy(),
+    'repmat': lambda value, *dims: np.tile(_as2d(value), _num_args(dims)),
+    'transpose': _transpose,
+    'dot': lambda a, b: np.float64(np.dot(np.ravel(a), np.ravel(b))),
+    'cross': lambda a, b: np.cross(np.ravel(a), np.ravel(b)).reshape(np.shape(a)),
+    'norm': lambda value, order=2: np.float64(np.linalg.norm(np.ravel(value), order) if min(_as2d(value).shape) == 1 else np.linalg.norm(_as2d(value), order)),
+    'inv': lambda value: np.linalg.inv(_as2d(value)),
+    'det': lambda value: np.float64(np.linalg.det(_as2d(value))),
+    'trace': lambda value: np.float64(np.trace(_as2d(value))),
+    'rank': lambda value: np.float64(np.linalg.matrix_rank(_as2d(value))),
+    'diag': lambda value: np.diag(np.ravel(value)) if min(_as2d(value).shape) == 1 else np.diag(_as2d(value)).reshape(-1, 1),
+    'disp': _disp,
+    'fprintf': _fprintf,
+    'sprintf': _sprintf,
+    'num2str': _num2str,
+}
+
+def _builtin_wrapper(name, function):
+    def call(*args, **kwargs):
+        try:
+            result = function(*args, **kwargs)
+        except TypeError:
+            raise MatlabRuntimeError(f"Wrong number of arguments to '{name}'")
+        # Builtins must never hand back a view of an argument (value semantics)
+        if isinstance(result, np.ndarray):
+            if any(isinstance(arg, np.ndarray) and np.may_share_memory(result, arg) for arg in args):
+                result = result.copy()
+            if result.ndim < 2:
+                result = _simplify(result) if result.size == 1 else _as2d(result)
+        return result
+    return call
+
+RUNTIME_NAMESPACE = {
+    '_np': np,
+    '_builtins': {name: _builtin_wrapper(name, function) for name, function in BUILTINS.items()},
+    '_COLON': _COLON,
+    '_Return': _Return,
+    '_copy': _copy,
+    '_truth': _truth,
+    '_no_end': _no_end,
+    '_end': _end,
+    '_range': _range,
+    '_range_values': _range_values,
+    '_columns': _columns,
+    '_matrix': _matrix,
+    '_mtimes': _mtimes,
+    '_mldivide': _mldivide,
+    '_mrdivide': _mrdivide,
+    '_mpower': _mpower,
+    '_transpose': _transpose,
+    '_ctranspose': _ctranspose,
+    '_index': _index,
+    '_assign': _assign,
+    '_display': _display,
+}
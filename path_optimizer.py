@@ -0,0 +1,137 @@
+import copy
+import hashlib
+import heapq
+import json
+import threading
+from collections import OrderedDict
+
+def default_graph():
+    from multi_subject_core import (PhysicsModule, ChemistryModule, BiologyModule, MathematicsModule,
+                                    EnglishModule, ProgrammingModule, SocialStudiesModule, HistoryModule)
+    from knowledge_graph import KnowledgeGraph
+    return KnowledgeGraph.from_subjects({
+        'physics': PhysicsModule(),
+        'chemistry': ChemistryModule(),
+        'biology': BiologyModule(),
+        'mathematics': MathematicsModule(),
+        'english': EnglishModule(),
+        'programming': ProgrammingModule(),
+        'social_studies': SocialStudiesModule(),
+        'history': HistoryModule()
+    })
+
+class LearningPathOptimizer:
+    def __init__(self, graph=None, session_minutes=30, learning_rate=0.35, unlock_weight=0.5, max_cached_paths=256):
+        # graph is a KnowledgeGraph; topics it does not know are scheduled without prerequisites
+        self.graph = graph
+        self.session_minutes = session_minutes
+        self.learning_rate = learning_rate
+        self.unlock_weight = unlock_weight
+        self.max_cached_paths = max_cached_paths
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def normalize(mastery, scale=1.0):
+        # scale is what full mastery reads as: 1 for fractions, 100 for percentages
+        return {topic: min(1.0, max(0.0, value / scale)) for topic, value in mastery.items()}
+
+    def state_key(self, mastery, budget_minutes, targets, threshold):
+        state = json.dumps(sorted((str(topic), round(value, 3)) for topic, value in mastery.items()))
+        state_hash = hashlib.sha1(state.encode('utf-8')).hexdigest()
+        return state_hash, budget_minutes, tuple(targets or ()), threshold
+
+    def optimize(self, mastery, budget_minutes=120, targets=None, threshold=0.6, minutes=None, scale=1.0):
+        mastery = self.normalize(mastery, scale)
+        key = self.state_key(mastery, budget_minutes, targets, threshold) if minutes is None else None
+        if key is not None:
+            with self.lock:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.cache.move_to_end(key)
+                    return copy.deepcopy(cached)
+        path = self._schedule(mastery, budget_minutes, targets or [], threshold, minutes or {})
+        if key is not None:
+            with self.lock:
+                self.cache[key] = copy.deepcopy(path)
+                while len(self.cache) > self.max_cached_paths:
+                    self.cache.popitem(last=False)
+        return path
+
+    def _node(self, topic):
+        if self.graph is None or topic not in self.graph:
+            return None
+        return self.graph.resolve(topic)
+
+    def _schedule(self, mastery, budget_minutes, targets, threshold, minutes):
+        # Candidates: weak topics, plus targets and their weak prerequisites. As in KnowledgeGraph.learning_path,
+        # prerequisites without an assessment count as not yet learned (mastery 0)
+        assessed = {}
+        for topic in mastery:
+            node = self._node(topic)
+            if node is not None:
+                assessed[node] = topic
+        candidates = [topic for topic, value in mastery.items() if value < threshold]
+        for target in targets:
+            node = self._node(target)
+            if node is not None:
+                for prerequisite in self.graph.prerequisites(target):
+                    topic = assessed.get(self.graph.index[prerequisite], prerequisite)
+                    if mastery.get(topic, 0.0) < threshold:
+                        candidates.append(topic)
+                target = assessed.get(node, self.graph.nodes[node])
+            if mastery.get(target, 0.0) < threshold:
+                candidates.append(target)
+        candidates = list(dict.fromkeys(candidates))
+        nodes = [self._node(topic) for topic in candidates]
+        local = {node: i for i, node in enumerate(nodes) if node is not None}
+
+        # Prerequisites and dependents restricted to the candidate set, as local bitsets
+        requires = [0] * len(candidates)
+        unlocks = [0] * len(candidates)
+        for i, node in enumerate(nodes):
+            if node is None:
+                continue
+            closure = self.graph.closure[node]
+            for other, j in local.items():
+                if other != node and closure >> other & 1:
+                    requires[i] |= 1 << j
+                    unlocks[j] |= 1 << i
+
+        gain = [self.learning_rate * (1 - mastery.get(topic, 0.0)) for topic in candidates]
+        cost = [minutes.get(topic, round(self.session_minutes * (1.5 - mastery.get(topic, 0.0))))
+                for topic in candidates]
+        priority = []
+        for i in range(len(candidates)):
+            downstream = sum(gain[j] for j in range(len(candidates)) if unlocks[i] >> j & 1)
+            priority.append((gain[i] + self.unlock_weight * downstream) / max(cost[i], 1))
+
+        # List scheduling: repeatedly take the best-ratio topic whose prerequisites are already placed
+        heap = [(-priority[i], i) for i in range(len(candidates)) if requires[i] == 0]
+        heapq.heapify(heap)
+        scheduled_mask = 0
+        waiting = {i for i in range(len(candidates)) if requires[i]}
+        elapsed = 0
+        path = []
+        while heap:
+            _, i = heapq.heappop(heap)
+            if elapsed + cost[i] > budget_minutes:
+                # Skipped topics keep their dependents out of the plan too
+                continue
+            path.append({
+                'topic': candidates[i],
+                'mastery': mastery.get(candidates[i], 0.0),
+                'expected_gain': round(gain[i], 4),
+                'estimated_time': cost[i],
+                'start_minute': elapsed,
+                'prerequisites': [candidates[j] for j in range(len(candidates)) if requires[i] >> j & 1]
+            })
+            elapsed += cost[i]
+            scheduled_mask |= 1 << i
+            for j in [j for j in waiting if requires[j] & ~scheduled_mask == 0]:
+                waiting.discard(j)
+                heapq.heappush(heap, (-priority[j], j))
+        return path
+
+    def total_gain(self, path):
+        return sum(step['expected_gain'] for step in path)
@@ -0,0 +1,227 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+DAY = 86400.0
+
+def _timestamp(value):
+    if value is None:
+        return time.time()
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+class StudentPerformance:
+    def __init__(self, recent_window=50):
+        self.sessions = 0
+        self.score_sum = 0.0
+        self.best_score = None
+        self.last_score = None
+        self.last_session = None
+        # Windowed stats: a bounded deque plus its running sum
+        self.recent = deque(maxlen=recent_window)
+        self.recent_sum = 0.0
+        # concept -> [score, timestamp of last update]; the score decays with time since that update
+        self.weak_scores = {}
+        self.weak_areas = set()
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.sessions if self.sessions else 0.0
+
+    @property
+    def recent_average(self):
+        return self.recent_sum / len(self.recent) if self.recent else 0.0
+
+    def to_dict(self):
+        return {
+            'sessions': self.sessions,
+            'score_sum': self.score_sum,
+            'best_score': self.best_score,
+            'last_score': self.last_score,
+            'last_session': self.last_session,
+            'recent': [dict(entry, date=entry['date'].timestamp()) for entry in self.recent],
+            'weak_scores': self.weak_scores
+        }
+
+    @classmethod
+    def from_dict(cls, data, recent_window=50):
+        state = cls(recent_window)
+        state.sessions = data['sessions']
+        state.score_sum = data['score_sum']
+        state.best_score = data['best_score']
+        state.last_score = data['last_score']
+        state.last_session = data['last_session']
+        state.recent.extend(dict(entry, date=datetime.fromtimestamp(entry['date'])) for entry in data['recent'])
+        state.recent_sum = sum(entry['score'] for entry in state.recent)
+        state.weak_scores = {concept: list(entry) for concept, entry in data['weak_scores'].items()}
+        return state
+
+class PerformanceStore:
+    def __init__(self, directory=None, half_life_days=14.0, weak_threshold=0.75, miss_weight=1.0, hit_credit=0.5,
+                 recent_window=50, segment_max_records=10000):
+        # directory=None keeps everything in memory; otherwise sessions go to append-only JSON-lines segments
+        self.directory = directory
+        self.half_life = half_life_days * DAY
+        self.weak_threshold = weak_threshold
+        self.miss_weight = miss_weight
+        self.hit_credit = hit_credit
+        self.recent_window = recent_window
+        self.segment_max_records = segment_max_records
+        self.students = {}
+        self.lock = threading.RLock()
+        self.segment = 1
+        self.segment_records = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment-{number:06d}.jsonl")
+
+    def _segments(self):
+        paths = glob.glob(os.path.join(self.directory, 'segment-*.jsonl'))
+        return sorted((int(os.path.basename(path)[8:14]), path) for path in paths)
+
+    def _load(self):
+        covered = 0
+        snapshot_path = os.path.join(self.directory, 'snapshot.json')
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path) as handle:
+                snapshot = json.load(handle)
+            covered = snapshot['segment']
+            self.students = {student_id: StudentPerformance.from_dict(data, self.recent_window)
+                             for student_id, data in snapshot['students'].items()}
+            now = time.time()
+            for state in self.students.values():
+                state.weak_areas = {concept for concept, entry in state.weak_scores.items()
+                                    if self._decayed(entry, now) >= self.weak_threshold}
+        for number, path in self._segments():
+            if number <= covered:
+                continue
+            with open(path, 'rb+') as handle:
+                data = handle.read()
+                if not data.endswith(b'\n'):
+                    # A torn final write from a crash: cut it off so the next append starts on a fresh line
+                    data = data[:data.rfind(b'\n') + 1]
+                    handle.truncate(len(data))
+            lines = [line for line in data.decode('utf-8').splitlines() if line.strip()]
+            for line in lines:
+                self._apply(json.loads(line))
+            self.segment = number
+            self.segment_records = len(lines)
+        self.segment = max(self.segment, covered + 1)
+
+    def student(self, student_id):
+        state = self.students.get(student_id)
+        if state is None:
+            state = self.students[student_id] = StudentPerformance(self.recent_window)
+        return state
+
+    def record_session(self, student_id, score, results=(), timestamp=None):
+        # results are (concept, correct) pairs from one quiz
+        record = {
+            'student': student_id,
+            'ts': _timestamp(timestamp),
+            'score': score,
+            'results': [[concept, bool(correct)] for concept, correct in results]
+        }
+        with self.lock:
+            self._append(record)
+            return self._apply(record)
+
+    def _append(self, record):
+        if not self.directory:
+            return
+        if self.segment_records >= self.segment_max_records:
+            # Roll over through a snapshot, so a restart replays at most one segment
+            self.compact()
+        with open(self._segment_path(self.segment), 'a') as handle:
+            handle.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.segment_records += 1
+
+    def _decayed(self, entry, now):
+        score, updated = entry
+        return score * 0.5 ** (max(0.0, now - updated) / self.half_life)
+
+    def _apply(self, record):
+        state = self.student(record['student'])
+        now = record['ts']
+        score = record['score']
+        state.sessions += 1
+        state.score_sum += score
+        state.best_score = score if state.best_score is None else max(state.best_score, score)
+        state.last_score = score
+        state.last_session = now
+        weak_concepts = [concept for concept, correct in record['results'] if not correct]
+        if len(state.recent) == state.recent.maxlen:
+            state.recent_sum -= state.recent[0]['score']
+        state.recent.append({'date': datetime.fromtimestamp(now), 'score': score, 'weak_concepts': weak_concepts})
+        state.recent_sum += score
+
+        for concept, correct in record['results']:
+            entry = state.weak_scores.get(concept)
+            current = self._decayed(entry, now) if entry is not None else 0.0
+            current = current + self.miss_weight if not correct else max(0.0, current - self.hit_credit)
+            if current > 0:
+                state.weak_scores[concept] = [current, now]
+            else:
+                state.weak_scores.pop(concept, None)
+            if current >= self.weak_threshold:
+                state.weak_areas.add(concept)
+            else:
+                state.weak_areas.discard(concept)
+        return state
+
+    def _refresh(self, state, now):
+        # Decay can only shrink scores, so only current members need rechecking
+        for concept in list(state.weak_areas):
+            if self._decayed(state.weak_scores[concept], now) < self.weak_threshold:
+                state.weak_areas.discard(concept)
+
+    def weak_areas(self, student_id, now=None, limit=None):
+        # Strongest weakness first
+        now = _timestamp(now)
+        with self.lock:
+            state = self.student(student_id)
+            self._refresh(state, now)
+            ranked = sorted(state.weak_areas, key=lambda concept: -self._decayed(state.weak_scores[concept], now))
+        return ranked[:limit] if limit is not None else ranked
+
+    def is_weak(self, student_id, concept):
+        state = self.students.get(student_id)
+        return state is not None and concept in state.weak_areas
+
+    def summary(self, student_id, now=None):
+        with self.lock:
+            state = self.student(student_id)
+            self._refresh(state, _timestamp(now))
+        return {
+            'sessions': state.sessions,
+            'average_score': state.average_score,
+            'recent_average': state.recent_average,
+            'best_score': state.best_score,
+            'last_score': state.last_score,
+            'weak_area_count': len(state.weak_areas)
+        }
+
+    def compact(self):
+        # Snapshot the aggregates, then drop the segments the snapshot covers
+        if not self.directory:
+            return
+        with self.lock:
+            snapshot = {
+                'segment': self.segment,
+                'students': {student_id: state.to_dict() for student_id, state in self.students.items()}
+            }
+            snapshot_path = os.path.join(self.directory, 'snapshot.json')
+            with open(snapshot_path + '.tmp', 'w') as handle:
+                json.dump(snapshot, handle)
+            os.replace(snapshot_path + '.tmp', snapshot_path)
+            for number, path in self._segments():
+                if number <= snapshot['segment']:
+                    os.remove(path)
+            self.segment += 1
+            self.segment_records = 0
@@ -0,0 +1,363 @@
+from collections.abc import Mapping, MutableMapping
+from datetime import datetime, timedelta
+import numpy as np
+from gamification_rpg import RPGPlayer, LEVEL_UP_COINS
+
+SUBJECTS = ('physics', 'chemistry', 'biology', 'mathematics', 'english', 'programming', 'social_studies')
+STATS = ('intelligence', 'creativity', 'focus', 'collaboration', 'persistence')
+SUBJECT_FIELDS = ('level', 'xp', 'mastery')
+# Object-valued state that save/load round-trips; listeners and achievement_state are runtime wiring
+# that AchievementSystem.attach rebuilds
+PERSISTED_OBJECTS = ('inventory', 'achievements', 'current_quests', 'completed_quests')
+
+class ColumnarPlayerStore:
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.capacity = 0
+        self.player_ids = []
+        self.names = []
+        self.rows = {}
+        # Rarely touched, variable-length state stays as Python objects, created per row on first use
+        self.objects = {}
+        self.subject_columns = {subject: column for column, subject in enumerate(SUBJECTS)}
+        self.stat_columns = {stat: column for column, stat in enumerate(STATS)}
+        self.level = np.empty(0, dtype=np.int32)
+        self.xp = np.empty(0, dtype=np.int64)
+        self.coins = np.empty(0, dtype=np.int64)
+        self.energy = np.empty(0, dtype=np.int32)
+        self.streak_days = np.empty(0, dtype=np.int32)
+        # Seconds since the epoch, NaN when the player has no recorded activity
+        self.last_activity = np.empty(0, dtype=np.float64)
+        self.subject_level = np.empty((0, len(SUBJECTS)), dtype=np.int32)
+        self.subject_xp = np.empty((0, len(SUBJECTS)), dtype=np.int64)
+        self.subject_mastery = np.empty((0, len(SUBJECTS)), dtype=np.float32)
+        self.stats = np.empty((0, len(STATS)), dtype=np.int32)
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        defaults = {
+            'level': 1, 'xp': 0, 'coins': 100, 'energy': 100, 'streak_days': 0, 'last_activity': np.nan,
+            'subject_level': 1, 'subject_xp': 0, 'subject_mastery': 0, 'stats': 10
+        }
+        for column, default in defaults.items():
+            old = getattr(self, column)
+            grown = np.full((capacity,) + old.shape[1:], default, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, column, grown)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.size
+
+    def add_player(self, player_id, name=""):
+        if player_id in self.rows:
+            return self.get(player_id)
+        if self.size == self.capacity:
+            self._grow(max(1024, self.capacity * 2))
+        row = self.size
+        self.size += 1
+        self.rows[player_id] = row
+        self.player_ids.append(player_id)
+        self.names.append(name)
+        return PlayerView(self, row)
+
+    def row_objects(self, row):
+        objects = self.objects.get(row)
+        if objects is None:
+            objects = self.objects[row] = {
+                'inventory': {
+                    'badges': [],
+                    'items': ['Basic Calculator', 'Notebook'],
+                    'avatars': ['Student Avatar'],
+                    'themes': ['Classic Theme']
+                },
+                'achievements': [],
+                'current_quests': [],
+                'completed_quests': [],
+                'listeners': [],
+                'achievement_state': None
+            }
+        return objects
+
+    def import_player(self, player_id, player):
+        view = self.add_player(player_id, player.name)
+        row = view.row
+        for column in ('level', 'xp', 'coins', 'energy', 'streak_days'):
+            getattr(self, column)[row] = getattr(player, column)
+        view.last_activity = player.last_activity
+        for subject, data in player.subjects.items():
+            column = self.subject_columns[subject]
+            self.subject_level[row, column] = data['level']
+            self.subject_xp[row, column] = data['xp']
+            self.subject_mastery[row, column] = data['mastery']
+        for stat, value in player.stats.items():
+            self.stats[row, self.stat_columns[stat]] = value
+        for key in ('inventory', 'achievements', 'current_quests', 'completed_quests'):
+            self.row_objects(row)[key] = getattr(player, key)
+        return view
+
+    def get(self, player_id):
+        row = self.rows.get(player_id)
+        return PlayerView(self, row) if row is not None else None
+
+    def _select(self, player_ids):
+        if player_ids is None:
+            return slice(0, self.size)
+        return np.fromiter((self.rows[player_id] for player_id in player_ids), dtype=np.int64)
+
+    def grant_xp(self, subject, amount, player_ids=None):
+        # Vectorized RPGPlayer.gain_xp over every selected row at once
+        amount = np.asarray(amount, dtype=np.int64)
+        return self.apply_xp(subject, amount, amount // 2, player_ids)
+
+    def apply_xp(self, subject, subject_amount, overall_amount, player_ids=None):
+        rows = self._select(player_ids)
+        column = self.subject_columns[subject]
+        subject_xp = self.subject_xp[rows, column] + subject_amount
+        subject_level = self.subject_level[rows, column].copy()
+        start_subject_level = subject_level.copy()
+        # Carry excess XP level by level; the loop runs once per level gained by the fastest row
+        while True:
+            threshold = subject_level.astype(np.int64) * 100 + 50
+            up = subject_xp >= threshold
+            if not up.any():
+                break
+            subject_xp = np.where(up, subject_xp - threshold, subject_xp)
+            subject_level = subject_level + up
+        self.subject_xp[rows, column] = subject_xp
+        self.subject_level[rows, column] = subject_level
+
+        xp = self.xp[rows] + overall_amount
+        level = self.level[rows].copy()
+        start_level = level.copy()
+        while True:
+            threshold = level.astype(np.int64) * 100 + 50
+            up = xp >= threshold
+            if not up.any():
+                break
+            xp = np.where(up, xp - threshold, xp)
+            level = level + up
+        self.xp[rows] = xp
+        self.level[rows] = level
+        self.coins[rows] += LEVEL_UP_COINS * (level - start_level).astype(np.int64)
+        ids = np.arange(self.size)[rows]
+        subject_up = subject_level > start_subject_level
+        level_up = level > start_level
+        self._emit_level_ups(subject, ids[subject_up], start_subject_level[subject_up], subject_level[subject_up],
+                             ids[level_up], start_level[level_up], level[level_up])
+        return {'subject_level_up': ids[subject_up], 'level_up': ids[level_up]}
+
+    def _emit_level_ups(self, subject, subject_rows, subject_old, subject_new, level_rows, level_old, level_new):
+        # Same field events RPGPlayer.apply_xp emits, only for rows that have listeners attached
+        for row, old, new in zip(subject_rows.tolist(), subject_old.tolist(), subject_new.tolist()):
+            if self.objects.get(row, {}).get('listeners'):
+                PlayerView(self, row)._emit('subjects.level', new, old, subject)
+        for row, old, new in zip(level_rows.tolist(), level_old.tolist(), level_new.tolist()):
+            if self.objects.get(row, {}).get('listeners'):
+                PlayerView(self, row)._emit('level', new, old)
+
+    def grant_coins(self, amount, player_ids=None):
+        self.coins[self._select(player_ids)] += amount
+
+    def decay_streaks(self, now=None):
+        # Streaks survive only if the last activity was today or yesterday
+        now = now or datetime.now()
+        cutoff = datetime.combine(now.date() - timedelta(days=1), datetime.min.time()).timestamp()
+        active = self.last_activity[:self.size]
+        expired = ~(active >= cutoff) & (self.streak_days[:self.size] > 0)
+        self.streak_days[:self.size][expired] = 0
+        return int(expired.sum())
+
+    def leaderboard_snapshot(self, field='level', top=10, subject=None):
+        if subject is not None:
+            values = self.subject_level[:self.size, self.subject_columns[subject]]
+        elif field == 'total_xp':
+            values = self.total_xp()
+        else:
+            values = getattr(self, field)[:self.size]
+        top = min(top, self.size)
+        if top == 0:
+            return []
+        candidates = np.argpartition(-values, top - 1)[:top]
+        ordered = candidates[np.lexsort((candidates, -values[candidates]))]
+        return [(self.player_ids[row], values[row].item()) for row in ordered]
+
+    def total_xp(self):
+        # XP spent on earlier levels plus the XP toward the next one
+        level = self.level[:self.size].astype(np.int64) - 1
+        return 100 * level * (level + 1) // 2 + 50 * level + self.xp[:self.size]
+
+    def aggregate(self):
+        return {
+            'players': self.size,
+            'average_level': float(self.level[:self.size].mean()) if self.size else 0.0,
+            'total_coins': int(self.coins[:self.size].sum()),
+            'subject_average_levels': dict(zip(SUBJECTS, self.subject_level[:self.size].mean(axis=0).tolist()))
+                                      if self.size else {},
+            'active_streaks': int((self.streak_days[:self.size] > 0).sum())
+        }
+
+    def save(self, path):
+        # The columns serialize as a handful of contiguous arrays instead of millions of small dicts; object
+        # state is only stored for the rows that have any
+        object_rows = sorted(self.objects)
+        object_values = np.empty(len(object_rows), dtype=object)
+        for i, row in enumerate(object_rows):
+            object_values[i] = {key: self.objects[row][key] for key in PERSISTED_OBJECTS}
+        np.savez_compressed(
+            path,
+            player_ids=np.array(self.player_ids, dtype=object),
+            names=np.array(self.names, dtype=object),
+            object_rows=np.array(object_rows, dtype=np.int64),
+            object_values=object_values,
+            **{column: getattr(self, column)[:self.size] for column in (
+                'level', 'xp', 'coins', 'energy', 'streak_days', 'last_activity',
+                'subject_level', 'subject_xp', 'subject_mastery', 'stats')}
+        )
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=True)
+        store = cls(capacity=max(1024, len(data['player_ids'])))
+        for player_id, name in zip(data['player_ids'].tolist(), data['names'].tolist()):
+            store.add_player(player_id, name)
+        for column in ('level', 'xp', 'coins', 'energy', 'streak_days', 'last_activity',
+                       'subject_level', 'subject_xp', 'subject_mastery', 'stats'):
+            getattr(store, column)[:store.size] = data[column]
+        if 'object_rows' in data.files:
+            for row, values in zip(data['object_rows'].tolist(), data['object_values']):
+                store.row_objects(row).update(values)
+        return store
+
+class _SubjectRow(MutableMapping):
+    def __init__(self, store, row, column):
+        self.store = store
+        self.row = row
+        self.column = column
+
+    def _array(self, key):
+        if key == 'level':
+            return self.store.subject_level
+        if key == 'xp':
+            return self.store.subject_xp
+        if key == 'mastery':
+            return self.store.subject_mastery
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        return self._array(key)[self.row, self.column].item()
+
+    def __setitem__(self, key, value):
+        self._array(key)[self.row, self.column] = value
+
+    def __delitem__(self, key):
+        raise TypeError("subject fields cannot be removed")
+
+    def __iter__(self):
+        return iter(SUBJECT_FIELDS)
+
+    def __len__(self):
+        return len(SUBJECT_FIELDS)
+
+class _SubjectsView(Mapping):
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, subject):
+        return _SubjectRow(self.store, self.row, self.store.subject_columns[subject])
+
+    def __iter__(self):
+        return iter(SUBJECTS)
+
+    def __len__(self):
+        return len(SUBJECTS)
+
+class _StatsView(MutableMapping):
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, stat):
+        return self.store.stats[self.row, self.store.stat_columns[stat]].item()
+
+    def __setitem__(self, stat, value):
+        self.store.stats[self.row, self.store.stat_columns[stat]] = value
+
+    def __delitem__(self, stat):
+        raise TypeError("stats cannot be removed")
+
+    def __iter__(self):
+        return iter(STATS)
+
+    def __len__(self):
+        return len(STATS)
+
+def _column_property(column):
+    def getter(self):
+        return getattr(self.store, column)[self.row].item()
+
+    def setter(self, value):
+        getattr(self.store, column)[self.row] = value
+    return property(getter, setter)
+
+def _object_property(key):
+    def getter(self):
+        return self.store.row_objects(self.row)[key]
+
+    def setter(self, value):
+        self.store.row_objects(self.row)[key] = value
+    return property(getter, setter)
+
+class PlayerView(RPGPlayer):
+    # RPGPlayer's methods run unchanged; every attribute they touch reads or writes the store's columns
+    level = _column_property('level')
+    xp = _column_property('xp')
+    coins = _column_property('coins')
+    energy = _column_property('energy')
+    streak_days = _column_property('streak_days')
+    inventory = _object_property('inventory')
+    achievements = _object_property('achievements')
+    current_quests = _object_property('current_quests')
+    completed_quests = _object_property('completed_quests')
+    listeners = _object_property('listeners')
+    achievement_state = _object_property('achievement_state')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def player_id(self):
+        return self.store.player_ids[self.row]
+
+    @property
+    def name(self):
+        return self.store.names[self.row]
+
+    @name.setter
+    def name(self, value):
+        self.store.names[self.row] = value
+
+    @property
+    def last_activity(self):
+        value = self.store.last_activity[self.row]
+        return None if np.isnan(value) else datetime.fromtimestamp(value)
+
+    @last_activity.setter
+    def last_activity(self, value):
+        self.store.last_activity[self.row] = np.nan if value is None else value.timestamp()
+
+    @property
+    def subjects(self):
+        return _SubjectsView(self.store, self.row)
+
+    @property
+    def stats(self):
+        return _StatsView(self.store, self.row)
+
+    def get_status(self):
+        status = super().get_status()
+        status['subjects'] = {subject: dict(data) for subject, data in self.subjects.items()}
+        status['stats'] = dict(self.stats)
+        return status
@@ -0,0 +1,148 @@
+import threading
+import time
+
+class PresenceService:
+    def __init__(self, heartbeat_timeout=30, tick_seconds=1.0, batch_interval=0.5, publish=None, on_change=None):
+        self.tick_seconds = tick_seconds
+        self.timeout_ticks = max(1, int(round(heartbeat_timeout / tick_seconds)))
+        # Timing wheel: a member's key sits in the slot of the tick at which it expires
+        self.wheel_size = self.timeout_ticks + 2
+        self.wheel = [set() for _ in range(self.wheel_size)]
+        self.deadlines = {}
+        self.current_tick = self._tick(time.monotonic())
+        # Per-team bitsets of online members; slots map user ids to bit positions
+        self.slots = {}
+        self.slot_users = {}
+        self.online_bits = {}
+        self.batch_interval = batch_interval
+        self.publish = publish
+        self.on_change = on_change
+        # team -> {user: state before this batch}, so flaps inside one batch are never broadcast
+        self.batch_origin = {}
+        self.lock = threading.RLock()
+        self.running = threading.Event()
+        self.thread = None
+
+    def _tick(self, now):
+        return int(now / self.tick_seconds)
+
+    def _slot(self, team_id, user_id):
+        slots = self.slots.setdefault(team_id, {})
+        slot = slots.get(user_id)
+        if slot is None:
+            users = self.slot_users.setdefault(team_id, [])
+            slot = slots[user_id] = len(users)
+            users.append(user_id)
+        return slot
+
+    def heartbeat(self, team_id, user_id, now=None):
+        now = time.monotonic() if now is None else now
+        key = (team_id, user_id)
+        with self.lock:
+            due = self._tick(now) + self.timeout_ticks
+            old = self.deadlines.get(key)
+            if old != due:
+                if old is not None:
+                    self.wheel[old % self.wheel_size].discard(key)
+                self.wheel[due % self.wheel_size].add(key)
+                self.deadlines[key] = due
+            self._set_online(team_id, user_id, True)
+
+    def leave(self, team_id, user_id):
+        key = (team_id, user_id)
+        with self.lock:
+            due = self.deadlines.pop(key, None)
+            if due is not None:
+                self.wheel[due % self.wheel_size].discard(key)
+            self._set_online(team_id, user_id, False)
+
+    def advance(self, now=None):
+        now = time.monotonic() if now is None else now
+        target = self._tick(now)
+        expired = []
+        with self.lock:
+            # Only the slots between the last tick and now can hold due keys, at most one full turn
+            for step in range(1, min(target - self.current_tick, self.wheel_size) + 1):
+                slot = self.wheel[(self.current_tick + step) % self.wheel_size]
+                due = [key for key in slot if self.deadlines[key] <= target]
+                for key in due:
+                    slot.discard(key)
+                    del self.deadlines[key]
+                    self._set_online(key[0], key[1], False)
+                expired.extend(due)
+            self.current_tick = max(self.current_tick, target)
+        return expired
+
+    def _set_online(self, team_id, user_id, online):
+        bit = 1 << self._slot(team_id, user_id)
+        bits = self.online_bits.get(team_id, 0)
+        was_online = bool(bits & bit)
+        if was_online == online:
+            return
+        self.batch_origin.setdefault(team_id, {}).setdefault(user_id, was_online)
+        self.online_bits[team_id] = bits | bit if online else bits & ~bit
+
+    def is_online(self, team_id, user_id):
+        slot = self.slots.get(team_id, {}).get(user_id)
+        return slot is not None and bool(self.online_bits.get(team_id, 0) >> slot & 1)
+
+    def online_members(self, team_id):
+        with self.lock:
+            bits = self.online_bits.get(team_id, 0)
+            users = self.slot_users.get(team_id, [])
+            members = []
+            while bits:
+                low = bits & -bits
+                members.append(users[low.bit_length() - 1])
+                bits ^= low
+            return members
+
+    def online_count(self, team_id):
+        return bin(self.online_bits.get(team_id, 0)).count("1")
+
+    def flush_changes(self):
+        with self.lock:
+            origin, self.batch_origin = self.batch_origin, {}
+            batches = {}
+            for team_id, users in origin.items():
+                online, offline = [], []
+                for user_id, was_online in users.items():
+                    now_online = self.is_online(team_id, user_id)
+                    if now_online != was_online:
+                        (online if now_online else offline).append(user_id)
+                if online or offline:
+                    batches[team_id] = (online, offline)
+        for team_id, (online, offline) in batches.items():
+            if self.on_change:
+                self.on_change(team_id, online, offline)
+            if self.publish:
+                self.publish(f"presence:{team_id}", {
+                    "type": "presence",
+                    "team_id": team_id,
+                    "online": online,
+                    "offline": offline,
+                    "online_count": self.online_count(team_id)
+                })
+        return batches
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.running.set()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.running.clear()
+        self.thread.join()
+        self.thread = None
+        self.flush_changes()
+
+    def _run(self):
+        while self.running.is_set():
+            self.advance()
+            self.flush_changes()
+            time.sleep(min(self.batch_interval, self.tick_seconds))
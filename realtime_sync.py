@@ -0,0 +1,231 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+import itertools
+from collections import OrderedDict, defaultdict
+import websockets
+
+class ClientConnection:
+    def __init__(self, websocket, max_queue=256, max_drops=512):
+        self.id = str(uuid.uuid4())
+        self.websocket = websocket
+        self.rooms = set()
+        self.max_queue = max_queue
+        self.max_drops = max_drops
+        # Pending frames keyed by coalesce key; uncoalesced frames get a unique sequence key
+        self.pending = OrderedDict()
+        self.ready = asyncio.Event()
+        self.sequence = itertools.count()
+        self.dropped = 0
+        self.coalesced = 0
+        self.closed = False
+
+    def enqueue(self, frame, coalesce_key=None):
+        if self.closed:
+            return False
+        if coalesce_key is not None and coalesce_key in self.pending:
+            # Newer state replaces the queued one in place (cursor moves, document snapshots, ...)
+            self.pending[coalesce_key] = frame
+            self.coalesced += 1
+            return True
+        if len(self.pending) >= self.max_queue:
+            self.pending.popitem(last=False)
+            self.dropped += 1
+            if self.dropped > self.max_drops:
+                # A consumer this far behind only slows the room down; cut it loose
+                self.closed = True
+                self.pending.clear()
+                self.ready.set()
+                return False
+        key = coalesce_key if coalesce_key is not None else ('seq', next(self.sequence))
+        self.pending[key] = frame
+        self.ready.set()
+        return True
+
+class WebSocketBroadcastServer:
+    def __init__(self, host='127.0.0.1', port=8765, max_queue=256, max_drops=512):
+        self.host = host
+        self.port = port
+        self.max_queue = max_queue
+        self.max_drops = max_drops
+        self.rooms = defaultdict(set)
+        self.clients = {}
+        self.server = None
+        self.stats = {'published': 0, 'delivered': 0, 'dropped_clients': 0}
+
+    async def start(self):
+        self.server = await websockets.serve(self._handler, self.host, self.port)
+        if self.port == 0:
+            self.port = next(iter(self.server.sockets)).getsockname()[1]
+        return self.server
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def subscribe(self, client, room):
+        self.rooms[room].add(client)
+        client.rooms.add(room)
+
+    def unsubscribe(self, client, room):
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(client)
+            if not members:
+                del self.rooms[room]
+        client.rooms.discard(room)
+
+    def publish(self, room, payload, coalesce_key=None, exclude=None):
+        members = self.rooms.get(room)
+        if not members:
+            return 0
+        # Serialize once per message, not once per subscriber
+        frame = payload if isinstance(payload, (str, bytes)) else json.dumps(payload, default=str)
+        self.stats['published'] += 1
+        delivered = 0
+        for client in tuple(members):
+            if client is exclude:
+                continue
+            if client.enqueue(frame, coalesce_key):
+                delivered += 1
+            elif client.closed:
+                self._drop(client)
+        return delivered
+
+    def _drop(self, client):
+        self.stats['dropped_clients'] += 1
+        self._unregister(client)
+        asyncio.ensure_future(client.websocket.close(code=1008, reason='slow consumer'))
+
+    def _unregister(self, client):
+        for room in tuple(client.rooms):
+            self.unsubscribe(client, room)
+        self.clients.pop(client.id, None)
+
+    async def _handler(self, websocket, path=None):
+        client = ClientConnection(websocket, self.max_queue, self.max_drops)
+        self.clients[client.id] = client
+        sender = asyncio.ensure_future(self._sender(client))
+        try:
+            async for raw in websocket:
+                try:
+                    message = json.loads(raw)
+                except ValueError:
+                    continue
+                action = message.get('action')
+                room = message.get('room')
+                if action == 'join' and room:
+                    self.subscribe(client, room)
+                elif action == 'leave' and room:
+                    self.unsubscribe(client, room)
+                elif action == 'publish' and room in client.rooms:
+                    self.publish(room, message.get('data'), message.get('coalesce_key'),
+                                 exclude=None if message.get('echo') else client)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            client.closed = True
+            client.ready.set()
+            self._unregister(client)
+            await sender
+
+    async def _sender(self, client):
+        websocket = client.websocket
+        try:
+            while True:
+                await client.ready.wait()
+                if client.closed:
+                    return
+                client.ready.clear()
+                while client.pending:
+                    _, frame = client.pending.popitem(last=False)
+                    await websocket.send(frame)
+                    self.stats['delivered'] += 1
+        except websockets.ConnectionClosed:
+            pass
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+async def run_load_test(clients=1000, teams=200, messages_per_team=20, interval=0.05, host='127.0.0.1'):
+    # Every client joins one team room; one member per team publishes timestamped messages
+    # and every other member records the end-to-end delivery latency
+    server = WebSocketBroadcastServer(host, 0, max_queue=1024)
+    await server.start()
+    url = f"ws://{host}:{server.port}"
+    latencies = []
+    received = [0]
+
+    connections = []
+    for index in range(clients):
+        websocket = await websockets.connect(url, max_queue=None)
+        await websocket.send(json.dumps({'action': 'join', 'room': f"team_{index % teams}"}))
+        connections.append(websocket)
+    await asyncio.sleep(0.5)
+
+    async def listen(websocket):
+        try:
+            async for raw in websocket:
+                sent_at = json.loads(raw)['sent_at']
+                latencies.append(time.perf_counter() - sent_at)
+                received[0] += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    listeners = [asyncio.ensure_future(listen(websocket)) for websocket in connections]
+    publishers = connections[:teams]
+    members_per_team = clients // teams
+    expected = teams * messages_per_team * (members_per_team - 1)
+
+    start = time.perf_counter()
+    for sequence in range(messages_per_team):
+        for index, websocket in enumerate(publishers):
+            await websocket.send(json.dumps({
+                'action': 'publish',
+                'room': f"team_{index}",
+                'data': {'sent_at': time.perf_counter(), 'seq': sequence, 'text': 'x' * 64}
+            }))
+        await asyncio.sleep(interval)
+
+    deadline = time.perf_counter() + 10
+    while received[0] < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    for websocket in connections:
+        await websocket.close()
+    await asyncio.gather(*listeners, return_exceptions=True)
+    await server.stop()
+
+    return {
+        'clients': clients,
+        'teams': teams,
+        'messages_published': teams * messages_per_team,
+        'deliveries_expected': expected,
+        'deliveries_received': received[0],
+        'throughput_per_second': received[0] / elapsed if elapsed else 0,
+        'p50_ms': _percentile(latencies, 0.50) * 1000 if latencies else None,
+        'p95_ms': _percentile(latencies, 0.95) * 1000 if latencies else None,
+        'p99_ms': _percentile(latencies, 0.99) * 1000 if latencies else None,
+        'max_ms': max(latencies) * 1000 if latencies else None
+    }
+
+def main():
+    import resource
+    # Both ends of 1,000 connections live in this process, so raise the descriptor limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, 8192)), hard))
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {sorted(os.sched_getaffinity(0))[0]})
+    report = asyncio.run(run_load_test())
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -34,7 +34,13 @@ CREATE TABLE IF NOT EXISTS teams (
   name VARCHAR(255) NOT NULL,
   description TEXT,
   created_by VARCHAR(255) NOT NULL,
-  created_at TIMESTAMP DEFAULT NOW()
+  created_at TIMESTAMP DEFAULT NOW(),
+  external_id VARCHAR(64) UNIQUE,
+  max_members INTEGER DEFAULT 6,
+  stats JSONB,
+  achievements JSONB,
+  active_projects JSONB,
+  updated_at TIMESTAMP DEFAULT NOW()
 );
 
 CREATE TABLE IF NOT EXISTS team_members (
@@ -42,5 +48,58 @@ CREATE TABLE IF NOT EXISTS team_members (
   user_id VARCHAR(255) NOT NULL,
   role VARCHAR(50) DEFAULT 'member',
   joined_at TIMESTAMP DEFAULT NOW(),
+  user_name VARCHAR(255),
+  active BOOLEAN DEFAULT TRUE,
+  contribution_score INTEGER DEFAULT 0,
   PRIMARY KEY(team_id, user_id)
 );
+
+-- Databases created before the team store existed
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS external_id VARCHAR(64) UNIQUE;
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS max_members INTEGER DEFAULT 6;
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS stats JSONB;
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS achievements JSONB;
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS active_projects JSONB;
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT NOW();
+ALTER TABLE team_members ADD COLUMN IF NOT EXISTS user_name VARCHAR(255);
+ALTER TABLE team_members ADD COLUMN IF NOT EXISTS active BOOLEAN DEFAULT TRUE;
+ALTER TABLE team_members ADD COLUMN IF NOT EXISTS contribution_score INTEGER DEFAULT 0;
+
+-- Live team sessions, one per team
+CREATE TABLE IF NOT EXISTS team_sessions (
+  team_id INTEGER PRIMARY KEY REFERENCES teams(id),
+  session_type VARCHAR(50) NOT NULL,
+  start_time TIMESTAMP DEFAULT NOW(),
+  active_members JSONB,
+  engagement_data JSONB
+);
+
+-- Raw team engagement snapshots
+CREATE TABLE IF NOT EXISTS team_engagement (
+  id SERIAL PRIMARY KEY,
+  team_id INTEGER REFERENCES teams(id),
+  recorded_at TIMESTAMP DEFAULT NOW(),
+  snapshot JSONB
+);
+CREATE INDEX IF NOT EXISTS team_engagement_team_time ON team_engagement(team_id, recorded_at);
+
+-- Hourly and daily engagement rollups, updated as snapshots arrive
+CREATE TABLE IF NOT EXISTS team_engagement_rollups (
+  team_id INTEGER REFERENCES teams(id),
+  granularity VARCHAR(8) NOT NULL,
+  bucket_start TIMESTAMP NOT NULL,
+  sessions INTEGER DEFAULT 0,
+  engagement DOUBLE PRECISION DEFAULT 0,
+  collaboration DOUBLE PRECISION DEFAULT 0,
+  productivity DOUBLE PRECISION DEFAULT 0,
+  PRIMARY KEY(team_id, granularity, bucket_start)
+);
+
+-- Per-hour engagement profile of each daily rollup
+CREATE TABLE IF NOT EXISTS team_engagement_hours (
+  team_id INTEGER REFERENCES teams(id),
+  bucket_start TIMESTAMP NOT NULL,
+  hour INTEGER NOT NULL,
+  engagement DOUBLE PRECISION DEFAULT 0,
+  PRIMARY KEY(team_id, bucket_start, hour)
+);
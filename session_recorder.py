@@ -0,0 +1,167 @@
+import bisect
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+MAGIC = b'SSLOG1'
+FILE_HEADER = struct.Struct('<6sd')
+# compressed length, event count, first and last event timestamp
+BLOCK_HEADER = struct.Struct('<IIdd')
+INDEX_ENTRY = struct.Struct('<dQ')
+
+logger = logging.getLogger(__name__)
+
+class SessionEventLog:
+    def __init__(self, path, index_interval=10.0, flush_interval=1.0, max_block_events=5000, start_time=None):
+        self.path = path
+        self.index_path = path + '.idx'
+        self.index_interval = index_interval
+        self.flush_interval = flush_interval
+        self.max_block_events = max_block_events
+        self.start_time = start_time or time.time()
+        self.buffer = []
+        self.lock = threading.Lock()
+        self.io_lock = threading.Lock()
+        self.events_written = 0
+        self.bytes_written = 0
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.handle = open(path, 'ab')
+        self.index_handle = open(self.index_path, 'ab')
+        if new_file:
+            self.handle.write(FILE_HEADER.pack(MAGIC, self.start_time))
+            self.handle.flush()
+        self.closed = threading.Event()
+        self.writer = threading.Thread(target=self._writer_loop)
+        self.writer.daemon = True
+        self.writer.start()
+
+    def record(self, event_type, payload, timestamp=None):
+        # Payloads are encoded here, because callers keep mutating the dicts they pass in; compression
+        # and I/O happen on the writer thread
+        event = (timestamp or time.time(), event_type, json.dumps(payload, default=str, separators=(',', ':')))
+        with self.lock:
+            self.buffer.append(event)
+
+    def flush(self):
+        with self.lock:
+            events, self.buffer = self.buffer, []
+        if not events:
+            return 0
+        with self.io_lock:
+            block = []
+            for event in events:
+                # Blocks never span more than index_interval, so every block start is a seek point
+                if block and (event[0] - block[0][0] >= self.index_interval or len(block) >= self.max_block_events):
+                    self._write_block(block)
+                    block = []
+                block.append(event)
+            self._write_block(block)
+            self.handle.flush()
+            self.index_handle.flush()
+        return len(events)
+
+    def _write_block(self, block):
+        raw = '\n'.join(f"[{json.dumps(ts)},{json.dumps(event_type)},{payload}]"
+                        for ts, event_type, payload in block).encode('utf-8')
+        compressed = zlib.compress(raw, 6)
+        offset = self.handle.tell()
+        self.handle.write(BLOCK_HEADER.pack(len(compressed), len(block), block[0][0], block[-1][0]))
+        self.handle.write(compressed)
+        self.index_handle.write(INDEX_ENTRY.pack(block[0][0], offset))
+        self.events_written += len(block)
+        self.bytes_written += BLOCK_HEADER.size + len(compressed)
+
+    def _writer_loop(self):
+        while not self.closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # The taken events are lost, but the thread keeps draining the buffer
+                logger.exception("Failed to write session events to %s", self.path)
+
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.writer.join()
+        self.flush()
+        self.handle.close()
+        self.index_handle.close()
+
+class SessionReplay:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as handle:
+            magic, self.start_time = FILE_HEADER.unpack(handle.read(FILE_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a session event log")
+        self.index_times, self.index_offsets = self._load_index()
+
+    def _load_index(self):
+        entries = []
+        index_path = self.path + '.idx'
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as handle:
+                data = handle.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            entries = [INDEX_ENTRY.unpack_from(data, pos) for pos in range(0, usable, INDEX_ENTRY.size)]
+        file_size = os.path.getsize(self.path)
+        if not entries or entries[-1][1] >= file_size:
+            entries = self._scan_blocks()
+        return [ts for ts, _ in entries], [offset for _, offset in entries]
+
+    def _scan_blocks(self):
+        # Rebuild the index from block headers when the sidecar file is missing or stale
+        entries = []
+        with open(self.path, 'rb') as handle:
+            offset = FILE_HEADER.size
+            handle.seek(offset)
+            while True:
+                header = handle.read(BLOCK_HEADER.size)
+                if len(header) < BLOCK_HEADER.size:
+                    break
+                length, _, first_ts, _ = BLOCK_HEADER.unpack(header)
+                entries.append((first_ts, offset))
+                offset += BLOCK_HEADER.size + length
+                handle.seek(offset)
+        return entries
+
+    @property
+    def block_count(self):
+        return len(self.index_offsets)
+
+    def duration(self):
+        if not self.index_offsets:
+            return 0.0
+        with open(self.path, 'rb') as handle:
+            handle.seek(self.index_offsets[-1])
+            _, _, _, last_ts = BLOCK_HEADER.unpack(handle.read(BLOCK_HEADER.size))
+        return last_ts - self.start_time
+
+    def events(self, start=None, end=None, event_types=None):
+        # start/end are seconds from the session start; seeking costs one bisect over the index
+        start_ts = self.start_time + start if start is not None else None
+        end_ts = self.start_time + end if end is not None else None
+        block = 0
+        if start_ts is not None:
+            block = max(0, bisect.bisect_right(self.index_times, start_ts) - 1)
+        with open(self.path, 'rb') as handle:
+            for offset in self.index_offsets[block:]:
+                handle.seek(offset)
+                length, _, first_ts, last_ts = BLOCK_HEADER.unpack(handle.read(BLOCK_HEADER.size))
+                if end_ts is not None and first_ts > end_ts:
+                    return
+                if start_ts is not None and last_ts < start_ts:
+                    continue
+                for line in zlib.decompress(handle.read(length)).split(b'\n'):
+                    ts, event_type, payload = json.loads(line)
+                    if start_ts is not None and ts < start_ts:
+                        continue
+                    if end_ts is not None and ts > end_ts:
+                        return
+                    if event_types is None or event_type in event_types:
+                        yield {'offset': ts - self.start_time, 'type': event_type, 'data': payload}
@@ -0,0 +1,174 @@
+import time
+from datetime import datetime
+import numpy as np
+
+DAY = 86400.0
+# Self-reported difficulty from the review UI mapped onto SM-2 quality grades (0-5)
+GRADE_LABELS = {'Again': 1, 'Hard': 3, 'Medium': 4, 'Good': 4, 'Easy': 5}
+
+def _timestamp(value):
+    if value is None:
+        return time.time()
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+class SpacedRepetitionScheduler:
+    def __init__(self, capacity=1024, reindex_fraction=0.05):
+        self.size = 0
+        self.capacity = 0
+        self.card_ids = []
+        self.cards = []
+        self.rows = {}
+        self.students = {}
+        self.ease = np.empty(0, dtype=np.float32)
+        self.interval = np.empty(0, dtype=np.float32)
+        self.repetitions = np.empty(0, dtype=np.int32)
+        self.lapses = np.empty(0, dtype=np.int32)
+        self.owner = np.empty(0, dtype=np.int32)
+        # Seconds since the epoch
+        self.due = np.empty(0, dtype=np.float64)
+        # Rows sorted by due time as of the last reindex; rows changed since then are in self.dirty
+        self.sorted_rows = np.empty(0, dtype=np.int64)
+        self.sorted_due = np.empty(0, dtype=np.float64)
+        self.dirty = set()
+        self.reindex_fraction = reindex_fraction
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        defaults = {'ease': 2.5, 'interval': 0, 'repetitions': 0, 'lapses': 0, 'owner': -1, 'due': np.inf}
+        for column, default in defaults.items():
+            old = getattr(self, column)
+            grown = np.full(capacity, default, dtype=old.dtype)
+            grown[:self.size] = old[:self.size]
+            setattr(self, column, grown)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.size
+
+    def _student(self, student_id):
+        index = self.students.get(student_id)
+        if index is None:
+            index = self.students[student_id] = len(self.students)
+        return index
+
+    def add_card(self, card_id, card, student_id, due=None):
+        if card_id in self.rows:
+            return self.rows[card_id]
+        if self.size == self.capacity:
+            self._grow(max(1024, self.capacity * 2))
+        row = self.size
+        self.size += 1
+        self.rows[card_id] = row
+        self.card_ids.append(card_id)
+        self.cards.append(card)
+        self.owner[row] = self._student(student_id)
+        self.due[row] = _timestamp(due)
+        self.dirty.add(row)
+        return row
+
+    def add_cards(self, card_ids, student_ids, due):
+        # Bulk load for a whole class; due is an array of epoch seconds
+        count = len(card_ids)
+        if self.size + count > self.capacity:
+            self._grow(max(1024, self.capacity * 2, self.size + count))
+        start = self.size
+        rows = np.arange(start, start + count)
+        self.card_ids.extend(card_ids)
+        self.cards.extend([None] * count)
+        self.rows.update(zip(card_ids, rows.tolist()))
+        self.owner[rows] = [self._student(student_id) for student_id in student_ids]
+        self.due[rows] = due
+        self.size += count
+        self.reindex()
+        return rows
+
+    def reindex(self):
+        order = np.argsort(self.due[:self.size], kind='stable')
+        self.sorted_rows = order
+        self.sorted_due = self.due[order]
+        self.dirty = set()
+
+    def review(self, card_id, grade, now=None):
+        row = self.rows[card_id]
+        self.review_batch(np.array([row]), np.array([GRADE_LABELS.get(grade, grade)]), now)
+        return self.card_state(card_id)
+
+    def review_batch(self, rows, grades, now=None):
+        # SM-2 over a whole review session at once
+        now = _timestamp(now)
+        rows = np.asarray(rows, dtype=np.int64)
+        quality = np.asarray(grades, dtype=np.float32)
+        miss = 5 - quality
+        ease = np.maximum(1.3, self.ease[rows] + 0.1 - miss * (0.08 + miss * 0.02))
+        passed = quality >= 3
+        repetitions = np.where(passed, self.repetitions[rows] + 1, 0)
+        interval = np.where(repetitions <= 1, 1.0,
+                            np.where(repetitions == 2, 6.0, np.round(self.interval[rows] * ease)))
+        self.ease[rows] = ease
+        self.repetitions[rows] = repetitions
+        self.interval[rows] = interval
+        self.lapses[rows] += ~passed
+        self.due[rows] = now + interval * DAY
+        self.dirty.update(rows.tolist())
+        if len(self.dirty) > self.reindex_fraction * max(self.size, 1):
+            self.reindex()
+
+    def due_rows(self, now=None, student_id=None, limit=None):
+        cutoff = _timestamp(now)
+        # The sorted prefix up to the cutoff, minus rows whose due time moved, plus dirty rows now due
+        candidates = self.sorted_rows[:np.searchsorted(self.sorted_due, cutoff, side='right')]
+        if self.dirty:
+            dirty = np.fromiter(self.dirty, dtype=np.int64, count=len(self.dirty))
+            candidates = np.concatenate([candidates[~np.isin(candidates, dirty)],
+                                         dirty[self.due[dirty] <= cutoff]])
+        if student_id is not None:
+            student = self.students.get(student_id)
+            if student is None:
+                return np.empty(0, dtype=np.int64)
+            candidates = candidates[self.owner[candidates] == student]
+        if self.dirty:
+            candidates = candidates[np.argsort(self.due[candidates], kind='stable')]
+        return candidates[:limit] if limit is not None else candidates
+
+    def due_cards(self, now=None, student_id=None, limit=None):
+        return [self.card_ids[row] for row in self.due_rows(now, student_id, limit).tolist()]
+
+    def card_state(self, card_id):
+        row = self.rows[card_id]
+        return {
+            'card': self.cards[row],
+            'interval': float(self.interval[row]),
+            'ease_factor': float(self.ease[row]),
+            'repetitions': int(self.repetitions[row]),
+            'lapses': int(self.lapses[row]),
+            'next_review': datetime.fromtimestamp(self.due[row])
+        }
+
+def benchmark(cards=1_000_000, students=1000, seed=3):
+    rng = np.random.default_rng(seed)
+    scheduler = SpacedRepetitionScheduler()
+    now = time.time()
+    start = time.perf_counter()
+    scheduler.add_cards([f"card_{i}" for i in range(cards)],
+                        [f"student_{i % students}" for i in range(cards)],
+                        now + rng.uniform(-5, 30, cards) * DAY)
+    report = {'cards': cards, 'load_s': time.perf_counter() - start}
+
+    start = time.perf_counter()
+    due = scheduler.due_rows(now)
+    report['due_today_ms'] = (time.perf_counter() - start) * 1000
+    report['due_today'] = len(due)
+
+    session = rng.choice(due, size=min(50_000, len(due)), replace=False)
+    start = time.perf_counter()
+    scheduler.review_batch(session, rng.integers(0, 6, len(session)), now)
+    report['review_50k_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    scheduler.due_rows(now, student_id='student_7')
+    report['due_one_student_ms'] = (time.perf_counter() - start) * 1000
+    return report
+
+if __name__ == "__main__":
+    for key, value in benchmark().items():
+        print(f"{key}: {value:.2f}" if isinstance(value, float) else f"{key}: {value}")
@@ -3,37 +3,134 @@ import uuid
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import threading
-import queue
 import asyncio
+import bisect
+import math
+from collections import deque
+from realtime_sync import WebSocketBroadcastServer
+from text_crdt import TextCRDT
+from chat_store import ChatStore
+from presence_service import PresenceService
+from session_recorder import SessionEventLog, SessionReplay
 
 class TeamCollaborationSystem:
-    def __init__(self):
-        self.teams = {}
-        self.team_sessions = {}
+    def __init__(self, store=None, sync=None, heartbeat_timeout=30, start_presence=True):
+        # With a TeamStore the teams dict is the store's identity map and survives restarts
+        self.store = store
+        self.teams = store.load_all_teams() if store else {}
+        self.team_sessions = store.load_sessions() if store else {}
         self.team_projects = {}
         self.team_chat = TeamChatSystem()
-        self.team_voice = TeamVoiceSystem()
-        self.team_video = TeamVideoSystem()
+        # Guards team, session, voice and video dicts shared with the presence thread
+        self.lock = threading.RLock()
+        self.team_voice = TeamVoiceSystem(self.lock)
+        self.team_video = TeamVideoSystem(self.lock)
         self.ai_team_assistant = AITeamAssistant()
-        self.engagement_tracker = TeamEngagementTracker()
+        self.engagement_tracker = TeamEngagementTracker(store)
+        self.sync = sync
+        self.presence = PresenceService(heartbeat_timeout, publish=sync.publish if sync else None,
+                                        on_change=self._apply_presence)
+        if start_presence:
+            # Background ticks expire missed heartbeats and apply batched changes to the teams
+            self.presence.start()
         
     def create_team(self, team_name, creator_id, max_members=6):
         team_id = str(uuid.uuid4())
         team = Team(team_id, team_name, creator_id, max_members)
-        self.teams[team_id] = team
+        with self.lock:
+            self.teams[team_id] = team
+            self.save_team(team)
+        # The creator starts active, so it expires like any other member
+        self.presence.heartbeat(team_id, creator_id)
         return team
     
+    def get_team(self, team_id):
+        # Teams created by another worker are loaded on first use
+        if team_id not in self.teams and self.store:
+            self.store.get_team(team_id)
+        return self.teams.get(team_id)
+    
     def join_team(self, team_id, user_id, user_name):
-        if team_id in self.teams:
-            return self.teams[team_id].add_member(user_id, user_name)
+        team = self.get_team(team_id)
+        if team is not None:
+            with self.lock:
+                joined = team.add_member(user_id, user_name)
+                if joined:
+                    self.save_team(team)
+            if joined:
+                self.presence.heartbeat(team_id, user_id)
+            return joined
         return False
     
-    def start_team_session(self, team_id, session_type="study"):
+    def heartbeat(self, team_id, user_id):
         if team_id in self.teams:
+            self.presence.heartbeat(team_id, user_id)
+    
+    def get_online_members(self, team_id):
+        return self.presence.online_members(team_id)
+    
+    def broadcast_to_team(self, team_id, data, coalesce_key=None):
+        # Fan out only to members whose heartbeats are current
+        if not self.sync:
+            return 0
+        online = self.presence.online_members(team_id)
+        for user_id in online:
+            self.sync.publish(f"user:{user_id}", data, coalesce_key)
+        return len(online)
+    
+    def _apply_presence(self, team_id, online, offline):
+        # Expired heartbeats clear the "active" flags and live participant maps
+        with self.lock:
+            team = self.teams.get(team_id)
+            if team is None:
+                return
+            for user_id in online:
+                if user_id in team.members:
+                    team.members[user_id]["active"] = True
+            for user_id in offline:
+                if user_id in team.members:
+                    team.members[user_id]["active"] = False
+            session = self.team_sessions.get(team_id)
+            voice = self.team_voice.voice_channels.get(team_id)
+            video = self.team_video.video_rooms.get(team_id)
+            for user_id in offline:
+                if session and user_id in session.active_members:
+                    session.active_members[user_id]["active"] = False
+                if voice:
+                    voice["participants"].pop(user_id, None)
+                if video:
+                    video["participants"].pop(user_id, None)
+            for user_id in online:
+                if session and user_id in session.active_members:
+                    session.active_members[user_id]["active"] = True
+            self.save_team(team)
+            if session:
+                self.save_session(session)
+    
+    def start_team_session(self, team_id, session_type="study"):
+        if self.get_team(team_id) is not None:
             session = TeamSession(team_id, session_type)
-            self.team_sessions[team_id] = session
+            with self.lock:
+                self.team_sessions[team_id] = session
+                self.save_session(session)
             return session
         return None
+    
+    def save_team(self, team):
+        if self.store:
+            self.store.save_team(team)
+    
+    def save_session(self, session):
+        if self.store:
+            self.store.save_session(session)
+    
+    def flush(self):
+        if self.store:
+            self.store.flush()
+    
+    def close(self):
+        self.presence.stop()
+        self.flush()
 
 class Team:
     def __init__(self, team_id, name, creator_id, max_members=6):
@@ -53,6 +150,12 @@ class Team:
         }
         self.achievements = []
         self.active_projects = []
+        # Set by a TeamStore so every mutation marks the team dirty for the next flush
+        self.on_change = None
+    
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
         
     def add_member(self, user_id, user_name):
         if len(self.members) < self.max_members and user_id not in self.members:
@@ -63,12 +166,14 @@ class Team:
                 "active": True,
                 "contribution_score": 0
             }
+            self._changed()
             return True
         return False
     
     def remove_member(self, user_id):
         if user_id in self.members and user_id != self.creator_id:
             del self.members[user_id]
+            self._changed()
             return True
         return False
     
@@ -81,7 +186,9 @@ class Team:
             self.stats["team_level"] += 1
             self.stats["team_xp"] = 0
             self.stats["team_coins"] += 100 * self.stats["team_level"]
+            self._changed()
             return {"level_up": True, "new_level": self.stats["team_level"]}
+        self._changed()
         return {"xp_gained": amount}
     
     def get_xp_for_next_level(self):
@@ -97,6 +204,40 @@ class TeamSession:
         self.collaborative_workspace = CollaborativeWorkspace()
         self.session_chat = []
         self.engagement_data = {}
+        self.recorder = None
+        # Set by a TeamStore, as for Team
+        self.on_change = None
+    
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self)
+        
+    def start_recording(self, path, index_interval=10.0):
+        # Chat, whiteboard, document edits and engagement all go to one compressed event log
+        self.recorder = SessionEventLog(path, index_interval=index_interval, start_time=self.start_time.timestamp())
+        self.collaborative_workspace.recorder = self.recorder
+        self.collaborative_workspace.shared_whiteboard.recorder = self.recorder
+        self._record("session_started", {"team_id": self.team_id, "session_type": self.session_type})
+        return self.recorder
+    
+    def stop_recording(self):
+        if self.recorder is None:
+            return None
+        self._record("session_stopped", {"team_id": self.team_id})
+        self.recorder.close()
+        path = self.recorder.path
+        self.recorder = None
+        self.collaborative_workspace.recorder = None
+        self.collaborative_workspace.shared_whiteboard.recorder = None
+        return path
+    
+    @staticmethod
+    def open_replay(path):
+        return SessionReplay(path)
+    
+    def _record(self, event_type, payload):
+        if self.recorder is not None:
+            self.recorder.record(event_type, payload)
         
     def add_member_to_session(self, user_id, user_name):
         self.active_members[user_id] = {
@@ -106,6 +247,10 @@ class TeamSession:
             "contributions": 0,
             "active": True
         }
+        # Joining a session means holding replicas of its shared documents
+        self.collaborative_workspace.add_replica_holder(user_id)
+        self._changed()
+        self._record("member_joined", {"user_id": user_id, "name": user_name})
     
     def update_member_engagement(self, user_id, engagement_score):
         if user_id in self.active_members:
@@ -114,6 +259,20 @@ class TeamSession:
                 "timestamp": datetime.now(),
                 "score": engagement_score
             }
+            self._changed()
+            self._record("engagement", {"user_id": user_id, "score": engagement_score})
+    
+    def send_chat_message(self, user_id, user_name, message):
+        msg = {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "user_name": user_name,
+            "message": message,
+            "timestamp": datetime.now()
+        }
+        self.session_chat.append(msg)
+        self._record("chat", msg)
+        return msg
 
 class CollaborativeWorkspace:
     def __init__(self):
@@ -121,41 +280,225 @@ class CollaborativeWorkspace:
         self.shared_code = {}
         self.shared_whiteboard = WhiteboardSystem()
         self.real_time_sync = RealTimeSyncSystem()
+        self.recorder = None
+        # Session members; each holds a replica of every shared text, including ones created later
+        self.replica_holders = set()
         
     def create_shared_document(self, doc_type, content=""):
         doc_id = str(uuid.uuid4())
-        self.shared_documents[doc_id] = {
-            "type": doc_type,
+        self.shared_documents[doc_id] = self._new_shared_text(content, type=doc_type)
+        return doc_id
+
+    def create_shared_code(self, language, content=""):
+        code_id = str(uuid.uuid4())
+        self.shared_code[code_id] = self._new_shared_text(content, language=language)
+        return code_id
+
+    def _new_shared_text(self, content, **fields):
+        return {
+            **fields,
             "content": content,
             "created_at": datetime.now(),
             "last_modified": datetime.now(),
             "collaborators": [],
-            "version_history": []
+            # Users holding a client replica; every one must acknowledge before tombstones go
+            "replicas": set(self.replica_holders),
+            "version": 0,
+            "history": DocumentHistory(content),
+            # Server replica of the sequence CRDT that clients edit concurrently
+            "crdt": TextCRDT("server", content)
         }
-        return doc_id
     
     def update_shared_document(self, doc_id, new_content, user_id):
-        if doc_id in self.shared_documents:
-            doc = self.shared_documents[doc_id]
-            # Save version history
-            doc["version_history"].append({
-                "content": doc["content"],
-                "timestamp": doc["last_modified"],
-                "user": user_id
-            })
-            # Update document
-            doc["content"] = new_content
-            doc["last_modified"] = datetime.now()
-            if user_id not in doc["collaborators"]:
-                doc["collaborators"].append(user_id)
-            return True
+        return self._update_shared_text(self.shared_documents, "doc", doc_id, new_content, user_id)
+
+    def update_shared_code(self, code_id, new_content, user_id):
+        return self._update_shared_text(self.shared_code, "code", code_id, new_content, user_id)
+
+    def apply_document_delta(self, doc_id, delta, user_id, base_version=None):
+        # Clients that already send deltas skip the diff entirely; a delta made against an older
+        # version is shifted past the edits since then, or rejected if it overlaps one of them
+        if doc_id not in self.shared_documents:
+            return False
+        doc = self.shared_documents[doc_id]
+        if base_version is not None and base_version != doc["version"]:
+            if base_version > doc["version"]:
+                return False
+            delta = DocumentHistory.rebase(delta, doc["history"].deltas_since(base_version))
+            if delta is None:
+                return False
+        # Positional edits are made by the server replica under its own site id, so they can
+        # never collide with ids a client replica generates for the same user
+        ops = doc["crdt"].splice(delta["pos"], delta["delete"], delta["insert"])
+        return self._commit(doc, "doc", doc_id, ops, user_id)
+
+    def apply_remote_ops(self, doc_id, payload, user_id, kind="doc"):
+        # Binary CRDT ops from a client replica; merges commute, so no base version is needed
+        store = self.shared_documents if kind == "doc" else self.shared_code
+        if doc_id not in store:
+            return False
+        store[doc_id]["replicas"].add(user_id)
+        return self._commit(store[doc_id], kind, doc_id, TextCRDT.decode_ops(payload), user_id)
+
+    def add_replica_holder(self, user_id):
+        # Registered before the user has edited or acked anything, so GC waits for what they have observed
+        self.replica_holders.add(user_id)
+        for doc in list(self.shared_documents.values()) + list(self.shared_code.values()):
+            doc["replicas"].add(user_id)
+
+    def register_replica(self, doc_id, user_id, kind="doc"):
+        store = self.shared_documents if kind == "doc" else self.shared_code
+        if doc_id not in store:
+            return False
+        store[doc_id]["replicas"].add(user_id)
+        return True
+
+    def unregister_replica(self, doc_id, user_id, kind="doc"):
+        store = self.shared_documents if kind == "doc" else self.shared_code
+        if doc_id not in store:
+            return False
+        store[doc_id]["replicas"].discard(user_id)
+        store[doc_id]["crdt"].acknowledged.pop(user_id, None)
+        return True
+
+    def _update_shared_text(self, store, kind, doc_id, new_content, user_id):
+        if doc_id in store:
+            doc = store[doc_id]
+            delta = DocumentHistory.compute_delta(doc["content"], new_content)
+            if delta is None:
+                return True
+            ops = doc["crdt"].splice(delta["pos"], delta["delete"], delta["insert"])
+            return self._commit(doc, kind, doc_id, ops, user_id)
         return False
 
+    def _commit(self, doc, kind, doc_id, ops, user_id):
+        crdt = doc["crdt"]
+        crdt.apply_ops(ops)
+        new_content = crdt.text()
+        delta = DocumentHistory.compute_delta(doc["content"], new_content)
+        if delta is not None:
+            now = datetime.now()
+            doc["history"].record(delta, user_id, now, new_content)
+            doc["content"] = new_content
+            doc["version"] += 1
+            doc["last_modified"] = now
+            if self.recorder is not None:
+                self.recorder.record("document_edit", {"kind": kind, "doc_id": doc_id, "user_id": user_id, "delta": delta})
+        if user_id not in doc["collaborators"]:
+            doc["collaborators"].append(user_id)
+        # Only the compact encoded ops go to the sync layer
+        self.real_time_sync.publish(f"{kind}:{doc_id}", TextCRDT.encode_ops(ops))
+        return True
+
+    def acknowledge_document(self, doc_id, user_id, version, kind="doc"):
+        # Clients report the CRDT version vector they have integrated; only these acks make
+        # tombstones stable enough to collect
+        store = self.shared_documents if kind == "doc" else self.shared_code
+        if doc_id not in store:
+            return 0
+        crdt = store[doc_id]["crdt"]
+        store[doc_id]["replicas"].add(user_id)
+        crdt.acknowledge(user_id, version)
+        members = store[doc_id]["replicas"]
+        if all(member in crdt.acknowledged for member in members):
+            return crdt.collect_garbage(members)
+        return 0
+
+    def get_document_version(self, doc_id, version):
+        if doc_id in self.shared_documents:
+            return self.shared_documents[doc_id]["history"].content_at(version)
+        return None
+
+class DocumentHistory:
+    def __init__(self, content="", snapshot_interval=100):
+        self.snapshot_interval = snapshot_interval
+        # Full copies every snapshot_interval versions bound reconstruction to that many deltas
+        self.snapshots = {0: content}
+        self.deltas = []
+
+    @staticmethod
+    def compute_delta(old, new):
+        # Edits are local, so trimming the common prefix/suffix yields one splice of edit size
+        if old == new:
+            return None
+        limit = min(len(old), len(new))
+        # Binary search over slice comparisons keeps the scanning in C
+        low, high = 0, limit
+        while low < high:
+            mid = (low + high + 1) // 2
+            if old[:mid] == new[:mid]:
+                low = mid
+            else:
+                high = mid - 1
+        start = low
+        low, high = 0, limit - start
+        while low < high:
+            mid = (low + high + 1) // 2
+            if old[len(old) - mid:] == new[len(new) - mid:]:
+                low = mid
+            else:
+                high = mid - 1
+        end = low
+        return {"pos": start, "delete": len(old) - start - end, "insert": new[start:len(new) - end]}
+
+    @staticmethod
+    def rebase(delta, intervening):
+        # Shift a positional delta past later deltas; None when it overlaps one of them
+        pos, delete = delta["pos"], delta["delete"]
+        for other in intervening:
+            other_end = other["pos"] + other["delete"]
+            if other_end <= pos:
+                pos += len(other["insert"]) - other["delete"]
+            elif other["pos"] < pos + delete:
+                return None
+        return {"pos": pos, "delete": delete, "insert": delta["insert"]}
+
+    @staticmethod
+    def apply_delta(content, delta):
+        pos = delta["pos"]
+        return content[:pos] + delta["insert"] + content[pos + delta["delete"]:]
+
+    @property
+    def version(self):
+        return len(self.deltas)
+
+    def record(self, delta, user_id, timestamp, new_content):
+        self.deltas.append({**delta, "user": user_id, "timestamp": timestamp})
+        if self.version % self.snapshot_interval == 0:
+            self.snapshots[self.version] = new_content
+
+    def content_at(self, version):
+        if version < 0 or version > self.version:
+            return None
+        base = version - version % self.snapshot_interval
+        content = self.snapshots[base]
+        for delta in self.deltas[base:version]:
+            content = self.apply_delta(content, delta)
+        return content
+
+    def deltas_since(self, version):
+        return self.deltas[version:]
+
+    def memory_estimate(self):
+        return (sum(len(snapshot) for snapshot in self.snapshots.values()) +
+                sum(len(delta["insert"]) + 48 for delta in self.deltas))
+
 class WhiteboardSystem:
-    def __init__(self):
+    def __init__(self, cell_size=64, change_log_size=10000):
         self.canvas_data = {}
-        self.drawing_history = []
+        self.elements = {}
         self.active_tools = {}
+        self.spatial_index = UniformGridIndex(cell_size)
+        self.z_order = {}
+        self.version = 0
+        self.change_log_size = change_log_size
+        # (version, element_id, removed) entries, oldest first
+        self.change_log = []
+        self.recorder = None
+
+    @property
+    def drawing_history(self):
+        return list(self.elements.values())
         
     def add_drawing_element(self, element_type, coordinates, user_id, properties=None):
         element = {
@@ -166,151 +509,396 @@ class WhiteboardSystem:
             "timestamp": datetime.now(),
             "properties": properties or {}
         }
-        self.drawing_history.append(element)
+        element["points"] = self._points(coordinates)
+        element["bbox"] = self._bbox(element)
+        self.elements[element["id"]] = element
+        self.z_order[element["id"]] = self.version + 1
+        self.spatial_index.insert(element["id"], element["bbox"])
+        self._log_change(element["id"], removed=False)
+        if self.recorder is not None:
+            self.recorder.record("whiteboard_add", {key: element[key] for key in
+                                                    ("id", "type", "coordinates", "user_id", "properties")})
         return element["id"]
-    
-    def get_canvas_state(self):
+
+    def erase_element(self, element_id):
+        element = self.elements.pop(element_id, None)
+        if element is None:
+            return False
+        del self.z_order[element_id]
+        self.spatial_index.remove(element_id, element["bbox"])
+        self._log_change(element_id, removed=True)
+        if self.recorder is not None:
+            self.recorder.record("whiteboard_erase", {"id": element_id})
+        return True
+
+    def erase_region(self, x0, y0, x1, y1):
+        region = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        erased = [element_id for element_id in self.spatial_index.query(region)
+                  if self._intersects_region(self.elements[element_id], region)]
+        for element_id in erased:
+            self.erase_element(element_id)
+        return erased
+
+    def query_viewport(self, x0, y0, x1, y1):
+        region = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        x0, y0, x1, y1 = region
+        visible = []
+        for element_id in self.spatial_index.query(region):
+            bx0, by0, bx1, by1 = self.elements[element_id]["bbox"]
+            if not (bx1 < x0 or bx0 > x1 or by1 < y0 or by0 > y1):
+                visible.append(self.elements[element_id])
+        visible.sort(key=lambda element: self.z_order[element["id"]])
+        return visible
+
+    def hit_test(self, x, y, tolerance=5):
+        region = (x - tolerance, y - tolerance, x + tolerance, y + tolerance)
+        best = None
+        for element_id in self.spatial_index.query(region):
+            element = self.elements[element_id]
+            reach = tolerance + element["properties"].get("width", 1) / 2
+            if self._distance_to_element(element, x, y) <= reach:
+                if best is None or self.z_order[element_id] > self.z_order[best["id"]]:
+                    best = element
+        return best
+
+    def get_canvas_state(self, since_version=None, viewport=None):
+        if since_version is not None:
+            changes = self.get_changes_since(since_version)
+            if changes is not None:
+                return {**changes, "active_tools": self.active_tools}
+        elements = self.query_viewport(*viewport) if viewport else self.drawing_history
         return {
-            "elements": self.drawing_history,
+            "full": True,
+            "version": self.version,
+            "elements": elements,
             "active_tools": self.active_tools
         }
 
+    def get_changes_since(self, version):
+        # None means the log no longer reaches back that far and the client needs a full state
+        if version >= self.version:
+            return {"full": False, "version": self.version, "updated": [], "removed": []}
+        if not self.change_log or self.change_log[0][0] > version + 1:
+            return None
+        start = bisect.bisect_right(self.change_log, (version, chr(0x10FFFF), True))
+        latest = {}
+        for _, element_id, removed in self.change_log[start:]:
+            latest[element_id] = removed
+        return {
+            "full": False,
+            "version": self.version,
+            "updated": [self.elements[element_id] for element_id, removed in latest.items()
+                        if not removed and element_id in self.elements],
+            "removed": [element_id for element_id, removed in latest.items() if removed]
+        }
+
+    def _log_change(self, element_id, removed):
+        self.version += 1
+        self.change_log.append((self.version, element_id, removed))
+        if len(self.change_log) > self.change_log_size:
+            del self.change_log[:len(self.change_log) - self.change_log_size]
+
+    def _points(self, coordinates):
+        if isinstance(coordinates, dict):
+            if "r" in coordinates:
+                cx, cy, r = coordinates.get("cx", coordinates.get("x", 0)), coordinates.get("cy", coordinates.get("y", 0)), coordinates["r"]
+                return [(cx - r, cy - r), (cx + r, cy + r)]
+            if "width" in coordinates:
+                x, y = coordinates.get("x", 0), coordinates.get("y", 0)
+                return [(x, y), (x + coordinates["width"], y + coordinates.get("height", 0))]
+            return [(coordinates.get("x1", coordinates.get("x", 0)), coordinates.get("y1", coordinates.get("y", 0))),
+                    (coordinates.get("x2", coordinates.get("x", 0)), coordinates.get("y2", coordinates.get("y", 0)))]
+        coordinates = list(coordinates or [])
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            return list(zip(coordinates[0::2], coordinates[1::2]))
+        return [tuple(point[:2]) for point in coordinates]
+
+    def _bbox(self, element):
+        points = element["points"] or [(0, 0)]
+        pad = element["properties"].get("width", 1) / 2
+        xs = [point[0] for point in points]
+        ys = [point[1] for point in points]
+        return (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+    def _is_area_shape(self, element):
+        return element["type"] in ("rectangle", "rect", "circle", "ellipse", "image", "text") \
+            or isinstance(element["coordinates"], dict)
+
+    def _intersects_region(self, element, region):
+        x0, y0, x1, y1 = region
+        bx0, by0, bx1, by1 = element["bbox"]
+        if bx1 < x0 or bx0 > x1 or by1 < y0 or by0 > y1:
+            return False
+        points = element["points"]
+        if self._is_area_shape(element) or len(points) < 2:
+            return True
+        for (ax, ay), (bx, by) in zip(points, points[1:]):
+            if _segment_intersects_rect(ax, ay, bx, by, x0, y0, x1, y1):
+                return True
+        return False
+
+    def _distance_to_element(self, element, x, y):
+        bx0, by0, bx1, by1 = element["bbox"]
+        points = element["points"]
+        if self._is_area_shape(element) or len(points) < 2:
+            dx = max(bx0 - x, 0, x - bx1)
+            dy = max(by0 - y, 0, y - by1)
+            return math.hypot(dx, dy)
+        return min(_point_segment_distance(x, y, ax, ay, bx, by)
+                   for (ax, ay), (bx, by) in zip(points, points[1:]))
+
+class UniformGridIndex:
+    def __init__(self, cell_size=64, max_cells_per_item=256):
+        self.cell_size = cell_size
+        self.max_cells_per_item = max_cells_per_item
+        self.cells = {}
+        # Items spanning too many cells are checked on every query instead of filling the grid
+        self.oversized = {}
+
+    def _cell_range(self, bbox):
+        size = self.cell_size
+        return (int(math.floor(bbox[0] / size)), int(math.floor(bbox[1] / size)),
+                int(math.floor(bbox[2] / size)), int(math.floor(bbox[3] / size)))
+
+    def insert(self, item_id, bbox):
+        cx0, cy0, cx1, cy1 = self._cell_range(bbox)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > self.max_cells_per_item:
+            self.oversized[item_id] = bbox
+            return
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(item_id)
+
+    def remove(self, item_id, bbox):
+        if self.oversized.pop(item_id, None) is not None:
+            return
+        cx0, cy0, cx1, cy1 = self._cell_range(bbox)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is not None:
+                    cell.discard(item_id)
+                    if not cell:
+                        del self.cells[(cx, cy)]
+
+    def query(self, region):
+        cx0, cy0, cx1, cy1 = self._cell_range(region)
+        found = set()
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # Huge viewport: walking the occupied cells is cheaper than the empty ones
+            for (cx, cy), items in self.cells.items():
+                if cx0 <= cx <= cx1 and cy0 <= cy <= cy1:
+                    found |= items
+        else:
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    items = self.cells.get((cx, cy))
+                    if items:
+                        found |= items
+        x0, y0, x1, y1 = region
+        for item_id, (bx0, by0, bx1, by1) in self.oversized.items():
+            if not (bx1 < x0 or bx0 > x1 or by1 < y0 or by0 > y1):
+                found.add(item_id)
+        return found
+
+def _point_segment_distance(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    t = 0 if length_sq == 0 else max(0, min(1, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    return math.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+def _segment_intersects_rect(ax, ay, bx, by, x0, y0, x1, y1):
+    # Liang-Barsky clipping: the segment touches the rectangle if a non-empty part survives
+    t0, t1 = 0.0, 1.0
+    dx, dy = bx - ax, by - ay
+    for p, q in ((-dx, ax - x0), (dx, x1 - ax), (-dy, ay - y0), (dy, y1 - ay)):
+        if p == 0:
+            if q < 0:
+                return False
+        else:
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return False
+    return True
+
 class RealTimeSyncSystem:
-    def __init__(self):
-        self.sync_queue = queue.Queue()
-        self.connected_clients = {}
+    def __init__(self, host='127.0.0.1', port=8765):
+        self.server = WebSocketBroadcastServer(host, port)
+        self.loop = None
         self.sync_thread = None
-        
+
+    @property
+    def connected_clients(self):
+        return self.server.clients
+
     def start_sync(self):
-        self.sync_thread = threading.Thread(target=self._sync_loop)
+        # The broadcast server owns an asyncio loop on a daemon thread; Streamlit code publishes into it
+        if self.sync_thread is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        failure = []
+        self.sync_thread = threading.Thread(target=self._sync_loop, args=(started, failure))
         self.sync_thread.daemon = True
         self.sync_thread.start()
-    
-    def _sync_loop(self):
-        while True:
-            try:
-                sync_data = self.sync_queue.get(timeout=1)
-                self._broadcast_to_clients(sync_data)
-            except queue.Empty:
-                continue
-    
+        started.wait()
+        if failure:
+            # e.g. the port is taken; publish() must keep reporting that nothing is running
+            self.sync_thread.join()
+            self.loop.close()
+            self.loop = None
+            self.sync_thread = None
+            raise failure[0]
+
+    def stop_sync(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.server.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.sync_thread.join()
+        self.loop = None
+        self.sync_thread = None
+
+    def _sync_loop(self, started, failure):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.server.start())
+        except Exception as e:
+            failure.append(e)
+            return
+        finally:
+            started.set()
+        self.loop.run_forever()
+
+    def publish(self, room, data, coalesce_key=None):
+        if self.loop is None:
+            return False
+        self.loop.call_soon_threadsafe(self.server.publish, room, data, coalesce_key)
+        return True
+
     def _broadcast_to_clients(self, data):
-        # Broadcast changes to all connected clients
-        for client_id in self.connected_clients:
-            # In real implementation, this would use WebSockets
-            pass
+        # Broadcast changes to every subscriber of the data's room
+        return self.publish(data.get("room"), data, data.get("coalesce_key"))
 
 class TeamChatSystem:
-    def __init__(self):
+    def __init__(self, db_path=':memory:', tail_size=200):
         self.chat_rooms = {}
-        self.message_history = {}
+        # Messages live in the store: bounded in-memory tails, older history in SQLite
+        self.store = ChatStore(db_path, tail_size=tail_size)
         
     def create_chat_room(self, team_id):
         self.chat_rooms[team_id] = {
-            "messages": [],
             "active_users": set(),
             "created_at": datetime.now()
         }
+        self.store.create_room(team_id)
         return team_id
     
     def send_message(self, team_id, user_id, user_name, message, message_type="text"):
         if team_id in self.chat_rooms:
-            msg = {
-                "id": str(uuid.uuid4()),
-                "user_id": user_id,
-                "user_name": user_name,
-                "message": message,
-                "type": message_type,
-                "timestamp": datetime.now(),
-                "reactions": {}
-            }
-            self.chat_rooms[team_id]["messages"].append(msg)
-            return msg
+            return self.store.append(team_id, user_id, user_name, message, message_type)
         return None
     
     def add_reaction(self, team_id, message_id, user_id, reaction):
         if team_id in self.chat_rooms:
-            for msg in self.chat_rooms[team_id]["messages"]:
-                if msg["id"] == message_id:
-                    if reaction not in msg["reactions"]:
-                        msg["reactions"][reaction] = []
-                    if user_id not in msg["reactions"][reaction]:
-                        msg["reactions"][reaction].append(user_id)
-                    return True
+            return self.store.add_reaction(team_id, message_id, user_id, reaction)
         return False
 
+    def get_recent_messages(self, team_id, limit=50):
+        if team_id in self.chat_rooms:
+            return self.store.get_recent(team_id, limit)
+        return []
+
+    def get_message_page(self, team_id, cursor=None, limit=50):
+        # Pass the returned next_cursor back in to page further into history
+        if team_id in self.chat_rooms:
+            return self.store.get_page(team_id, before=cursor, limit=limit)
+        return {"messages": [], "next_cursor": None}
+
 class TeamVoiceSystem:
-    def __init__(self):
+    def __init__(self, lock=None):
         self.voice_channels = {}
         self.active_calls = {}
+        self.lock = lock or threading.RLock()
         
     def create_voice_channel(self, team_id):
-        self.voice_channels[team_id] = {
-            "participants": {},
-            "is_recording": False,
-            "quality": "high",
-            "created_at": datetime.now()
-        }
-        return team_id
+        with self.lock:
+            self.voice_channels[team_id] = {
+                "participants": {},
+                "is_recording": False,
+                "quality": "high",
+                "created_at": datetime.now()
+            }
+            return team_id
     
     def join_voice_channel(self, team_id, user_id, user_name):
-        if team_id in self.voice_channels:
-            self.voice_channels[team_id]["participants"][user_id] = {
-                "name": user_name,
-                "joined_at": datetime.now(),
-                "muted": False,
-                "speaking": False
-            }
-            return True
-        return False
+        with self.lock:
+            if team_id in self.voice_channels:
+                self.voice_channels[team_id]["participants"][user_id] = {
+                    "name": user_name,
+                    "joined_at": datetime.now(),
+                    "muted": False,
+                    "speaking": False
+                }
+                return True
+            return False
     
     def toggle_mute(self, team_id, user_id):
-        if team_id in self.voice_channels and user_id in self.voice_channels[team_id]["participants"]:
-            participant = self.voice_channels[team_id]["participants"][user_id]
-            participant["muted"] = not participant["muted"]
-            return participant["muted"]
-        return None
+        with self.lock:
+            if team_id in self.voice_channels and user_id in self.voice_channels[team_id]["participants"]:
+                participant = self.voice_channels[team_id]["participants"][user_id]
+                participant["muted"] = not participant["muted"]
+                return participant["muted"]
+            return None
 
 class TeamVideoSystem:
-    def __init__(self):
+    def __init__(self, lock=None):
         self.video_rooms = {}
         self.screen_sharing = {}
+        self.lock = lock or threading.RLock()
         
     def create_video_room(self, team_id, max_participants=6):
-        self.video_rooms[team_id] = {
-            "participants": {},
-            "max_participants": max_participants,
-            "screen_sharing_active": False,
-            "recording": False,
-            "created_at": datetime.now()
-        }
-        return team_id
+        with self.lock:
+            self.video_rooms[team_id] = {
+                "participants": {},
+                "max_participants": max_participants,
+                "screen_sharing_active": False,
+                "recording": False,
+                "created_at": datetime.now()
+            }
+            return team_id
     
     def join_video_room(self, team_id, user_id, user_name):
-        if team_id in self.video_rooms:
-            room = self.video_rooms[team_id]
-            if len(room["participants"]) < room["max_participants"]:
-                room["participants"][user_id] = {
-                    "name": user_name,
-                    "joined_at": datetime.now(),
-                    "camera_on": True,
-                    "screen_sharing": False
-                }
-                return True
-        return False
+        with self.lock:
+            if team_id in self.video_rooms:
+                room = self.video_rooms[team_id]
+                if len(room["participants"]) < room["max_participants"]:
+                    room["participants"][user_id] = {
+                        "name": user_name,
+                        "joined_at": datetime.now(),
+                        "camera_on": True,
+                        "screen_sharing": False
+                    }
+                    return True
+            return False
     
     def start_screen_sharing(self, team_id, user_id):
-        if team_id in self.video_rooms:
-            # Stop any existing screen sharing
-            for uid, participant in self.video_rooms[team_id]["participants"].items():
-                participant["screen_sharing"] = False
+        with self.lock:
+            if team_id in self.video_rooms:
+                # Stop any existing screen sharing
+                for uid, participant in self.video_rooms[team_id]["participants"].items():
+                    participant["screen_sharing"] = False
             
-            # Start screen sharing for this user
-            if user_id in self.video_rooms[team_id]["participants"]:
-                self.video_rooms[team_id]["participants"][user_id]["screen_sharing"] = True
-                self.video_rooms[team_id]["screen_sharing_active"] = True
-                return True
-        return False
+                # Start screen sharing for this user
+                if user_id in self.video_rooms[team_id]["participants"]:
+                    self.video_rooms[team_id]["participants"][user_id]["screen_sharing"] = True
+                    self.video_rooms[team_id]["screen_sharing_active"] = True
+                    return True
+            return False
 
 class AITeamAssistant:
     def __init__(self):
@@ -448,23 +1036,81 @@ class TeamChallengeEngine:
         return []
 
 class TeamEngagementTracker:
-    def __init__(self):
+    def __init__(self, store=None, raw_retention_hours=48, hourly_retention_days=7, daily_retention_days=400):
+        self.store = store
+        # Raw snapshots are only kept for the retention window; analytics read the rollups
         self.team_engagement_data = {}
         self.individual_contributions = {}
+        self.raw_retention = timedelta(hours=raw_retention_hours)
+        self.hourly_retention = timedelta(days=hourly_retention_days)
+        self.daily_retention = timedelta(days=daily_retention_days)
+        self.hourly_rollups = {}
+        self.daily_rollups = {}
+        self.recent_collaboration = {}
+        self.loaded_teams = set()
         
-    def track_team_session(self, team_id, session_data):
+    def track_team_session(self, team_id, session_data, timestamp=None):
+        if self.store and team_id not in self.loaded_teams:
+            # Continue from persisted buckets rather than starting new ones after a restart
+            self._load_rollups(team_id)
         if team_id not in self.team_engagement_data:
-            self.team_engagement_data[team_id] = []
+            self.team_engagement_data[team_id] = deque()
         
         engagement_snapshot = {
-            "timestamp": datetime.now(),
+            "timestamp": timestamp or datetime.now(),
             "active_members": session_data.get("active_members", []),
             "average_engagement": self.calculate_average_engagement(session_data),
             "collaboration_events": session_data.get("collaboration_events", 0),
             "productivity_score": session_data.get("productivity_score", 0)
         }
         
-        self.team_engagement_data[team_id].append(engagement_snapshot)
+        raw = self.team_engagement_data[team_id]
+        raw.append(engagement_snapshot)
+        while raw and raw[0]["timestamp"] < engagement_snapshot["timestamp"] - self.raw_retention:
+            raw.popleft()
+        self._update_rollups(team_id, engagement_snapshot)
+        if self.store:
+            self.store.record_engagement(team_id, engagement_snapshot)
+    
+    def _update_rollups(self, team_id, snapshot):
+        timestamp = snapshot["timestamp"]
+        hour_start = timestamp.replace(minute=0, second=0, microsecond=0)
+        day_start = hour_start.replace(hour=0)
+        hourly = self.hourly_rollups.setdefault(team_id, {})
+        daily = self.daily_rollups.setdefault(team_id, {})
+        for rollups, start, granularity in ((hourly, hour_start, "hour"), (daily, day_start, "day")):
+            bucket = rollups.get(start)
+            if bucket is None:
+                bucket = rollups[start] = self._new_bucket(start)
+            bucket["sessions"] += 1
+            bucket["engagement"] += snapshot["average_engagement"]
+            bucket["collaboration"] += snapshot["collaboration_events"]
+            bucket["productivity"] += snapshot["productivity_score"]
+            bucket["hour_engagement"][timestamp.hour] += snapshot["average_engagement"]
+            if self.store:
+                self.store.save_rollup(team_id, granularity, start, {
+                    "sessions": 1,
+                    "engagement": snapshot["average_engagement"],
+                    "collaboration": snapshot["collaboration_events"],
+                    "productivity": snapshot["productivity_score"],
+                    "hour": timestamp.hour
+                })
+        self._expire(hourly, timestamp - self.hourly_retention)
+        self._expire(daily, timestamp - self.daily_retention)
+        self.recent_collaboration.setdefault(team_id, deque(maxlen=3)).append(
+            (timestamp, snapshot["collaboration_events"]))
+    
+    def _new_bucket(self, start):
+        return {"start": start, "sessions": 0, "engagement": 0, "collaboration": 0,
+                "productivity": 0, "hour_engagement": [0] * 24}
+    
+    def _expire(self, rollups, cutoff):
+        # Buckets are created in time order, so expired ones sit at the front of the dict
+        while rollups:
+            start = next(iter(rollups))
+            if start >= cutoff:
+                break
+            del rollups[start]
     
     def calculate_average_engagement(self, session_data):
         engagement_scores = session_data.get("member_engagement", {})
@@ -474,28 +1120,78 @@ class TeamEngagementTracker:
         return sum(engagement_scores.values()) / len(engagement_scores)
     
     def get_team_analytics(self, team_id, time_period_days=7):
-        if team_id not in self.team_engagement_data:
+        if self.store and team_id not in self.loaded_teams:
+            self._load_rollups(team_id)
+        if team_id not in self.daily_rollups:
             return {}
         
-        cutoff_date = datetime.now() - timedelta(days=time_period_days)
-        recent_data = [
-            data for data in self.team_engagement_data[team_id]
-            if data["timestamp"] > cutoff_date
-        ]
+        # Whole days come from the daily rollups and the partial first day from hourly ones, so the
+        # window is aligned to the hour; past the hourly retention it widens to the whole first day
+        now = datetime.now()
+        cutoff_date = now - timedelta(days=time_period_days)
+        cutoff_hour = cutoff_date.replace(minute=0, second=0, microsecond=0)
+        first_full_day = cutoff_hour.replace(hour=0)
+        if cutoff_hour != first_full_day and cutoff_hour >= now - self.hourly_retention:
+            first_full_day += timedelta(days=1)
+        buckets = [bucket for start, bucket in self.daily_rollups[team_id].items() if start >= first_full_day]
+        buckets += [bucket for start, bucket in self.hourly_rollups.get(team_id, {}).items()
+                    if cutoff_hour <= start < first_full_day]
         
-        if not recent_data:
+        total_sessions = sum(bucket["sessions"] for bucket in buckets)
+        if not total_sessions:
             return {}
         
         analytics = {
-            "average_engagement": sum(d["average_engagement"] for d in recent_data) / len(recent_data),
-            "total_sessions": len(recent_data),
-            "most_active_periods": self.identify_active_periods(recent_data),
-            "collaboration_trend": self.calculate_collaboration_trend(recent_data),
-            "team_productivity": sum(d["productivity_score"] for d in recent_data) / len(recent_data)
+            "average_engagement": sum(bucket["engagement"] for bucket in buckets) / total_sessions,
+            "total_sessions": total_sessions,
+            "most_active_periods": self.identify_active_periods_from_rollups(buckets),
+            "collaboration_trend": self.collaboration_trend_from_rollups(
+                team_id, buckets, total_sessions, min(cutoff_hour, first_full_day)),
+            "team_productivity": sum(bucket["productivity"] for bucket in buckets) / total_sessions
         }
         
         return analytics
     
+    def identify_active_periods_from_rollups(self, buckets):
+        hour_activity = {}
+        for bucket in buckets:
+            for hour, engagement in enumerate(bucket["hour_engagement"]):
+                if engagement:
+                    hour_activity[hour] = hour_activity.get(hour, 0) + engagement
+        sorted_hours = sorted(hour_activity.items(), key=lambda x: x[1], reverse=True)
+        return sorted_hours[:3]
+    
+    def collaboration_trend_from_rollups(self, team_id, buckets, total_sessions, cutoff):
+        if total_sessions < 2:
+            return "insufficient_data"
+        
+        recent = [events for timestamp, events in self.recent_collaboration.get(team_id, ()) if timestamp >= cutoff]
+        recent_collab = sum(recent) / min(3, total_sessions)
+        older_total = sum(bucket["collaboration"] for bucket in buckets) - sum(recent)
+        older_collab = older_total / max(1, total_sessions - len(recent))
+        
+        if recent_collab > older_collab * 1.1:
+            return "improving"
+        elif recent_collab < older_collab * 0.9:
+            return "declining"
+        else:
+            return "stable"
+    
+    def _load_rollups(self, team_id):
+        # Rollups written before a restart or by another worker
+        self.loaded_teams.add(team_id)
+        now = datetime.now()
+        daily = self.store.load_rollups(team_id, "day", now - self.daily_retention)
+        if not daily:
+            return
+        self.daily_rollups[team_id] = {bucket["start"]: bucket for bucket in daily}
+        self.hourly_rollups[team_id] = {bucket["start"]: bucket
+                                        for bucket in self.store.load_rollups(team_id, "hour", now - self.hourly_retention)}
+        raw = self.store.load_engagement(team_id, now - self.raw_retention)
+        self.team_engagement_data[team_id] = deque(raw)
+        self.recent_collaboration[team_id] = deque(
+            ((snapshot["timestamp"], snapshot["collaboration_events"]) for snapshot in raw), maxlen=3)
+    
     def identify_active_periods(self, data):
         # Identify when the team is most active
         hour_activity = {}
@@ -0,0 +1,476 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+ROLLUP_SUMS = ("sessions", "engagement", "collaboration", "productivity")
+
+SQLITE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS teams (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        created_by TEXT NOT NULL,
+        created_at TEXT,
+        external_id TEXT UNIQUE,
+        max_members INTEGER DEFAULT 6,
+        stats TEXT,
+        achievements TEXT,
+        active_projects TEXT,
+        updated_at TEXT
+    );
+    CREATE TABLE IF NOT EXISTS team_members (
+        team_id INTEGER REFERENCES teams(id),
+        user_id TEXT NOT NULL,
+        role TEXT DEFAULT 'member',
+        joined_at TEXT,
+        user_name TEXT,
+        active INTEGER DEFAULT 1,
+        contribution_score INTEGER DEFAULT 0,
+        PRIMARY KEY (team_id, user_id)
+    );
+    CREATE TABLE IF NOT EXISTS team_sessions (
+        team_id INTEGER PRIMARY KEY REFERENCES teams(id),
+        session_type TEXT NOT NULL,
+        start_time TEXT,
+        active_members TEXT,
+        engagement_data TEXT
+    );
+    CREATE TABLE IF NOT EXISTS team_engagement (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        team_id INTEGER REFERENCES teams(id),
+        recorded_at TEXT,
+        snapshot TEXT
+    );
+    CREATE INDEX IF NOT EXISTS team_engagement_team_time ON team_engagement(team_id, recorded_at);
+    CREATE TABLE IF NOT EXISTS team_engagement_rollups (
+        team_id INTEGER REFERENCES teams(id),
+        granularity TEXT NOT NULL,
+        bucket_start TEXT NOT NULL,
+        sessions INTEGER DEFAULT 0,
+        engagement REAL DEFAULT 0,
+        collaboration REAL DEFAULT 0,
+        productivity REAL DEFAULT 0,
+        PRIMARY KEY (team_id, granularity, bucket_start)
+    );
+    CREATE TABLE IF NOT EXISTS team_engagement_hours (
+        team_id INTEGER REFERENCES teams(id),
+        bucket_start TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        engagement REAL DEFAULT 0,
+        PRIMARY KEY (team_id, bucket_start, hour)
+    );
+"""
+
+class ConnectionPool:
+    def __init__(self, factory, size=4):
+        self.factory = factory
+        self.size = size
+        self.idle = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        conn = self._checkout()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.idle.put(conn)
+
+    def _checkout(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if self.created < self.size:
+                self.created += 1
+                return self.factory()
+        return self.idle.get()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class TeamStore:
+    def __init__(self, dsn=':memory:', pool_size=4, batch_size=50, schema_path=None, raw_retention_hours=48,
+                 flush_interval=5.0):
+        # dsn is a SQLite path (':memory:' for tests) or a postgres:// URL
+        self.dsn = dsn
+        self.postgres = dsn.startswith(('postgres://', 'postgresql://'))
+        self.placeholder = '%s' if self.postgres else '?'
+        self.batch_size = batch_size
+        if not self.postgres and dsn == ':memory:':
+            # A private shared-cache database so every pooled connection sees the same tables
+            self._sqlite_target = f"file:team_store_{uuid.uuid4().hex}?mode=memory&cache=shared"
+            self._keepalive = self._connect()
+        else:
+            self._sqlite_target = dsn
+        self.pool = ConnectionPool(self._connect, pool_size)
+        self.lock = threading.RLock()
+        # Identity map: one live Team object per team id in this process
+        self.identity_map = {}
+        self.row_ids = {}
+        self.dirty_teams = set()
+        self.dirty_sessions = {}
+        self.pending_engagement = []
+        self.dirty_rollups = {}
+        self.raw_retention = timedelta(hours=raw_retention_hours)
+        self._create_schema(schema_path)
+        # Dirty state reaches the database within flush_interval seconds, and at interpreter exit
+        self.stopped = threading.Event()
+        self.flusher = None
+        if flush_interval:
+            self.flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,), daemon=True)
+            self.flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self, interval):
+        while not self.stopped.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                # Dirty entries stay queued, so the next pass retries them
+                pass
+
+    def _connect(self):
+        if self.postgres:
+            import psycopg2
+            return psycopg2.connect(self.dsn)
+        conn = sqlite3.connect(self._sqlite_target, uri=self._sqlite_target.startswith('file:'),
+                               check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        if self._sqlite_target.startswith('file:'):
+            return conn
+        # WAL lets several app workers read while one of them writes
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def _create_schema(self, schema_path):
+        with self.pool.connection() as conn:
+            if self.postgres:
+                path = schema_path or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+                with open(path) as handle:
+                    conn.cursor().execute(handle.read())
+            else:
+                conn.executescript(SQLITE_SCHEMA)
+
+    def _sql(self, statement):
+        return statement.replace('?', self.placeholder)
+
+    def _time(self, value):
+        if value is None or self.postgres:
+            return value
+        return value.isoformat()
+
+    def _parse_time(self, value):
+        if value is None or isinstance(value, datetime):
+            return value
+        return datetime.fromisoformat(value)
+
+    def _parse_json(self, value, default):
+        if value is None:
+            return default
+        return value if isinstance(value, (dict, list)) else json.loads(value)
+
+    def save_team(self, team):
+        with self.lock:
+            team.on_change = self.save_team
+            self.identity_map[team.id] = team
+            self.dirty_teams.add(team.id)
+            if len(self.dirty_teams) >= self.batch_size:
+                self.flush()
+        return team
+
+    def save_session(self, session):
+        with self.lock:
+            session.on_change = self.save_session
+            self.dirty_sessions[session.team_id] = session
+            if len(self.dirty_sessions) >= self.batch_size:
+                self.flush()
+        return session
+
+    def record_engagement(self, team_id, snapshot):
+        with self.lock:
+            self.pending_engagement.append((team_id, snapshot))
+            if len(self.pending_engagement) >= self.batch_size:
+                self.flush()
+
+    def save_rollup(self, team_id, granularity, start, increments):
+        # Increments to one bucket add up until the next flush, which adds them to the stored row, so
+        # neither a restart nor another worker writing the same bucket loses counts
+        with self.lock:
+            pending = self.dirty_rollups.get((team_id, granularity, start))
+            if pending is None:
+                pending = self.dirty_rollups[(team_id, granularity, start)] = dict.fromkeys(ROLLUP_SUMS, 0)
+                pending["hour_engagement"] = [0] * 24
+            for column in ROLLUP_SUMS:
+                pending[column] += increments[column]
+            if "hour" in increments:
+                pending["hour_engagement"][increments["hour"]] += increments["engagement"]
+            if len(self.dirty_rollups) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if not (self.dirty_teams or self.dirty_sessions or self.pending_engagement or self.dirty_rollups):
+                return
+            teams = [self.identity_map[team_id] for team_id in self.dirty_teams]
+            sessions = list(self.dirty_sessions.values())
+            engagement = self.pending_engagement
+            rollups = self.dirty_rollups
+            with self.pool.connection() as conn:
+                cursor = conn.cursor()
+                self._write_teams(cursor, teams)
+                self._resolve_row_ids(cursor, {session.team_id for session in sessions} |
+                                      {team_id for team_id, _ in engagement} |
+                                      {team_id for team_id, _, _ in rollups})
+                self._write_sessions(cursor, sessions)
+                self._write_engagement(cursor, engagement)
+                self._write_rollups(cursor, rollups)
+            self.dirty_teams = set()
+            self.dirty_sessions = {}
+            self.pending_engagement = []
+            self.dirty_rollups = {}
+
+    def _write_teams(self, cursor, teams):
+        if not teams:
+            return
+        now = self._time(datetime.now())
+        cursor.executemany(self._sql(
+            "INSERT INTO teams (external_id, name, created_by, created_at, max_members, stats, "
+            "achievements, active_projects, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (external_id) DO UPDATE SET name = excluded.name, max_members = excluded.max_members, "
+            "stats = excluded.stats, achievements = excluded.achievements, "
+            "active_projects = excluded.active_projects, updated_at = excluded.updated_at"),
+            [(team.id, team.name, team.creator_id, self._time(team.created_at), team.max_members,
+              json.dumps(team.stats), json.dumps(team.achievements, default=str),
+              json.dumps(team.active_projects, default=str), now) for team in teams])
+        self._resolve_row_ids(cursor, [team.id for team in teams], refresh=True)
+        row_ids = [(self.row_ids[team.id],) for team in teams]
+        cursor.executemany(self._sql("DELETE FROM team_members WHERE team_id = ?"), row_ids)
+        cursor.executemany(self._sql(
+            "INSERT INTO team_members (team_id, user_id, role, joined_at, user_name, active, contribution_score) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)"),
+            [(self.row_ids[team.id], user_id, member.get("role", "member"), self._time(member.get("joined")),
+              member.get("name"), bool(member.get("active", True)), member.get("contribution_score", 0))
+             for team in teams for user_id, member in team.members.items()])
+
+    def _resolve_row_ids(self, cursor, team_ids, refresh=False):
+        missing = [team_id for team_id in team_ids if refresh or team_id not in self.row_ids]
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            cursor.execute(self._sql(
+                "SELECT external_id, id FROM teams WHERE external_id IN (%s)" % ", ".join("?" * len(chunk))), chunk)
+            self.row_ids.update(cursor.fetchall())
+
+    def _write_sessions(self, cursor, sessions):
+        sessions = [session for session in sessions if session.team_id in self.row_ids]
+        if not sessions:
+            return
+        cursor.executemany(self._sql(
+            "INSERT INTO team_sessions (team_id, session_type, start_time, active_members, engagement_data) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT (team_id) DO UPDATE SET session_type = excluded.session_type, "
+            "start_time = excluded.start_time, active_members = excluded.active_members, "
+            "engagement_data = excluded.engagement_data"),
+            [(self.row_ids[session.team_id], session.session_type, self._time(session.start_time),
+              json.dumps(session.active_members, default=str), json.dumps(session.engagement_data, default=str))
+             for session in sessions])
+
+    def _write_engagement(self, cursor, engagement):
+        rows = [(self.row_ids[team_id], self._time(snapshot["timestamp"]), json.dumps(snapshot, default=str))
+                for team_id, snapshot in engagement if team_id in self.row_ids]
+        if rows:
+            cursor.executemany(self._sql(
+                "INSERT INTO team_engagement (team_id, recorded_at, snapshot) VALUES (?, ?, ?)"), rows)
+
+    def _write_rollups(self, cursor, rollups):
+        rows = [(self.row_ids[team_id], granularity, self._time(start), *(pending[column] for column in ROLLUP_SUMS))
+                for (team_id, granularity, start), pending in rollups.items() if team_id in self.row_ids]
+        if not rows:
+            return
+        cursor.executemany(self._sql(
+            "INSERT INTO team_engagement_rollups (team_id, granularity, bucket_start, sessions, engagement, "
+            "collaboration, productivity) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (team_id, granularity, bucket_start) DO UPDATE SET "
+            "sessions = team_engagement_rollups.sessions + excluded.sessions, "
+            "engagement = team_engagement_rollups.engagement + excluded.engagement, "
+            "collaboration = team_engagement_rollups.collaboration + excluded.collaboration, "
+            "productivity = team_engagement_rollups.productivity + excluded.productivity"), rows)
+        # Daily buckets outlive the hourly rows, so their per-hour engagement profile is stored with them
+        hours = [(self.row_ids[team_id], self._time(start), hour, engagement)
+                 for (team_id, granularity, start), pending in rollups.items()
+                 if granularity == "day" and team_id in self.row_ids
+                 for hour, engagement in enumerate(pending["hour_engagement"]) if engagement]
+        if hours:
+            cursor.executemany(self._sql(
+                "INSERT INTO team_engagement_hours (team_id, bucket_start, hour, engagement) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (team_id, bucket_start, hour) DO UPDATE SET "
+                "engagement = team_engagement_hours.engagement + excluded.engagement"), hours)
+        # Raw snapshots past the retention window are covered by the rollups
+        cursor.execute(self._sql("DELETE FROM team_engagement WHERE recorded_at < ?"),
+                       (self._time(datetime.now() - self.raw_retention),))
+
+    def load_rollups(self, team_id, granularity, since):
+        self.flush()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            query = ("SELECT r.bucket_start, r.sessions, r.engagement, r.collaboration, r.productivity "
+                     "FROM team_engagement_rollups r JOIN teams t ON t.id = r.team_id "
+                     "WHERE t.external_id = ? AND r.granularity = ? AND r.bucket_start >= ? ORDER BY r.bucket_start")
+            cursor.execute(self._sql(query), (team_id, granularity, self._time(since)))
+            rows = cursor.fetchall()
+            profiles = hourly = []
+            if granularity != "hour":
+                cursor.execute(self._sql(
+                    "SELECT h.bucket_start, h.hour, h.engagement "
+                    "FROM team_engagement_hours h JOIN teams t ON t.id = h.team_id "
+                    "WHERE t.external_id = ? AND h.bucket_start >= ?"), (team_id, self._time(since)))
+                profiles = cursor.fetchall()
+                cursor.execute(self._sql(query), (team_id, "hour", self._time(since)))
+                hourly = cursor.fetchall()
+        buckets = {}
+        for start, sessions, engagement, collaboration, productivity in rows:
+            start = self._parse_time(start)
+            buckets[start] = {"start": start, "sessions": sessions, "engagement": engagement,
+                              "collaboration": collaboration, "productivity": productivity,
+                              "hour_engagement": [0] * 24}
+            if granularity == "hour":
+                buckets[start]["hour_engagement"][start.hour] = engagement
+        profiled = set()
+        for start, hour, engagement in profiles:
+            start = self._parse_time(start)
+            if start in buckets:
+                buckets[start]["hour_engagement"][hour] += engagement
+                profiled.add(start)
+        # Days stored before the profile table existed fall back to whatever hourly rows remain
+        for start, _, engagement, _, _ in hourly:
+            start = self._parse_time(start)
+            key = start.replace(hour=0)
+            if key in buckets and key not in profiled:
+                buckets[key]["hour_engagement"][start.hour] += engagement
+        return list(buckets.values())
+
+    def get_team(self, team_id, refresh=False):
+        with self.lock:
+            if not refresh and team_id in self.identity_map:
+                return self.identity_map[team_id]
+            if team_id in self.dirty_teams:
+                # Unflushed local changes win over whatever another worker wrote
+                return self.identity_map[team_id]
+            teams = self._load_teams("WHERE t.external_id = ?", (team_id,))
+            return teams.get(team_id)
+
+    def load_all_teams(self):
+        with self.lock:
+            self._load_teams("", ())
+            return self.identity_map
+
+    def _load_teams(self, where, params):
+        from team_collaboration import Team
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql(
+                "SELECT t.id, t.external_id, t.name, t.created_by, t.created_at, t.max_members, t.stats, "
+                "t.achievements, t.active_projects FROM teams t " + where), params)
+            team_rows = cursor.fetchall()
+            if not team_rows:
+                return {}
+            by_row = {row[0]: row for row in team_rows}
+            cursor.execute(self._sql(
+                "SELECT m.team_id, m.user_id, m.role, m.joined_at, m.user_name, m.active, m.contribution_score "
+                "FROM team_members m JOIN teams t ON t.id = m.team_id " + where), params)
+            member_rows = cursor.fetchall()
+        members = {}
+        for team_row, user_id, role, joined_at, user_name, active, score in member_rows:
+            member = {"role": role, "joined": self._parse_time(joined_at), "active": bool(active)}
+            if user_name is not None:
+                member["name"] = user_name
+            if role != "leader" or score:
+                member["contribution_score"] = score
+            members.setdefault(team_row, {})[user_id] = member
+        loaded = {}
+        for row_id, external_id, name, created_by, created_at, max_members, stats, achievements, projects in by_row.values():
+            team = self.identity_map.get(external_id)
+            if team is None:
+                team = Team(external_id, name, created_by, max_members)
+            team.name = name
+            team.max_members = max_members
+            team.created_at = self._parse_time(created_at) or team.created_at
+            team.members = members.get(row_id, {})
+            team.stats = self._parse_json(stats, team.stats)
+            team.achievements = self._parse_json(achievements, [])
+            team.active_projects = self._parse_json(projects, [])
+            team.on_change = self.save_team
+            self.identity_map[external_id] = team
+            self.row_ids[external_id] = row_id
+            loaded[external_id] = team
+        return loaded
+
+    def load_sessions(self):
+        from team_collaboration import TeamSession
+        self.flush()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT t.external_id, s.session_type, s.start_time, s.active_members, s.engagement_data "
+                "FROM team_sessions s JOIN teams t ON t.id = s.team_id")
+            rows = cursor.fetchall()
+        sessions = {}
+        for team_id, session_type, start_time, active_members, engagement_data in rows:
+            session = TeamSession(team_id, session_type)
+            session.start_time = self._parse_time(start_time)
+            session.active_members = self._parse_json(active_members, {})
+            session.engagement_data = self._parse_json(engagement_data, {})
+            for member in session.active_members.values():
+                member["joined_at"] = self._parse_time(member.get("joined_at"))
+            for entry in session.engagement_data.values():
+                entry["timestamp"] = self._parse_time(entry.get("timestamp"))
+            session.on_change = self.save_session
+            sessions[team_id] = session
+        return sessions
+
+    def load_engagement(self, team_id, since=None):
+        self.flush()
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self._sql(
+                "SELECT e.snapshot FROM team_engagement e JOIN teams t ON t.id = e.team_id "
+                "WHERE t.external_id = ? AND e.recorded_at > ? ORDER BY e.recorded_at"),
+                (team_id, self._time(since or datetime.min)))
+            rows = cursor.fetchall()
+        snapshots = []
+        for (snapshot,) in rows:
+            snapshot = self._parse_json(snapshot, {})
+            snapshot["timestamp"] = self._parse_time(snapshot["timestamp"])
+            snapshots.append(snapshot)
+        return snapshots
+
+    def evict(self, team_id):
+        with self.lock:
+            if team_id not in self.dirty_teams:
+                self.identity_map.pop(team_id, None)
+
+    def close(self):
+        self.stopped.set()
+        if self.flusher is not None:
+            self.flusher.join()
+            self.flusher = None
+        atexit.unregister(self.flush)
+        self.flush()
+        self.pool.close()
+        if getattr(self, '_keepalive', None) is not None:
+            self._keepalive.close()
@@ -0,0 +1,437 @@
+import random
+import time
+
+BLOCK_SIZE = 512
+
+class _Node:
+    __slots__ = ('id', 'char', 'deleted_at', 'block')
+
+    def __init__(self, node_id, char, block):
+        self.id = node_id
+        self.char = char
+        # Id (counter, site) of the first delete op integrated for this node
+        self.deleted_at = None
+        self.block = block
+
+class _Block:
+    __slots__ = ('nodes', 'visible')
+
+    def __init__(self, nodes=None):
+        self.nodes = nodes or []
+        self.visible = 0
+
+class TextCRDT:
+    # RGA sequence CRDT. Element ids are (lamport counter, site id); an insert run of k characters
+    # is one op whose characters get ids counter..counter+k-1, each following the previous one.
+    # Nodes live in fixed-size blocks with visible counts so position lookups are O(sqrt n) in C.
+
+    def __init__(self, site_id, text=''):
+        self.site_id = site_id
+        self.clock = 0
+        self.blocks = [_Block()]
+        self.nodes = {}
+        self.pending = []
+        # Version vector: highest op counter integrated from each site
+        self.version = {}
+        # site -> version vector that site reported having integrated
+        self.acknowledged = {}
+        self._text = ''
+        self._dirty = False
+        if text:
+            # Initial content belongs to a fixed pseudo-site so every replica starts identical
+            self.apply_ops([('ins', (1, ''), None, text)])
+
+    # ------------------------------------------------------------------ local edits
+
+    def insert(self, position, text, site_id=None):
+        # site_id lets a server-side replica record edits on behalf of a user
+        if not text:
+            return []
+        ref = self._node_at(position - 1).id if position > 0 else None
+        op = ('ins', (self.clock + 1, site_id or self.site_id), ref, text)
+        self.apply_ops([op])
+        return [op]
+
+    def delete(self, position, length, site_id=None):
+        if length <= 0:
+            return []
+        runs = []
+        for node in self._visible_nodes(position, length):
+            counter, site = node.id
+            if runs and runs[-1][1] == site and runs[-1][0] + runs[-1][2] == counter:
+                runs[-1][2] += 1
+            else:
+                runs.append([counter, site, 1])
+        op = ('del', (self.clock + 1, site_id or self.site_id), [tuple(run) for run in runs])
+        self.apply_ops([op])
+        return [op]
+
+    def splice(self, position, delete, insert, site_id=None):
+        return self.delete(position, delete, site_id) + self.insert(position, insert, site_id)
+
+    # ------------------------------------------------------------------ integration
+
+    def apply_ops(self, ops):
+        # Ops may arrive out of causal order; ones whose dependencies are missing wait in pending
+        applied = 0
+        queue = list(ops)
+        while queue:
+            progressed = False
+            for op in queue:
+                if self._ready(op):
+                    self._integrate(op)
+                    applied += 1
+                    progressed = True
+                else:
+                    self.pending.append(op)
+            if not progressed or not self.pending:
+                break
+            queue, self.pending = self.pending, []
+        return applied
+
+    def _ready(self, op):
+        if op[0] == 'ins':
+            return op[2] is None or op[2] in self.nodes or op[1] in self.nodes
+        nodes = self.nodes
+        return all((start + offset, site) in nodes
+                   for start, site, length in op[2] for offset in range(length))
+
+    def _integrate(self, op):
+        if op[0] == 'ins':
+            _, (counter, site), ref, text = op
+            if (counter, site) in self.nodes:
+                return
+            self._insert_run(counter, site, ref, text)
+            self.clock = max(self.clock, counter + len(text) - 1)
+            self.version[site] = max(self.version.get(site, 0), counter + len(text) - 1)
+        else:
+            _, (counter, site), runs = op
+            for start, run_site, length in runs:
+                for offset in range(length):
+                    node = self.nodes[(start + offset, run_site)]
+                    if node.deleted_at is None:
+                        node.deleted_at = (counter, site)
+                        node.block.visible -= 1
+            self.clock = max(self.clock, counter)
+            self.version[site] = max(self.version.get(site, 0), counter)
+        self._dirty = True
+
+    def _insert_run(self, counter, site, ref, text):
+        new_id = (counter, site)
+        if ref is None:
+            block_index, offset = 0, 0
+        else:
+            ref_node = self.nodes[ref]
+            block_index = self.blocks.index(ref_node.block)
+            offset = ref_node.block.nodes.index(ref_node) + 1
+
+        # RGA rule: skip successors with a greater id; their subtrees are skipped with them
+        while True:
+            block = self.blocks[block_index]
+            if offset < len(block.nodes):
+                if block.nodes[offset].id > new_id:
+                    offset += 1
+                    continue
+                break
+            if block_index + 1 < len(self.blocks):
+                block_index += 1
+                offset = 0
+                continue
+            break
+
+        # The whole run lands contiguously: nothing can already reference its fresh ids
+        block = self.blocks[block_index]
+        run = [_Node((counter + k, site), char, block) for k, char in enumerate(text)]
+        block.nodes[offset:offset] = run
+        block.visible += len(run)
+        for node in run:
+            self.nodes[node.id] = node
+        if len(block.nodes) > 2 * BLOCK_SIZE:
+            self._split(block_index)
+
+    def _split(self, block_index):
+        block = self.blocks[block_index]
+        pieces = []
+        for start in range(0, len(block.nodes), BLOCK_SIZE):
+            piece = _Block(block.nodes[start:start + BLOCK_SIZE])
+            for node in piece.nodes:
+                node.block = piece
+                if node.deleted_at is None:
+                    piece.visible += 1
+            pieces.append(piece)
+        self.blocks[block_index:block_index + 1] = pieces
+
+    # ------------------------------------------------------------------ reads
+
+    def text(self):
+        if self._dirty:
+            self._text = ''.join(node.char for block in self.blocks for node in block.nodes
+                                 if node.deleted_at is None)
+            self._dirty = False
+        return self._text
+
+    def __len__(self):
+        return sum(block.visible for block in self.blocks)
+
+    def _node_at(self, position):
+        for block in self.blocks:
+            if position < block.visible:
+                for node in block.nodes:
+                    if node.deleted_at is None:
+                        if position == 0:
+                            return node
+                        position -= 1
+            position -= block.visible
+        raise IndexError("position out of range")
+
+    def _visible_nodes(self, position, length):
+        found = []
+        for block in self.blocks:
+            if position >= block.visible:
+                position -= block.visible
+                continue
+            for node in block.nodes:
+                if node.deleted_at is None:
+                    if position > 0:
+                        position -= 1
+                    else:
+                        found.append(node)
+                        if len(found) == length:
+                            return found
+        return found
+
+    # ------------------------------------------------------------------ tombstone GC
+
+    def version_vector(self):
+        return dict(self.version)
+
+    def acknowledge(self, site_id, version):
+        # version is the vector a replica reports having integrated; entries only move forward
+        acknowledged = self.acknowledged.setdefault(site_id, {})
+        for site, counter in version.items():
+            if counter > acknowledged.get(site, 0):
+                acknowledged[site] = counter
+
+    def collect_garbage(self, sites=None):
+        # A tombstone is removable once it is causally stable: every site has integrated its delete, and
+        # this replica has integrated everything those sites had produced when they acknowledged. Any op
+        # still able to reference the tombstone was made before its site saw the delete, so it is
+        # already here.
+        sites = list(self.acknowledged) if sites is None else list(sites)
+        if not sites or self.pending or any(site not in self.acknowledged for site in sites):
+            return 0
+        vectors = [self.acknowledged[site] for site in sites]
+        for site, vector in zip(sites, vectors):
+            if self.version.get(site, 0) < vector.get(site, 0):
+                return 0
+        stable = {}
+        for vector in vectors:
+            for site in vector:
+                stable[site] = min(other.get(site, 0) for other in vectors)
+        removed = 0
+        kept_blocks = []
+        for block in self.blocks:
+            live = []
+            for node in block.nodes:
+                deleted = node.deleted_at
+                if deleted is not None and deleted[0] <= stable.get(deleted[1], 0):
+                    del self.nodes[node.id]
+                    removed += 1
+                else:
+                    live.append(node)
+            block.nodes = live
+            if live:
+                kept_blocks.append(block)
+        self.blocks = kept_blocks or [_Block()]
+        return removed
+
+    def tombstones(self):
+        return len(self.nodes) - len(self)
+
+    # ------------------------------------------------------------------ binary encoding
+
+    @staticmethod
+    def encode_ops(ops):
+        sites = {}
+        body = bytearray()
+
+        def site_index(site):
+            if site not in sites:
+                sites[site] = len(sites)
+            return sites[site]
+
+        _write_varint(body, len(ops))
+        for op in ops:
+            if op[0] == 'ins':
+                _, (counter, site), ref, text = op
+                body.append(0)
+                _write_varint(body, counter)
+                _write_varint(body, site_index(site))
+                if ref is None:
+                    _write_varint(body, 0)
+                else:
+                    _write_varint(body, ref[0])
+                    _write_varint(body, site_index(ref[1]))
+                data = text.encode('utf-8')
+                _write_varint(body, len(data))
+                body.extend(data)
+            else:
+                _, (counter, site), runs = op
+                body.append(1)
+                _write_varint(body, counter)
+                _write_varint(body, site_index(site))
+                _write_varint(body, len(runs))
+                for start, run_site, length in runs:
+                    _write_varint(body, start)
+                    _write_varint(body, site_index(run_site))
+                    _write_varint(body, length)
+
+        # Site ids keep their type: a tag byte (0 str, 1 int), then the UTF-8 text of the id
+        header = bytearray(b'\x02')
+        _write_varint(header, len(sites))
+        for site in sites:
+            if isinstance(site, str):
+                header.append(0)
+            elif isinstance(site, int) and not isinstance(site, bool):
+                header.append(1)
+            else:
+                raise TypeError(f"CRDT site ids must be str or int, not {type(site).__name__}")
+            data = str(site).encode('utf-8')
+            _write_varint(header, len(data))
+            header.extend(data)
+        return bytes(header + body)
+
+    @staticmethod
+    def decode_ops(payload):
+        if payload[:1] not in (b'\x01', b'\x02'):
+            raise ValueError("Unsupported CRDT payload version")
+        # Version 1 payloads carry untagged, string-only site ids
+        tagged = payload[:1] == b'\x02'
+        pos = 1
+        count, pos = _read_varint(payload, pos)
+        sites = []
+        for _ in range(count):
+            tag = 0
+            if tagged:
+                tag = payload[pos]
+                pos += 1
+            length, pos = _read_varint(payload, pos)
+            site = payload[pos:pos + length].decode('utf-8')
+            sites.append(int(site) if tag == 1 else site)
+            pos += length
+        ops = []
+        count, pos = _read_varint(payload, pos)
+        for _ in range(count):
+            kind = payload[pos]
+            pos += 1
+            counter, pos = _read_varint(payload, pos)
+            site, pos = _read_varint(payload, pos)
+            if kind == 0:
+                ref_counter, pos = _read_varint(payload, pos)
+                ref = None
+                if ref_counter:
+                    ref_site, pos = _read_varint(payload, pos)
+                    ref = (ref_counter, sites[ref_site])
+                length, pos = _read_varint(payload, pos)
+                text = payload[pos:pos + length].decode('utf-8')
+                pos += length
+                ops.append(('ins', (counter, sites[site]), ref, text))
+            else:
+                run_count, pos = _read_varint(payload, pos)
+                runs = []
+                for _ in range(run_count):
+                    start, pos = _read_varint(payload, pos)
+                    run_site, pos = _read_varint(payload, pos)
+                    length, pos = _read_varint(payload, pos)
+                    runs.append((start, sites[run_site], length))
+                ops.append(('del', (counter, sites[site]), runs))
+        return ops
+
+def _write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+def _read_varint(payload, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = payload[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+def simulate_concurrent_typing(members=6, edits_per_member=200, seed=7):
+    # Every member edits its own replica and broadcasts ops; delivery order is shuffled per replica
+    rng = random.Random(seed)
+    replicas = [TextCRDT(f"user{index}", "shared notes\n") for index in range(members)]
+    outboxes = [[] for _ in range(members)]
+    delivered = [[0] * members for _ in range(members)]
+    for _ in range(edits_per_member):
+        for index, replica in enumerate(replicas):
+            length = len(replica)
+            if length and rng.random() < 0.3:
+                ops = replica.delete(rng.randrange(length), rng.randint(1, 3))
+            else:
+                ops = replica.insert(rng.randint(0, length), rng.choice(['a', 'bc', 'def ']))
+            outboxes[index].append(TextCRDT.encode_ops(ops))
+        if rng.random() < 0.2:
+            # Partial delivery mid-session, in random order
+            for target, replica in enumerate(replicas):
+                for source in rng.sample(range(members), members):
+                    if source != target and delivered[target][source] < len(outboxes[source]):
+                        payload = outboxes[source][delivered[target][source]]
+                        replica.apply_ops(TextCRDT.decode_ops(payload))
+                        delivered[target][source] += 1
+    for target, replica in enumerate(replicas):
+        messages = [payload for source in range(members) if source != target
+                    for payload in outboxes[source][delivered[target][source]:]]
+        rng.shuffle(messages)
+        for payload in messages:
+            replica.apply_ops(TextCRDT.decode_ops(payload))
+    texts = {replica.text() for replica in replicas}
+    return {'converged': len(texts) == 1, 'length': len(replicas[0]),
+            'pending': sum(len(replica.pending) for replica in replicas)}
+
+def benchmark(doc_size=100_000, operations=5_000, seed=11):
+    rng = random.Random(seed)
+    local = TextCRDT('local', 'x' * doc_size)
+    remote = TextCRDT('remote', 'x' * doc_size)
+    report = {'doc_size': doc_size, 'operations': operations}
+
+    ops = []
+    start = time.perf_counter()
+    for _ in range(operations):
+        ops.extend(local.insert(rng.randint(0, len(local)), 'y'))
+    report['local_insert_us'] = (time.perf_counter() - start) * 1e6 / operations
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        ops.extend(local.delete(rng.randrange(len(local)), 1))
+    report['local_delete_us'] = (time.perf_counter() - start) * 1e6 / operations
+
+    payload = TextCRDT.encode_ops(ops)
+    report['encoded_bytes_per_op'] = len(payload) / len(ops)
+
+    start = time.perf_counter()
+    decoded = TextCRDT.decode_ops(payload)
+    report['decode_us'] = (time.perf_counter() - start) * 1e6 / len(ops)
+
+    start = time.perf_counter()
+    remote.apply_ops(decoded)
+    report['remote_apply_us'] = (time.perf_counter() - start) * 1e6 / len(ops)
+    report['converged'] = remote.text() == local.text()
+
+    local.acknowledge('local', local.version_vector())
+    local.acknowledge('remote', remote.version_vector())
+    start = time.perf_counter()
+    report['tombstones_collected'] = local.collect_garbage()
+    report['gc_ms'] = (time.perf_counter() - start) * 1000
+    return report
+
+if __name__ == "__main__":
+    print(simulate_concurrent_typing())
+    print(benchmark())
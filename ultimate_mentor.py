@@ -10,22 +10,23 @@ import json
 import pandas as pd
 
 # Import all our advanced modules
-from advanced_ai_core import AdvancedAICore, DiagramAnalyzer, ARVisualization, LearningAnalytics, ScenarioEngine, AdaptiveLearning
+from advanced_ai_core import AdvancedAICore, DiagramAnalyzer, ARVisualization, ScenarioEngine, AdaptiveLearning
 from session_manager import AdvancedSessionManager, ModeSpecificGuidance, PomodoroTimer, EngagementTracker
 from ai_backend import AIStudyMentor
 from voice_interface import VoiceInterface, ConversationMode, MultiModalProcessor
 from engagement_monitor import AdvancedEngagementMonitor
 
 class UltimateStudyMentor:
-    def __init__(self):
+    def __init__(self, profile_path='learning_profiles.json', performance_dir='performance_history'):
         # Core AI Systems
-        self.ai_core = AdvancedAICore()
-        self.ai_mentor = AIStudyMentor()
+        self.ai_core = AdvancedAICore(profile_path=profile_path)
+        self.ai_mentor = AIStudyMentor(performance_dir=performance_dir)
         
         # Advanced Features
         self.diagram_analyzer = DiagramAnalyzer()
         self.ar_visualization = ARVisualization()
-        self.learning_analytics = LearningAnalytics()
+        # Shared with the AI core so one instance owns the persisted learning profiles
+        self.learning_analytics = self.ai_core.learning_analytics
         self.scenario_engine = ScenarioEngine()
         self.adaptive_learning = AdaptiveLearning()
         
@@ -246,6 +247,7 @@ def main():
                             # Diagram analysis
                             image = np.array(Image.open(file))
                             analysis = mentor.diagram_analyzer.analyze_scientific_diagram(image)
+                            mentor.learning_analytics.record_interaction({'type': 'visual', 'topic': subject.lower()})
                             
                             st.json(analysis)
                             
@@ -273,6 +275,7 @@ def main():
                     if question:
                         answer = mentor.ai_mentor.answer_question(question, grade, subject)
                         st.write(answer)
+                        mentor.learning_analytics.record_interaction({'type': 'text', 'topic': subject.lower()})
             
             with col_c:
                 if st.button("🎯 Generate Practice"):
@@ -337,6 +340,7 @@ def main():
                     
                     if st.button("Generate 3D Model"):
                         model_data = mentor.ar_visualization.create_3d_molecule(molecule)
+                        mentor.learning_analytics.record_interaction({'type': 'visual', 'topic': 'chemistry'})
                         if model_data:
                             # Create 3D visualization
                             fig = go.Figure()
@@ -369,6 +373,7 @@ def main():
                     
                     if st.button("Start Simulation"):
                         sim_data = mentor.ar_visualization.create_physics_simulation(simulation.lower().replace(" ", "_"))
+                        mentor.learning_analytics.record_interaction({'type': 'interactive', 'topic': 'physics'})
                         if sim_data:
                             # Create animated visualization
                             fig = go.Figure()
@@ -405,6 +410,7 @@ def main():
                 
                 if st.button("Start Virtual Experiment"):
                     lab_data = mentor.scenario_engine.create_interactive_lab(experiment.lower())
+                    mentor.learning_analytics.record_interaction({'type': 'interactive', 'topic': experiment.lower()})
                     
                     st.write("**Equipment:**")
                     for equipment in lab_data.get('equipment', []):
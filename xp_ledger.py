@@ -0,0 +1,150 @@
+import copy
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+# Coins granted per overall level gained; the only coins the ledger accounts for
+LEVEL_UP_COINS = 50
+
+class XPLedger:
+    def __init__(self, path=None, batch_size=256, seen_limit=100000):
+        # path=None keeps the ledger in memory; otherwise it is an append-only JSON-lines file
+        self.path = path
+        self.batch_size = batch_size
+        self.lock = threading.RLock()
+        self.sequence = 0
+        self.applied_sequence = 0
+        self.pending = []
+        # Most recent event ids, for dropping retried grants; older ids age out
+        self.seen = OrderedDict()
+        self.seen_limit = seen_limit
+        # Applied events per player since that player's latest snapshot
+        self.history = {}
+        self.snapshots = {}
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path) as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'snapshot' in record:
+                    snapshot = record['snapshot']
+                    self.snapshots[snapshot['player_id']] = snapshot
+                    self.history[snapshot['player_id']] = [
+                        event for event in self.history.get(snapshot['player_id'], [])
+                        if event['seq'] > snapshot['seq']]
+                    continue
+                self._remember(record['event_id'])
+                self.sequence = max(self.sequence, record['seq'])
+                self.history.setdefault(record['player_id'], []).append(record)
+        self.applied_sequence = self.sequence
+
+    def _remember(self, event_id):
+        self.seen[event_id] = None
+        if len(self.seen) > self.seen_limit:
+            self.seen.popitem(last=False)
+
+    def record(self, player_id, subject, amount, activity_type="study", event_id=None, timestamp=None):
+        with self.lock:
+            event_id = event_id or str(uuid.uuid4())
+            if event_id in self.seen:
+                return None
+            self._remember(event_id)
+            self.sequence += 1
+            event = {
+                'seq': self.sequence,
+                'event_id': event_id,
+                'player_id': player_id,
+                'subject': subject,
+                'amount': amount,
+                'activity_type': activity_type,
+                'timestamp': (timestamp or datetime.now()).isoformat()
+            }
+            self.pending.append(event)
+            return event
+
+    def pending_count(self):
+        return len(self.pending)
+
+    @staticmethod
+    def coalesce(events):
+        # One (subject XP, overall XP) pair per player and subject; overall XP is halved per grant, as in gain_xp
+        totals = {}
+        for event in events:
+            entry = totals.setdefault((event['player_id'], event['subject']), [0, 0])
+            entry[0] += event['amount']
+            entry[1] += event['amount'] // 2
+        return totals
+
+    def apply_pending(self, players):
+        # players maps player ids to RPGPlayer-like objects (a dict, or a ColumnarPlayerStore)
+        with self.lock:
+            batch = [event for event in self.pending if players.get(event['player_id']) is not None]
+            if not batch:
+                return {}
+            applied_ids = {event['event_id'] for event in batch}
+            self.pending = [event for event in self.pending if event['event_id'] not in applied_ids]
+            # Write-ahead: the batch is durable before any player state changes
+            self._append(batch)
+            for event in batch:
+                self.history.setdefault(event['player_id'], []).append(event)
+            self.applied_sequence = max(self.applied_sequence, batch[-1]['seq'])
+            results = {}
+            for (player_id, subject), (subject_amount, overall_amount) in self.coalesce(batch).items():
+                player = players.get(player_id)
+                results.setdefault(player_id, []).append(player.apply_xp(subject, subject_amount, overall_amount))
+            return results
+
+    def _append(self, records):
+        if not self.path:
+            return
+        with open(self.path, 'a') as handle:
+            handle.write(''.join(json.dumps(record, separators=(',', ':')) + '\n' for record in records))
+
+    def _player_state(self, player):
+        # Only the fields the ledger owns
+        return {
+            'level': player.level,
+            'xp': player.xp,
+            'subjects': {subject: {'level': data['level'], 'xp': data['xp']}
+                         for subject, data in player.subjects.items()}
+        }
+
+    def snapshot(self, player_id, player):
+        # Taken after apply_pending; replay then only needs the events recorded after it
+        with self.lock:
+            history = self.history.get(player_id, [])
+            snapshot = {
+                'player_id': player_id,
+                'seq': history[-1]['seq'] if history else self.snapshots.get(player_id, {}).get('seq', 0),
+                'state': self._player_state(player)
+            }
+            self.snapshots[player_id] = snapshot
+            self.history[player_id] = []
+            self._append([{'snapshot': snapshot}])
+            return snapshot
+
+    def rebuild(self, player_id, player):
+        # Deterministic: XP and levels reset to the snapshot (or a new player's), then the same coalesced
+        # application the live path used. Coins only move by the level-up bonus for the corrected level
+        with self.lock:
+            snapshot = self.snapshots.get(player_id)
+            events = list(self.history.get(player_id, []))
+        state = copy.deepcopy(snapshot['state']) if snapshot is not None else {'level': 1, 'xp': 0, 'subjects': {}}
+        coins, level = player.coins, player.level
+        player.level = state['level']
+        player.xp = state['xp']
+        for subject, data in player.subjects.items():
+            saved = state['subjects'].get(subject, {'level': 1, 'xp': 0})
+            data['level'] = saved['level']
+            data['xp'] = saved['xp']
+        for (_, subject), (subject_amount, overall_amount) in self.coalesce(events).items():
+            player.apply_xp(subject, subject_amount, overall_amount)
+        player.coins = coins + LEVEL_UP_COINS * (player.level - level)
+        return player